@@ -0,0 +1,284 @@
+#! /usr/bin/env python
+'''
+Created on Oct 17, 2026
+benchmarks of the cmap.io.gct readers on synthetic .gctx and .gct files.
+Every case runs in a fresh process and records its wall time, peak resident
+memory and bytes read; each run is appended to a JSON history file 
+(gct_bench_history.json in the working directory unless --history is given)
+and compared with the previous run of the same configuration.
+
+example usage (from the python directory):
+PYTHONPATH=. python benchmarks/gct_benchmarks.py --rows 978 --cols 100000
+PYTHONPATH=. python benchmarks/gct_benchmarks.py --rows 22268 --cols 1000 --layout row
+'''
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy
+import tables
+
+import cmap.io.gct as gct
+import synthetic
+
+HISTORY = 'gct_bench_history.json'
+
+def _read_bytes():
+    '''
+    returns the number of bytes this process has read so far, or None where
+    /proc/self/io is not available
+    '''
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except IOError:
+        return None
+
+def _peak_rss():
+    '''
+    returns the peak resident memory of this process in bytes
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #linux reports kilobytes, os x bytes
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+def _run_child(connection,function,args):
+    '''
+    runs one benchmark case in a child process and sends its measurements
+    '''
+    try:
+        start_bytes = _read_bytes()
+        start = time.time()
+        function(*args)
+        wall_time = time.time() - start
+        end_bytes = _read_bytes()
+        connection.send({'wall_time':wall_time, 'peak_rss':_peak_rss(),
+                         'bytes_read':None if start_bytes is None else end_bytes - start_bytes})
+    except Exception as e:
+        connection.send({'error':repr(e)})
+    finally:
+        connection.close()
+
+def run_case(name,function,args,repeat=3):
+    '''
+    runs function(*args) repeat times, each in a fresh process, and returns
+    the best wall time with the largest peak memory and bytes read
+    '''
+    result = {'name':name, 'wall_time':None, 'peak_rss':0, 'bytes_read':None,
+              'repeat':repeat}
+    for ii in range(repeat):
+        parent, child = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_run_child, args=(child, function, args))
+        process.start()
+        child.close()
+        measurement = parent.recv()
+        process.join()
+        if 'error' in measurement:
+            result['error'] = measurement['error']
+            break
+        if result['wall_time'] is None or measurement['wall_time'] < result['wall_time']:
+            result['wall_time'] = measurement['wall_time']
+        result['peak_rss'] = max(result['peak_rss'], measurement['peak_rss'])
+        if measurement['bytes_read'] is not None:
+            result['bytes_read'] = max(result['bytes_read'], measurement['bytes_read'])
+    return result
+
+def bench_read(src):
+    '''
+    reads the full data set, matrix and meta data
+    '''
+    GCTObject = gct.GCT(src)
+    GCTObject.read(verbose=False)
+
+def bench_read_matrix(src,col_inds):
+    '''
+    reads the matrix data of the given columns
+    '''
+    gct.GCT(src).read_gctx_matrix(src, col_inds=col_inds)
+
+def bench_read_meta(src):
+    '''
+    reads the column and row meta data
+    '''
+    GCTObject = gct.GCT(src)
+    GCTObject.read_gctx_col_meta(src, verbose=False)
+    GCTObject.read_gctx_row_meta(src, verbose=False)
+
+def bench_id_lookup(src,cids):
+    '''
+    resolves the given column ids to indices, exactly and by prefix
+    '''
+    GCTObject = gct.GCT(src)
+    GCTObject.get_gctx_cid_inds(src, match_list=cids, exact=True)
+    GCTObject.get_gctx_cid_inds(src, match_list=[x[:8] for x in cids[:10]],
+                                prefix=True)
+
+def selections(num_cols,size,seed=0):
+    '''
+    returns the random (unordered), sorted and contiguous column selections
+    of the given size
+    '''
+    rng = numpy.random.RandomState(seed)
+    size = min(size, num_cols)
+    picked = rng.choice(num_cols, size, replace=False)
+    start = rng.randint(0, num_cols - size + 1)
+    return [('random', picked.tolist()),
+            ('sorted', numpy.sort(picked).tolist()),
+            ('contiguous', range(start, start + size))]
+
+def _git_commit():
+    '''
+    returns the current git commit of the repository, if any
+    '''
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                    stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _format_bytes(value):
+    '''
+    formats a byte count for the summary table
+    '''
+    if value is None:
+        return '-'
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if value < 1024 or unit == 'GB':
+            return '%.1f%s' % (value, unit)
+        value /= 1024.0
+
+def load_history(path):
+    '''
+    returns the list of runs recorded in the history file at path
+    '''
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+def save_run(path,run):
+    '''
+    appends run to the history file at path
+    '''
+    history = load_history(path)
+    history.append(run)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(history, f, indent=1, sort_keys=True)
+    os.rename(path + '.tmp', path)
+
+#options that must match for two runs to be compared
+COMPARED_OPTIONS = ('rows', 'cols', 'layout', 'chunkshape', 'compression', 'select')
+
+def _comparable(run):
+    '''
+    returns the options of run that determine its workload
+    '''
+    return dict((x, run['config'].get(x)) for x in COMPARED_OPTIONS)
+
+def print_run(run,previous=None):
+    '''
+    prints the results of run, with the wall time ratio to previous if given
+    '''
+    before = {}
+    if previous:
+        before = dict((x['name'], x) for x in previous['results'])
+    print('%-28s %10s %10s %10s %8s' % ('case', 'wall (s)', 'peak rss', 'read', 'vs prev'))
+    for result in run['results']:
+        if 'error' in result:
+            print('%-28s failed: %s' % (result['name'], result['error']))
+            continue
+        ratio = '-'
+        if before.get(result['name'], {}).get('wall_time'):
+            ratio = '%.2fx' % (result['wall_time'] / before[result['name']]['wall_time'])
+        print('%-28s %10.4f %10s %10s %8s' % (result['name'], result['wall_time'],
+                                              _format_bytes(result['peak_rss']),
+                                              _format_bytes(result['bytes_read']), ratio))
+
+def run_benchmarks(config):
+    '''
+    generates the synthetic files described by config (a dictionary of the
+    command line options), runs all cases and returns the run record
+    '''
+    data_dir = config['data_dir'] or tempfile.mkdtemp(prefix='gct_bench_')
+    if not os.path.isdir(data_dir):
+        os.makedirs(data_dir)
+    chunkshape = None
+    if config['chunkshape']:
+        chunkshape = tuple(int(x) for x in config['chunkshape'].split(','))
+    src = os.path.join(data_dir, 'bench_%dx%d_%s.gctx' % (config['rows'], config['cols'],
+                       config['chunkshape'].replace(',', 'x') if chunkshape else config['layout']))
+    try:
+        if not os.path.exists(src):
+            synthetic.make_gctx(src, config['rows'], config['cols'], chunkshape=chunkshape,
+                                layout=config['layout'], compression=config['compression'])
+        cases = [('read_gctx', bench_read, (src,))]
+        for kind,col_inds in selections(config['cols'], config['select']):
+            cases.append(('read_matrix_%s_%d' % (kind, len(col_inds)), bench_read_matrix,
+                          (src, col_inds)))
+        cases.append(('read_meta', bench_read_meta, (src,)))
+        cids = synthetic.col_meta(0, config['cols'])[0][1]
+        picked = [cids[x] for x in selections(config['cols'], config['select'])[0][1]]
+        cases.append(('id_lookup_%d' % (len(picked),), bench_id_lookup, (src, picked)))
+        if config['gct']:
+            gct_src = os.path.splitext(src)[0] + '.gct'
+            if not os.path.exists(gct_src):
+                synthetic.make_gct(gct_src, src=src)
+            cases.append(('read_gct', bench_read, (gct_src,)))
+
+        results = []
+        for name,function,args in cases:
+            if config['only'] and not any(x in name for x in config['only']):
+                continue
+            results.append(run_case(name, function, args, config['repeat']))
+        file_size = os.path.getsize(src)
+    finally:
+        if not config['keep'] and not config['data_dir']:
+            shutil.rmtree(data_dir, ignore_errors=True)
+    return {'label':config['label'], 'timestamp':time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit':_git_commit(), 'host':platform.node(),
+            'python':platform.python_version(), 'numpy':numpy.__version__,
+            'tables':tables.__version__, 'file_size':file_size,
+            'config':dict((k, v) for k,v in config.items() if k not in ('only',)),
+            'results':results}
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark the cmap.io.gct readers')
+    parser.add_argument('--rows', type=int, default=978, help='number of rows (978 to 22268)')
+    parser.add_argument('--cols', type=int, default=1000, help='number of columns')
+    parser.add_argument('--layout', default='col', choices=['col', 'row'],
+                        help='chunk layout of the synthetic gctx file')
+    parser.add_argument('--chunkshape', default='', help='explicit chunkshape as rows,cols')
+    parser.add_argument('--compression', default='zlib', help='zlib, blosc or none')
+    parser.add_argument('--select', type=int, default=100,
+                        help='number of columns in the selection cases')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case')
+    parser.add_argument('--gct', action='store_true', help='also benchmark a text .gct copy')
+    parser.add_argument('--only', nargs='*', help='only run cases whose names contain these')
+    parser.add_argument('--data-dir', dest='data_dir', default='',
+                        help='directory for the synthetic files (reused if present)')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary files')
+    parser.add_argument('--history', default=HISTORY,
+                        help='JSON history file (default: %s in the working directory)' % (HISTORY,))
+    parser.add_argument('--label', default='', help='label stored with the run')
+    config = vars(parser.parse_args())
+    if config['compression'] == 'none':
+        config['compression'] = None
+    history_path = config.pop('history')
+
+    run = run_benchmarks(config)
+    previous = [x for x in load_history(history_path) if _comparable(x) == _comparable(run)]
+    print_run(run, previous[-1] if previous else None)
+    save_run(history_path, run)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+'''
+Created on Oct 17, 2026
+provides generators of synthetic .gctx and .gct files for benchmarking
+'''
+import numpy
+
+import cmap.io.gct as gct
+
+#cell lines and perturbagen types cycled through the synthetic column meta data
+CELL_IDS = ['A375', 'A549', 'HA1E', 'HCC515', 'HEPG2', 'MCF7', 'PC3', 'VCAP']
+PERT_TYPES = ['trt_cp', 'trt_cp', 'trt_sh', 'ctl_vehicle']
+
+def row_meta(num_rows,num_landmarks=978):
+    '''
+    returns synthetic row meta data: probe style ids, gene symbols and a
+    landmark flag for the first num_landmarks rows
+    '''
+    ids = ['%d_at' % (200000 + ii) for ii in range(num_rows)]
+    return [('id', ids),
+            ('pr_gene_symbol', ['GENE%d' % ii for ii in range(num_rows)]),
+            ('pr_is_lmark', ['Y' if ii < num_landmarks else 'N'
+                             for ii in range(num_rows)])]
+
+def col_meta(start,stop):
+    '''
+    returns synthetic column meta data for columns start to stop: plate:well
+    style ids, perturbagen type and dose, and cell line
+    '''
+    columns = range(start, stop)
+    return [('id', ['BENCH%05d_%s_6H:%s%02d' % (ii // 384, CELL_IDS[(ii // 384) % 8],
+                                               'ABCDEFGHIJKLMNOP'[(ii % 384) // 24],
+                                               ii % 24 + 1) for ii in columns]),
+            ('pert_type', [PERT_TYPES[ii % 4] for ii in columns]),
+            ('pert_dose', [float(ii % 6) * 2.5 for ii in columns]),
+            ('cell_id', [CELL_IDS[(ii // 384) % 8] for ii in columns])]
+
+def make_gctx(dest,num_rows=978,num_cols=1000,chunkshape=None,layout='col',
+              compression='zlib',complevel=6,block_size=1000,seed=0):
+    '''
+    writes a synthetic gctx file of num_rows x num_cols random log2 style
+    expression values to dest, block_size columns at a time so that files of
+    any size can be generated.  chunkshape, layout and compression are passed
+    on to GCTXWriter.
+    '''
+    rng = numpy.random.RandomState(seed)
+    writer = gct.GCTXWriter(dest, row_meta(num_rows), chunkshape=chunkshape,
+                            layout=layout, compression=compression,
+                            complevel=complevel)
+    try:
+        for start in range(0, num_cols, block_size):
+            stop = min(start + block_size, num_cols)
+            block = rng.normal(8, 2, size=(num_rows, stop - start)).astype(numpy.float32)
+            writer.append(block, col_meta(start, stop))
+    finally:
+        writer.close()
+    return dest
+
+def make_gct(dest,src=None,num_rows=978,num_cols=1000,seed=0):
+    '''
+    writes a synthetic text gct file to dest, converting the gctx file src or
+    a new in memory data set of num_rows x num_cols
+    '''
+    if src:
+        GCTObject = gct.GCT(src)
+        GCTObject.read(verbose=False, lazy=True)
+        try:
+            GCTObject.write_gct(dest)
+        finally:
+            GCTObject.matrix.close()
+        return dest
+    rng = numpy.random.RandomState(seed)
+    matrix = rng.normal(8, 2, size=(num_rows, num_cols)).astype(numpy.float32)
+    gct.make_gct(matrix, row_meta(num_rows), col_meta(0, num_cols)).write_gct(dest)
+    return dest
@@ -0,0 +1,51 @@
+'''
+Created on Oct 17, 2026
+provides helpers for processing gct matrices one block of columns at a time
+'''
+import collections
+import multiprocessing.pool
+
+import numpy
+
+import cmap.io.gct as gct
+
+def iter_blocks(matrix,block_size=None):
+    '''
+    iterates over blocks of columns of an array or GCTXMatrix, yielding
+    (start, stop, block) tuples
+    '''
+    if isinstance(matrix, gct.GCTXMatrix):
+        for result in matrix.iter_blocks(axis=1, block_size=block_size):
+            yield result
+        return
+    if block_size is None:
+        block_size = 1000
+    for start in range(0, matrix.shape[1], block_size):
+        stop = min(start + block_size, matrix.shape[1])
+        yield start, stop, numpy.asarray(matrix[:,start:stop])
+
+def threaded_blocks(function,blocks,workers,*args):
+    '''
+    applies function(block, *args) to each (start, stop, block) of blocks in a
+    pool of threads, yielding (start, stop, result) in order.  Blocks are read
+    in the calling thread while earlier ones are processed, with at most
+    workers blocks in flight so memory stays bounded.
+    '''
+    if workers < 2:
+        for start,stop,block in blocks:
+            yield start, stop, function(block, *args)
+        return
+    pool = multiprocessing.pool.ThreadPool(workers)
+    pending = collections.deque()
+    try:
+        for start,stop,block in blocks:
+            pending.append((start, stop, pool.apply_async(function, (block,) + args)))
+            if len(pending) >= workers:
+                start, stop, result = pending.popleft()
+                yield start, stop, result.get()
+        while pending:
+            start, stop, result = pending.popleft()
+            yield start, stop, result.get()
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,375 @@
+'''
+Created on Oct 17, 2026
+provides vectorized peak deconvolution (dpeak) of bead level L1000 data
+'''
+import multiprocessing
+import os
+
+import numpy
+
+import cmap.io.gct as gct
+import cmap.io.lxb as lxb
+
+#analyte ids of a plate and the analytes that measure a single gene
+ALL_ANALYTES = range(1, 501)
+NOTDUO_ANALYTES = range(1, 12) + [499]
+
+def _segment_median(x,starts,counts):
+    '''
+    returns the median of each segment x[starts[i]:starts[i]+counts[i]] of
+    the segment-wise sorted array x, or NaN for empty segments
+    '''
+    starts = numpy.asarray(starts, dtype=numpy.int64)
+    counts = numpy.asarray(counts, dtype=numpy.int64)
+    medians = numpy.empty(len(starts), dtype=numpy.float64)
+    medians.fill(numpy.nan)
+    full = counts > 0
+    if len(x) and full.any():
+        lo = starts[full] + (counts[full] - 1) // 2
+        hi = starts[full] + counts[full] // 2
+        medians[full] = (x[lo] + x[hi]) / 2.0
+    return medians
+
+def _best_splits(x,groups,starts,counts,fit):
+    '''
+    returns, for each group of the group-wise sorted array x, the size of the
+    lower cluster of the optimal two cluster k-means partition.  In one
+    dimension the optimal partition splits the sorted values in two, so the
+    within cluster sum of squares of every split point of every group is
+    computed at once from cumulative sums and the best split is the minimum
+    of each group.  Groups with fit False get a split of 0.
+    '''
+    splits = numpy.zeros(len(starts), dtype=numpy.int64)
+    fit = fit & (counts > 1)
+    if not fit.any():
+        return splits
+    c1 = numpy.concatenate(([0.0], numpy.cumsum(x)))
+    c2 = numpy.concatenate(([0.0], numpy.cumsum(x * x)))
+
+    #split after position ii puts x[start:ii+1] in the lower cluster
+    ii = numpy.arange(len(x))
+    first = starts[groups]
+    end = first + counts[groups]
+    size = ii - first + 1
+    rest = end - ii - 1
+    valid = fit[groups] & (rest > 0)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        l1 = c1[ii + 1] - c1[first]
+        r1 = c1[end] - c1[ii + 1]
+        sse = (c2[ii + 1] - c2[first] - l1 * l1 / size +
+               c2[end] - c2[ii + 1] - r1 * r1 / rest)
+    sse[~valid] = numpy.inf
+
+    #first split point with the smallest sum of squares in each group
+    occupied = numpy.flatnonzero(counts > 0)
+    best = numpy.empty(len(starts), dtype=numpy.float64)
+    best.fill(numpy.inf)
+    best[occupied] = numpy.minimum.reduceat(sse, starts[occupied])
+    candidates = numpy.flatnonzero(valid & (sse == best[groups]))
+    found, first_candidate = numpy.unique(groups[candidates], return_index=True)
+    splits[found] = candidates[first_candidate] - starts[found] + 1
+    return splits
+
+def _kmeans_partitions(x,starts,counts,fit,max_k=4,batch_size=64):
+    '''
+    returns a dictionary mapping k = 2..max_k to an array with one row per
+    group holding the sizes, in order of increasing value, of the k clusters
+    of the optimal k-means partition of each group of the group-wise sorted
+    array x.  The partitions are found by dynamic programming over the split
+    points, for batches of groups of similar size at once.  Rows of groups
+    with fit False or fewer than k values are zero.
+    '''
+    partitions = dict((k, numpy.zeros((len(starts), k), dtype=numpy.int64))
+                      for k in range(2, max_k + 1))
+    fitted = numpy.flatnonzero(fit & (counts > 1))
+    fitted = fitted[numpy.argsort(counts[fitted], kind='mergesort')]
+    for batch_start in range(0, len(fitted), batch_size):
+        batch = fitted[batch_start:batch_start + batch_size]
+        n = counts[batch]
+        width = int(n.max())
+        rows = numpy.arange(len(batch))
+
+        #padded cumulative sums of each group's values
+        pos = numpy.arange(width)
+        values = x[starts[batch][:, numpy.newaxis] + numpy.minimum(pos, n[:, numpy.newaxis] - 1)]
+        values[pos >= n[:, numpy.newaxis]] = 0.0
+        c1 = numpy.zeros((len(batch), width + 1), dtype=numpy.float64)
+        c2 = numpy.zeros((len(batch), width + 1), dtype=numpy.float64)
+        numpy.cumsum(values, axis=1, out=c1[:, 1:])
+        numpy.cumsum(values * values, axis=1, out=c2[:, 1:])
+
+        #cost[j] is the smallest sum of squares of the first j values split
+        #into k clusters and split[k][:, j] the start of the last cluster
+        cost = numpy.empty((len(batch), width + 1), dtype=numpy.float64)
+        cost.fill(numpy.inf)
+        cost[:, 0] = 0.0
+        split = {}
+        for k in range(1, max_k + 1):
+            new_cost = numpy.empty_like(cost)
+            new_cost.fill(numpy.inf)
+            split[k] = numpy.zeros((len(batch), width + 1), dtype=numpy.int64)
+            for j in range(k, width + 1):
+                size = j - numpy.arange(j)
+                total = c1[:, j:j+1] - c1[:, :j]
+                candidates = (cost[:, :j] + c2[:, j:j+1] - c2[:, :j] - 
+                              total * total / size)
+                split[k][:, j] = numpy.argmin(candidates, axis=1)
+                new_cost[:, j] = candidates[rows, split[k][:, j]]
+            cost = new_cost
+            if k < 2:
+                continue
+
+            #walk back from the end of each group to recover the cluster sizes
+            end = n.copy()
+            sizes = numpy.zeros((len(batch), k), dtype=numpy.int64)
+            for level in range(k, 0, -1):
+                begin = split[level][rows, end]
+                sizes[:, level - 1] = end - begin
+                end = begin
+            sizes[n < k] = 0
+            partitions[k][batch] = sizes
+    return partitions
+
+def _bandwidths(x,groups,starts,counts,medians):
+    '''
+    returns the normal kernel bandwidth of each group, estimated from the
+    median absolute deviation as in matlab's ksdensity
+    '''
+    deviation = numpy.abs(x - medians[groups])
+    order = numpy.lexsort((deviation, groups))
+    sigma = _segment_median(deviation[order], starts, counts) / 0.6745
+    spread = numpy.zeros(len(starts), dtype=numpy.float64)
+    occupied = counts > 0
+    if occupied.any():
+        spread[occupied] = (numpy.maximum.reduceat(x, starts[occupied]) -
+                            numpy.minimum.reduceat(x, starts[occupied]))
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        sigma = numpy.where(sigma > 0, sigma, spread)
+        sigma = numpy.where(sigma > 0, sigma, 1.0)
+        return sigma * (4.0 / (3.0 * counts)) ** 0.2
+
+def _kernel_density(x,groups,counts,bandwidth,points):
+    '''
+    evaluates the normal kernel density of each group at points, an array
+    with one row of evaluation points per group
+    '''
+    heights = numpy.zeros(points.shape, dtype=numpy.float64)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        scale = counts * bandwidth * numpy.sqrt(2 * numpy.pi)
+        for kk in range(points.shape[1]):
+            z = (points[groups, kk] - x) / bandwidth[groups]
+            weights = numpy.exp(-0.5 * z * z)
+            heights[:, kk] = numpy.bincount(groups, weights, len(counts)) / scale
+    return heights
+
+def detect_peaks(rid,rp1,analytes=ALL_ANALYTES,notduo=NOTDUO_ANALYTES,
+                 lowthresh=4,highthresh=15,minbead=10,pkmethod='kmeans_opt',
+                 expect_support_pct=(65, 35)):
+    '''
+    detects the expression peaks of every analyte of one well, given the
+    analyte id (rid) and reporter intensity (rp1) of each bead, following
+    detect_lxb_peaks_single.m.  Intensities are log2 transformed and beads 
+    outside [lowthresh, highthresh] are censored.  Duo analytes with at 
+    least minbead good beads are clustered by an exact one dimensional 
+    k-means: with pkmethod='kmeans' into two peaks, with 'kmeans_opt' into 
+    the 1 to 4 peaks whose two largest supports are closest to 
+    expect_support_pct.  Other analytes (and all of them with 
+    pkmethod='median') report the median of their good beads.  The beads are
+    grouped by analyte with a single sort and all analytes are fit together
+    with array operations.
+
+    Returns a dictionary of arrays with one entry per analyte in analytes:
+    analyte_id, npeak, pkexp (linear scale), pksupport, pksupport_pct and
+    pkheight (two columns each holding the two best supported peaks in order
+    of decreasing support, NaN or 0 for a missing second peak), totbead, 
+    ngoodbead, medexp (log2 scale, 1 for analytes without good beads) and
+    method ('kmeans', 'kmeans_opt', 'median' or 'missing').  As in the 
+    matlab code, analytes without good beads get a pkexp of 2.  Unlike it,
+    the clustering is exact rather than the best of a few random restarts.
+
+    example usage:
+    import cmap.io.lxb as lxb
+    import cmap.analytics.dpeak as dpeak
+    data = lxb.read_lxb('A10.lxb')
+    pkstats = dpeak.detect_peaks(data['RID'], data['RP1'])
+    '''
+    if pkmethod not in ('kmeans_opt', 'kmeans', 'median'):
+        raise ValueError("unknown pkmethod %s" % (pkmethod,))
+    analytes = numpy.asarray(analytes, dtype=numpy.int64)
+    num_analytes = len(analytes)
+    lookup = numpy.empty(analytes.max() + 1, dtype=numpy.int64)
+    lookup.fill(-1)
+    lookup[analytes] = numpy.arange(num_analytes)
+
+    #map beads to analyte positions and log transform their intensities
+    rid = numpy.asarray(rid).astype(numpy.int64)
+    keep = (rid > 0) & (rid < len(lookup))
+    groups = lookup[rid[keep]]
+    x = numpy.asarray(rp1)[keep].astype(numpy.float64)
+    keep = groups >= 0
+    groups = groups[keep]
+    x = numpy.log2(numpy.maximum(x[keep], numpy.finfo(numpy.float64).eps))
+    totbead = numpy.bincount(groups, minlength=num_analytes)
+
+    #censor and sort the good beads by analyte, then intensity
+    good = (x >= lowthresh) & (x <= highthresh)
+    groups = groups[good]
+    x = x[good]
+    order = numpy.lexsort((x, groups))
+    groups = groups[order]
+    x = x[order]
+    ngoodbead = numpy.bincount(groups, minlength=num_analytes)
+    starts = numpy.cumsum(ngoodbead) - ngoodbead
+    medexp = _segment_median(x, starts, ngoodbead)
+
+    #cluster the duo analytes with enough beads, recording the offset and
+    #size of their two best supported peaks within the analyte's beads
+    fit = ngoodbead >= minbead
+    fit &= ~numpy.in1d(analytes, notduo)
+    if pkmethod == 'median':
+        fit[:] = False
+    offsets = numpy.zeros((num_analytes, 2), dtype=numpy.int64)
+    support = numpy.zeros((num_analytes, 2), dtype=numpy.int64)
+    support[:, 0] = ngoodbead
+    npeak = numpy.ones(num_analytes, dtype=numpy.int64)
+    if pkmethod == 'kmeans':
+        splits = _best_splits(x, groups, starts, ngoodbead, fit)
+        fit &= splits > 0
+        offsets[fit, 1] = splits[fit]
+        support[fit, 0] = splits[fit]
+        support[fit, 1] = (ngoodbead - splits)[fit]
+        npeak[fit] = 2
+    elif pkmethod == 'kmeans_opt':
+        #pick the number of peaks whose two largest supports are closest to
+        #the expected support, a single peak scoring against [100 0]
+        expect = numpy.asarray(expect_support_pct, dtype=numpy.float64)
+        score = numpy.empty(num_analytes, dtype=numpy.float64)
+        score.fill(numpy.abs(numpy.array([100.0, 0.0]) - expect).sum())
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            for k,sizes in sorted(_kmeans_partitions(x, starts, ngoodbead, fit).items()):
+                order = numpy.argsort(-sizes, axis=1, kind='mergesort')[:, :2]
+                top = sizes[numpy.arange(num_analytes)[:, numpy.newaxis], order]
+                k_score = numpy.abs(100.0 * top / ngoodbead[:, numpy.newaxis] - expect).sum(axis=1)
+                better = fit & (sizes > 0).all(axis=1) & (k_score < score)
+                cluster_offsets = numpy.cumsum(sizes, axis=1) - sizes
+                score[better] = k_score[better]
+                npeak[better] = k
+                support[better] = top[better]
+                offsets[better] = cluster_offsets[numpy.arange(num_analytes)[:, numpy.newaxis],
+                                                  order][better]
+    pkexp = numpy.empty((num_analytes, 2), dtype=numpy.float64)
+    pkexp.fill(numpy.nan)
+    pkexp[:, 0] = _segment_median(x, starts + offsets[:, 0], support[:, 0])
+    second = support[:, 1] > 0
+    pkexp[second, 1] = _segment_median(x, starts + offsets[:, 1], support[:, 1])[second]
+    heights = numpy.zeros((num_analytes, 2), dtype=numpy.float64)
+    if len(x):
+        bandwidth = _bandwidths(x, groups, starts, ngoodbead, medexp)
+        heights = _kernel_density(x, groups, ngoodbead, bandwidth, 
+                                  numpy.where(numpy.isnan(pkexp), medexp[:, numpy.newaxis], pkexp))
+
+    #order the peaks by decreasing support
+    swap = support[:, 1] > support[:, 0]
+    for values in (support, pkexp, heights):
+        values[swap] = values[swap][:, ::-1]
+
+    #analytes without good beads default to one on the log scale
+    missing = totbead == 0
+    medexp[numpy.isnan(medexp)] = 1.0
+    pkexp[ngoodbead == 0, 0] = 1.0
+    heights[~second, 1] = 0.0
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        pct = 100.0 * support / ngoodbead[:, numpy.newaxis]
+    pct[~second, 0] = 100.0
+    pct[~second, 1] = 0.0
+    pct[missing] = 0.0
+    pkexp = numpy.round(2 ** pkexp)
+    heights[ngoodbead == 0] = 0.0
+    method = numpy.where(fit, pkmethod, 'median').astype(object)
+    method[missing] = 'missing'
+    return {'analyte_id':analytes, 'npeak':npeak, 'pkexp':pkexp, 
+            'pksupport':support, 'pksupport_pct':pct, 'pkheight':heights, 
+            'totbead':totbead, 'ngoodbead':ngoodbead, 'medexp':medexp,
+            'method':method}
+
+def dpeak(src,**params):
+    '''
+    reads the lxb file in src and returns its detect_peaks statistics.
+    params are passed on to detect_peaks.
+    '''
+    data = lxb.read_lxb(src, params=('RID', 'RP1'))
+    return detect_peaks(data['RID'], data['RP1'], **params)
+
+def gex_row_meta(analytes=ALL_ANALYTES,notduo=NOTDUO_ANALYTES):
+    '''
+    returns the row meta data of the GEX matrix: two rows for each duo
+    analyte, holding its high ('HI') and low ('LO') support peak, and one
+    median ('MED') row for every other analyte
+    '''
+    notduo = set(notduo)
+    ids, analyte_ids, peaks = [], [], []
+    for analyte in analytes:
+        for peak in (('MED',) if analyte in notduo else ('HI', 'LO')):
+            ids.append('%d_%s' % (analyte, peak))
+            analyte_ids.append(analyte)
+            peaks.append(peak)
+    return [('id', ids), ('analyte_id', analyte_ids), ('peak', peaks)]
+
+def gex_values(pkstats,notduo=NOTDUO_ANALYTES):
+    '''
+    returns the GEX column of one well in the row order of gex_row_meta.  A
+    duo analyte with a single peak reports it for both of its rows.
+    '''
+    pkexp = pkstats['pkexp']
+    duo = ~numpy.in1d(pkstats['analyte_id'], notduo)
+    low = numpy.where(numpy.isnan(pkexp[:, 1]), pkexp[:, 0], pkexp[:, 1])
+    values = numpy.column_stack((pkexp[:, 0], low))
+    return values[numpy.column_stack((numpy.ones(len(duo), dtype=bool), duo))]
+
+def _dpeak_task(args):
+    '''
+    dpeak_plate worker that computes the GEX column of one lxb file
+    '''
+    src, params = args
+    pkstats = dpeak(src, **params)
+    return (gex_values(pkstats, params.get('notduo', NOTDUO_ANALYTES)),
+            int(pkstats['totbead'].sum()))
+
+def dpeak_plate(paths,workers=None,row_ids=None,**params):
+    '''
+    runs dpeak on the lxb files of a plate (one per well) in a pool of worker
+    processes and returns a GEX GCT object with one column per file and the
+    rows of gex_row_meta.  row_ids may map the default row ids (e.g. '25_HI')
+    to gene or probe ids.  params are passed on to detect_peaks.  Only the
+    peak values are sent back from the workers, never the bead data.
+
+    example usage:
+    import glob
+    import cmap.analytics.dpeak as dpeak
+    GCTObject = dpeak.dpeak_plate(sorted(glob.glob('plate/*.lxb')), workers=8)
+    GCTObject.write_gctx('plate_GEX.gctx')
+    '''
+    if not workers:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(paths))
+    tasks = [(path, params) for path in paths]
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(_dpeak_task, tasks, chunksize=4)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = map(_dpeak_task, tasks)
+
+    row_meta = gex_row_meta(params.get('analytes', ALL_ANALYTES),
+                            params.get('notduo', NOTDUO_ANALYTES))
+    if row_ids:
+        row_meta[0] = ('id', [row_ids.get(x, x) for x in row_meta[0][1]])
+    matrix = numpy.empty((len(row_meta[0][1]), len(paths)), dtype=numpy.float32)
+    for ii,(values,totbead) in enumerate(results):
+        matrix[:, ii] = values
+    col_meta = [('id', [os.path.splitext(os.path.basename(x))[0] for x in paths]),
+                ('totbead', [x[1] for x in results])]
+    return gct.make_gct(matrix, row_meta, col_meta)
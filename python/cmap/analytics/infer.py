@@ -0,0 +1,221 @@
+'''
+Created on Oct 17, 2026
+provides blocked linear inference of non landmark gene expression
+'''
+import contextlib
+import os
+
+import numpy
+
+try:
+    import scipy.io
+except ImportError:
+    scipy = None
+
+import cmap.analytics.blocks as blocks
+import cmap.io.chip as chip
+import cmap.io.gct as gct
+
+#default probe annotations shipped in the data directory of l1ktools
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        os.pardir, os.pardir, os.pardir, 'data')
+DEFAULT_CHIP = os.path.join(DATA_DIR, 'HG_U133A.chip')
+
+class InferenceModel(object):
+    '''
+    linear model that infers the expression of the dependent genes from the
+    landmark genes.  wt has one row per dependent and one column per landmark
+    plus a leading intercept column, as in the 'pinv_int' models of
+    l1kt_infer.  Models are loaded from the .mat files of the matlab tools
+    (which requires scipy) or from .npz files written with save.
+
+    example usage:
+    import cmap.analytics.infer as infer
+    model = infer.InferenceModel.load('mlr12k_epsilon5253_978.mat')
+    model.save('mlr12k_epsilon5253_978.npz')
+    '''
+    def __init__(self,wt,landmarks,dependents,name='unnamed'):
+        self.wt = numpy.asarray(wt)
+        self.landmarks = [str(x) for x in landmarks]
+        self.dependents = [str(x) for x in dependents]
+        self.name = name
+        if self.wt.shape != (len(self.dependents), len(self.landmarks) + 1):
+            raise ValueError("wt has shape %r, expected %r" % (self.wt.shape,
+                             (len(self.dependents), len(self.landmarks) + 1)))
+
+    def __repr__(self):
+        return 'InferenceModel(name=%r, landmarks=%d, dependents=%d)' % (
+                    self.name, len(self.landmarks), len(self.dependents))
+
+    def save(self,path):
+        '''
+        saves the model to the .npz file given in path
+        '''
+        with open(path, 'wb') as f:
+            numpy.savez(f, wt=self.wt, cn=numpy.array(self.landmarks),
+                        rn=numpy.array(self.dependents),
+                        name=numpy.array(self.name))
+
+    @classmethod
+    def load(cls,path):
+        '''
+        loads a model from a .npz file or a matlab .mat file holding a model
+        structure with wt, cn (landmarks) and rn (dependents) fields
+        '''
+        name = os.path.splitext(os.path.basename(path))[0]
+        if path.endswith('.npz'):
+            with contextlib.closing(numpy.load(path)) as data:
+                return cls(data['wt'], data['cn'].tolist(), data['rn'].tolist(),
+                           str(data['name']) if 'name' in data.files else name)
+        if path.endswith('.mat'):
+            if scipy is None:
+                raise ImportError("reading .mat models requires scipy")
+            model = scipy.io.loadmat(path, squeeze_me=True,
+                                     struct_as_record=False)['model']
+            return cls(model.wt, numpy.atleast_1d(model.cn).tolist(),
+                       numpy.atleast_1d(model.rn).tolist(), name)
+        raise ValueError("unsupported model file %s" % (path,))
+
+def _infer_block(block,coefficients,intercept,minval,maxval,order):
+    '''
+    infer worker that appends the inferred dependents to a block of landmark
+    columns with one matrix product
+    '''
+    block = numpy.asarray(block, dtype=coefficients.dtype)
+    inferred = numpy.dot(coefficients, block)
+    inferred += intercept[:, numpy.newaxis]
+    numpy.clip(inferred, minval, maxval, out=inferred)
+    result = numpy.vstack((block, inferred))
+    if order is not None:
+        result = result[order]
+    return result
+
+def _row_meta(landmark_meta,model,chip_file):
+    '''
+    builds the row meta data of the inferred data set: the meta data of the
+    landmarks followed by that of the dependents, with gene annotations from
+    chip_file and the pr_is_lmark and pr_model_id fields
+    '''
+    ids = model.landmarks + model.dependents
+    num_landmarks = len(model.landmarks)
+    meta = [('id', ids)]
+    for header,values in landmark_meta:
+        if header != 'id':
+            meta.append((header, list(values) + [gct.MISSING_META_VALUE] *
+                         len(model.dependents)))
+
+    annotations = chip.read_chip(chip_file) if chip_file else {}
+    positions = dict((x,ii) for ii,x in enumerate(annotations.get('pr_id', [])))
+    new_fields = []
+    for header in ('pr_gene_symbol', 'pr_gene_title', 'pr_gene_id'):
+        values = annotations.get(header)
+        new_fields.append((header, [values[positions[x]] if x in positions else ''
+                                    for x in ids] if values else [''] * len(ids)))
+    new_fields.append(('pr_is_lmark', ['Y'] * num_landmarks +
+                       ['N'] * len(model.dependents)))
+    new_fields.append(('pr_model_id', [gct.MISSING_META_VALUE] * num_landmarks +
+                       [model.name] * len(model.dependents)))
+    new_headers = [x[0] for x in new_fields]
+    return [x for x in meta if x[0] not in new_headers] + new_fields
+
+def _feature_order(row_meta):
+    '''
+    returns the row order that puts landmarks first and sorts by analyte
+    number (if present) and gene symbol, as matlab's sort_features does
+    '''
+    fields = dict(row_meta)
+    symbols = fields['pr_gene_symbol']
+    landmark = fields['pr_is_lmark']
+    analyte = fields.get('pr_analyte_num', [0] * len(symbols))
+    def key(ii):
+        try:
+            number = float(analyte[ii])
+        except ValueError:
+            number = numpy.inf
+        return (landmark[ii] != 'Y', number, symbols[ii])
+    return sorted(range(len(symbols)), key=key)
+
+def infer(src,model,dest=None,chip_file=DEFAULT_CHIP,block_size=1000,workers=2,
+          minval=0,maxval=15,sort_features=True,dtype=numpy.float32,
+          compression='zlib',complevel=6):
+    '''
+    infers the expression of the dependent genes of model (an InferenceModel
+    or the path of one) for every sample of the gct or gctx file src.  Only
+    the landmark rows are read, block_size columns at a time; each block is
+    multiplied by the model weights with a single float32 matrix product (a
+    multithreaded BLAS GEMM) while the next block is read, and the landmarks
+    plus the inferred rows (clipped to [minval, maxval]) are streamed to the
+    gctx file dest.  If dest is not given a GCT object is returned.  Row meta
+    data is annotated from chip_file and, with sort_features, landmarks come
+    first and rows are sorted by gene symbol.  Compressing the ~22k row output
+    usually costs more than the products, so compression and complevel (see
+    GCTXWriter) are worth lowering when throughput matters.
+
+    example usage:
+    import cmap.analytics.infer as infer
+    infer.infer('plate_NORM.gctx', 'model.npz', 'plate_INF.gctx')
+    '''
+    if not isinstance(model, InferenceModel):
+        model = InferenceModel.load(model)
+    GCTObject = gct.GCT(src)
+    GCTObject.read(verbose=False, lazy=True)
+    if isinstance(GCTObject.matrix, basestring):
+        raise gct.GCTException("could not read %s" % (src,))
+
+    #find the landmark rows and restrict the matrix to them
+    row_meta = GCTObject.get_meta_fields('row')
+    positions = {}
+    for ii,x in enumerate(dict(row_meta)['id']):
+        positions.setdefault(x, ii)
+    missing = [x for x in model.landmarks if x not in positions]
+    if missing:
+        if isinstance(GCTObject.matrix, gct.GCTXMatrix):
+            GCTObject.matrix.close()
+        raise ValueError("%d/%d landmarks not found in %s"
+                         % (len(missing), len(model.landmarks), src))
+    landmark_inds = [positions[x] for x in model.landmarks]
+    if isinstance(GCTObject.matrix, gct.GCTXMatrix):
+        GCTObject.matrix.close()
+        matrix = gct.GCTXMatrix(src, row_inds=landmark_inds)
+    else:
+        matrix = numpy.asarray(GCTObject.matrix)[landmark_inds]
+    landmark_meta = [(header, [values[x] for x in landmark_inds])
+                     for header,values in row_meta]
+
+    #set up the output rows
+    out_meta = _row_meta(landmark_meta, model, chip_file)
+    order = None
+    if sort_features:
+        order = numpy.array(_feature_order(out_meta), dtype=numpy.int64)
+        out_meta = [(header, [values[x] for x in order]) for header,values in out_meta]
+    wt = numpy.asarray(model.wt, dtype=dtype)
+    coefficients = numpy.ascontiguousarray(wt[:, 1:])
+    intercept = numpy.ascontiguousarray(wt[:, 0])
+    col_meta = GCTObject.get_meta_fields('col')
+
+    writer = None
+    if dest:
+        writer = gct.GCTXWriter(dest, out_meta, dtype=dtype,
+                                compression=compression, complevel=complevel)
+    output = []
+    try:
+        for start,stop,block in blocks.threaded_blocks(_infer_block,
+                    blocks.iter_blocks(matrix, block_size), workers,
+                    coefficients, intercept, minval, maxval, order):
+            if writer:
+                writer.append(block, [(header, values[start:stop])
+                                      for header,values in col_meta])
+            else:
+                output.append(block)
+    finally:
+        if writer:
+            writer.close()
+        if isinstance(matrix, gct.GCTXMatrix):
+            matrix.close()
+    if writer:
+        return None
+    if output:
+        inferred = numpy.hstack(output)
+    else:
+        inferred = numpy.zeros((len(out_meta[0][1]), 0), dtype=dtype)
+    return gct.make_gct(inferred, out_meta, col_meta)
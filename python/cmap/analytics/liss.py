@@ -0,0 +1,362 @@
+'''
+Created on Oct 17, 2026
+provides batched L1000 invariant set scaling (LISS)
+'''
+import multiprocessing
+import os
+
+import numpy
+
+import cmap.analytics.blocks as blocks
+import cmap.io.gct as gct
+import cmap.io.gmx as gmx
+
+#default calibration files shipped in the data directory of l1ktools
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        os.pardir, os.pardir, os.pardir, 'data')
+DEFAULT_REF = os.path.join(DATA_DIR, 'log_ybio_epsilon.gct')
+DEFAULT_GMX_CAL = os.path.join(DATA_DIR, 'epsilon_cal.gmx')
+
+#per sample quality metrics reported as column meta data
+QC_FIELDS = ['qcpass', 'Calib_slope', 'Calib_slope_deg', 'Calib_span',
+             'Calib_linfit_Rsquare', 'Coef_a', 'Coef_b', 'Coef_c', 'Rsquare',
+             'Truncated_genes', 'Median']
+
+def read_reference(ref=DEFAULT_REF):
+    '''
+    reads the reference calibration curve (log2 expression of the baseline,
+    the calibration levels and the two saturation points) from the gct file ref
+    '''
+    GCTObject = gct.GCT(ref)
+    GCTObject.read(verbose=False)
+    if isinstance(GCTObject.matrix, basestring):
+        raise gct.GCTException("could not read %s" % (ref,))
+    return numpy.asarray(GCTObject.matrix, dtype=numpy.float64)[0]
+
+def _prctile(sorted_block,percent):
+    '''
+    returns the given percentile of each column of sorted_block, interpolated
+    the way matlab's prctile does
+    '''
+    num_rows = sorted_block.shape[0]
+    position = numpy.clip(num_rows * percent / 100.0 + 0.5, 1, num_rows) - 1
+    lo = int(numpy.floor(position))
+    hi = min(lo + 1, num_rows - 1)
+    fraction = position - lo
+    return sorted_block[lo] + fraction * (sorted_block[hi] - sorted_block[lo])
+
+def _lowess_weights(x,span):
+    '''
+    returns the tricube weights of the local fit at each point of x (rows)
+    over its span nearest neighbours (columns)
+    '''
+    distance = numpy.abs(x[:, numpy.newaxis] - x[numpy.newaxis, :])
+    span = min(int(span), len(x))
+    weights = numpy.zeros(distance.shape, dtype=numpy.float64)
+    for ii in range(len(x)):
+        neighbours = numpy.argsort(distance[ii], kind='mergesort')[:span]
+        scale = distance[ii, neighbours].max()
+        if scale <= 0:
+            weights[ii, neighbours] = 1.0
+        else:
+            weights[ii, neighbours] = (1 - (distance[ii, neighbours] / scale) ** 3) ** 3
+    return weights
+
+def _local_linear(x,y,weights):
+    '''
+    evaluates the weighted least squares line through (x, y[s]) at each point
+    of x, for all samples s at once.  weights has shape (samples, points, x).
+    '''
+    w = weights
+    wy = w * y[:, numpy.newaxis, :]
+    s0 = w.sum(axis=2)
+    s1 = (w * x).sum(axis=2)
+    s2 = (w * x * x).sum(axis=2)
+    t0 = wy.sum(axis=2)
+    t1 = (wy * x).sum(axis=2)
+    denominator = s0 * s2 - s1 * s1
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        slope = (s0 * t1 - s1 * t0) / denominator
+        mean = t0 / s0
+        fitted = mean + slope * (x - s1 / s0)
+    flat = numpy.abs(denominator) <= 1e-12 * numpy.maximum(s0 * s2, 1e-300)
+    fitted = numpy.where(flat, mean, fitted)
+    return numpy.where(s0 > 0, fitted, y)
+
+def robust_lowess(x,y,span=4,iterations=5):
+    '''
+    smooths each row of y against the shared abscissa x with a locally linear
+    lowess fit over span nearest points, followed by iterations rounds of
+    bisquare reweighting of the residuals (as matlab's malowess with robust
+    set to true).  All rows are smoothed at once.
+    '''
+    x = numpy.asarray(x, dtype=numpy.float64)
+    y = numpy.asarray(y, dtype=numpy.float64)
+    local = _lowess_weights(x, span)[numpy.newaxis]
+    fitted = _local_linear(x, y, numpy.repeat(local, len(y), axis=0))
+    for ii in range(iterations):
+        residual = y - fitted
+        mad = numpy.median(numpy.abs(residual), axis=1)[:, numpy.newaxis]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            u = residual / (6 * mad)
+        robust = numpy.where(numpy.abs(u) < 1, (1 - u * u) ** 2, 0.0)
+        robust[(mad <= 0).ravel()] = 1.0
+        fitted = _local_linear(x, y, local * robust[:, numpy.newaxis, :])
+    return fitted
+
+def _linear_fit(x,target):
+    '''
+    least squares fit of target = a + b * x[s] for each row of x, returning
+    the intercepts, slopes and coefficients of determination
+    '''
+    xm = x.mean(axis=1)
+    tm = target.mean()
+    dx = x - xm[:, numpy.newaxis]
+    dt = target - tm
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        slope = (dx * dt).sum(axis=1) / (dx * dx).sum(axis=1)
+        intercept = tm - slope * xm
+        residual = target - (intercept[:, numpy.newaxis] + slope[:, numpy.newaxis] * x)
+        rsquare = 1 - (residual ** 2).sum(axis=1) / (dt ** 2).sum()
+    return intercept, slope, rsquare
+
+def _power_sse(x,target,b):
+    '''
+    returns the residual sum of squares of the best fit of target = a * x**b
+    + c for each exponent in b, which has one row per row of x, along with
+    the fitted a and c
+    '''
+    power = x[:, numpy.newaxis, :] ** b[:, :, numpy.newaxis]
+    centered = power - power.mean(axis=2)[:, :, numpy.newaxis]
+    dt = target - target.mean()
+    spp = (centered * centered).sum(axis=2)
+    spt = (centered * dt).sum(axis=2)
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        a = spt / spp
+        sse = (dt * dt).sum() - a * spt
+    sse = numpy.where(numpy.isfinite(sse), sse, numpy.inf)
+    c = target.mean() - a * power.mean(axis=2)
+    return sse, a, c
+
+def _power_fit(x,target,min_exponent=0.02,max_exponent=10.0,grid_size=64,
+               iterations=40):
+    '''
+    least squares fit of target = a * x[s]**b + c for each row of x (all
+    positive), for all rows at once.  For a fixed exponent b the best a and c
+    have a closed form, so b is located on a log spaced grid between
+    min_exponent and max_exponent and refined by a golden section search
+    around the best grid point.  Returns arrays a, b, c and the coefficients
+    of determination.
+    '''
+    num_rows = len(x)
+    grid = numpy.exp(numpy.linspace(numpy.log(min_exponent), numpy.log(max_exponent),
+                                    grid_size))
+    sse, a, c = _power_sse(x, target, numpy.tile(grid, (num_rows, 1)))
+    best = numpy.argmin(sse, axis=1)
+    lo = numpy.log(grid[numpy.maximum(best - 1, 0)])
+    hi = numpy.log(grid[numpy.minimum(best + 1, grid_size - 1)])
+
+    #golden section search on log(b) within the bracketing grid points
+    ratio = (numpy.sqrt(5) - 1) / 2
+    left = hi - ratio * (hi - lo)
+    right = lo + ratio * (hi - lo)
+    left_sse = _power_sse(x, target, numpy.exp(left)[:, numpy.newaxis])[0][:, 0]
+    right_sse = _power_sse(x, target, numpy.exp(right)[:, numpy.newaxis])[0][:, 0]
+    for ii in range(iterations):
+        #keep the side of the bracket around the lower of the two probes and
+        #evaluate one new probe in it
+        move = left_sse < right_sse
+        hi = numpy.where(move, right, hi)
+        lo = numpy.where(move, lo, left)
+        kept = numpy.where(move, left, right)
+        kept_sse = numpy.where(move, left_sse, right_sse)
+        probe = numpy.where(move, hi - ratio * (hi - lo), lo + ratio * (hi - lo))
+        probe_sse = _power_sse(x, target, numpy.exp(probe)[:, numpy.newaxis])[0][:, 0]
+        left = numpy.where(move, probe, kept)
+        left_sse = numpy.where(move, probe_sse, kept_sse)
+        right = numpy.where(move, kept, probe)
+        right_sse = numpy.where(move, kept_sse, probe_sse)
+    b = numpy.exp((lo + hi) / 2)
+    sse, a, c = _power_sse(x, target, b[:, numpy.newaxis])
+    rsquare = 1 - sse[:, 0] / ((target - target.mean()) ** 2).sum()
+    return a[:, 0], b, c[:, 0], rsquare
+
+def _tiedrank(values):
+    '''
+    returns the ascending ranks of values, starting at 1, with ties given the
+    average of their ranks
+    '''
+    order = numpy.argsort(values, kind='mergesort')
+    ranks = numpy.empty(len(values), dtype=numpy.float64)
+    ranks[order] = numpy.arange(1, len(values) + 1)
+    unique, inverse = numpy.unique(values, return_inverse=True)
+    if len(unique) < len(values):
+        ranks = (numpy.bincount(inverse, ranks) / numpy.bincount(inverse))[inverse]
+    return ranks
+
+def _truncate(y,minval,maxval,precision):
+    '''
+    clips each column of y to [minval, maxval], spreading the clipped values
+    just outside the range so their rank order is kept
+    '''
+    resolution = 1.0 / 10 ** precision
+    top = y >= maxval
+    bottom = y <= minval
+    for jj in numpy.flatnonzero(top.any(axis=0) | bottom.any(axis=0)):
+        column = y[:, jj]
+        high = top[:, jj]
+        low = bottom[:, jj]
+        if high.any():
+            column[high] = maxval + resolution * (_tiedrank(column[high]) - 1)
+        if low.any():
+            column[low] = minval - resolution * (_tiedrank(-column[low]) - 1)
+    return (top | bottom).sum(axis=0)
+
+def liss_block(block,calib_inds,ref,fitmodel='power',minval=0,maxval=15,
+               precision=4):
+    '''
+    scales a block of samples (the columns of block, in linear scale) to the
+    reference calibration curve ref.  calib_inds holds the row indices of the
+    genes of each calibration level.  For every sample the observed curve is
+    built from its 1st percentile, the median of each calibration level and
+    its 99th percentile, smoothed by robust_lowess, and fit to ref with a
+    'power' (a*x^b + c) or 'linear' model that is then applied to the whole
+    sample.  All samples of the block are fit together.  Samples whose curve
+    fails the quality checks are set to zero.  Returns the scaled log2 block
+    and a dictionary of per sample QC_FIELDS arrays.
+    '''
+    if fitmodel not in ('power', 'linear'):
+        raise ValueError("unknown fitmodel %s" % (fitmodel,))
+    ref = numpy.asarray(ref, dtype=numpy.float64)
+    logged = numpy.log2(numpy.maximum(numpy.asarray(block, dtype=numpy.float64),
+                                      numpy.finfo(numpy.float64).eps))
+    num_samples = logged.shape[1]
+    num_levels = len(calib_inds)
+    if len(ref) != num_levels + 3:
+        raise ValueError("the reference has %d values, expected %d"
+                         % (len(ref), num_levels + 3))
+
+    #observed calibration curves, one row per sample
+    ordered = numpy.sort(logged, axis=0)
+    yobs = numpy.zeros((num_samples, num_levels + 3), dtype=numpy.float64)
+    yobs[:, 0] = numpy.maximum(_prctile(ordered, 1), 1)
+    with numpy.errstate(invalid='ignore'):
+        for ii,inds in enumerate(calib_inds):
+            yobs[:, ii + 1] = numpy.maximum(numpy.nanmedian(logged[inds], axis=0), 0)
+    yobs = robust_lowess(ref, yobs, span=4)
+    yobs[:, -1] = numpy.maximum(_prctile(ordered, 99), yobs[:, -1])
+    passed = (numpy.isfinite(yobs).all(axis=1) &
+              ((yobs != 0).sum(axis=1) >= yobs.shape[1] - 1))
+
+    #fit the curves of the passing samples to the reference, ignoring the
+    #saturation points
+    cobs = numpy.maximum(yobs[:, :-2], 1)
+    target = ref[:-2]
+    qc = dict((field, numpy.zeros(num_samples, dtype=numpy.float64))
+              for field in QC_FIELDS)
+    qc['qcpass'] = passed.astype(numpy.int64)
+    qc['Truncated_genes'] = numpy.zeros(num_samples, dtype=numpy.int64)
+    qc['Calib_span'] = cobs[:, -1] - cobs[:, 0]
+    qc['Calib_slope'] = cobs[:, -1] / cobs[:, 0]
+    scaled = numpy.zeros(logged.shape, dtype=numpy.float64)
+    inds = numpy.flatnonzero(passed)
+    if len(inds):
+        intercept, slope, linear_rsquare = _linear_fit(cobs[inds], target)
+        qc['Calib_slope'][inds] = slope
+        qc['Calib_linfit_Rsquare'][inds] = linear_rsquare
+        x = numpy.maximum(logged[:, inds], 1)
+        if fitmodel == 'linear':
+            a, b, c, rsquare = slope, numpy.ones(len(inds)), intercept, linear_rsquare
+            y = c + a * x
+        else:
+            a, b, c, rsquare = _power_fit(cobs[inds], target)
+            y = a * x ** b + c
+        qc['Coef_a'][inds] = a
+        qc['Coef_b'][inds] = b
+        qc['Coef_c'][inds] = c
+        qc['Rsquare'][inds] = rsquare
+        qc['Truncated_genes'][inds] = _truncate(y, minval, maxval, precision)
+        qc['Median'][inds] = numpy.median(y, axis=0)
+        scaled[:, inds] = y
+    qc['Calib_slope_deg'] = numpy.degrees(numpy.arctan(qc['Calib_slope']))
+    return scaled, qc
+
+def _liss_task(block,calib_inds,keep,ref,params):
+    '''
+    liss worker that scales one column block and drops the calibration rows
+    '''
+    scaled, qc = liss_block(block, calib_inds, ref, **params)
+    return scaled[keep], qc
+
+def liss(src,dest=None,ref=DEFAULT_REF,gmx_cal=DEFAULT_GMX_CAL,block_size=1000,
+         workers=None,drop_calib=True,dtype=numpy.float32,**params):
+    '''
+    applies invariant set scaling to the raw (linear scale) gct or gctx file
+    src.  The calibration genes of each level are read from the gmx file
+    gmx_cal and the reference curve from the gct file ref.  Samples are
+    processed block_size columns at a time, each block fit in one batch, in a
+    pool of workers threads.  The calibration rows are dropped from the output
+    unless drop_calib is False, and the QC_FIELDS of each sample are added to
+    the column meta data.  If dest is given the result is streamed to that
+    gctx file, otherwise a GCT object is returned.  params are passed on to
+    liss_block.
+
+    example usage:
+    import cmap.analytics.liss as liss
+    liss.liss('plate_GEX.gctx', 'plate_NORM.gctx', workers=8)
+    '''
+    if not workers:
+        workers = multiprocessing.cpu_count()
+    reference = read_reference(ref)
+    GCTObject = gct.GCT(src)
+    GCTObject.read(verbose=False, lazy=True)
+    if isinstance(GCTObject.matrix, basestring):
+        raise gct.GCTException("could not read %s" % (src,))
+    matrix = GCTObject.matrix
+
+    #find the calibration rows of each level
+    row_meta = GCTObject.get_meta_fields('row')
+    positions = dict((x,ii) for ii,x in reversed(list(enumerate(dict(row_meta)['id']))))
+    calib_inds = []
+    for name,desc,members in gmx.read_gmx(gmx_cal):
+        inds = [positions[x] for x in members if x in positions]
+        if not inds:
+            raise ValueError("no calibration genes found at level %s" % (name,))
+        calib_inds.append(numpy.array(inds, dtype=numpy.int64))
+    keep = numpy.ones(matrix.shape[0], dtype=bool)
+    if drop_calib:
+        keep[numpy.concatenate(calib_inds)] = False
+    row_meta = [(header, [x for x,kept in zip(values, keep) if kept])
+                for header,values in row_meta]
+    col_meta = GCTObject.get_meta_fields('col')
+
+    writer = None
+    if dest:
+        writer = gct.GCTXWriter(dest, row_meta, dtype=dtype)
+    output = []
+    qc_fields = dict((field, []) for field in QC_FIELDS)
+    try:
+        for start,stop,(scaled,qc) in blocks.threaded_blocks(_liss_task,
+                    blocks.iter_blocks(matrix, block_size), workers,
+                    calib_inds, keep, reference, params):
+            block_meta = [(header, values[start:stop]) for header,values in col_meta]
+            block_meta += [(field, qc[field].tolist()) for field in QC_FIELDS]
+            if writer:
+                writer.append(scaled, block_meta)
+            else:
+                output.append(scaled.astype(dtype))
+                for field in QC_FIELDS:
+                    qc_fields[field].extend(qc[field].tolist())
+    finally:
+        if writer:
+            writer.close()
+        if isinstance(matrix, gct.GCTXMatrix):
+            matrix.close()
+    if writer:
+        return None
+    if output:
+        scaled = numpy.hstack(output)
+    else:
+        scaled = numpy.zeros((int(keep.sum()), 0), dtype=dtype)
+    return gct.make_gct(scaled, row_meta,
+                        col_meta + [(field, qc_fields[field]) for field in QC_FIELDS])
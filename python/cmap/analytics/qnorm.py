@@ -0,0 +1,143 @@
+'''
+Created on Oct 17, 2026
+provides out of core quantile normalization of gct and gctx matrices
+'''
+import multiprocessing
+import os
+import tempfile
+
+import numpy
+
+import cmap.analytics.blocks as blocks
+import cmap.io.gct as gct
+
+def _sort_block(block):
+    '''
+    sorts each column of block
+    '''
+    return numpy.sort(block, axis=0)
+
+def _apply_reference(block,reference):
+    '''
+    replaces the values of each column of block by the entries of the sorted
+    reference distribution with the same rank
+    '''
+    order = numpy.argsort(block, axis=0, kind='mergesort')
+    normalized = numpy.empty(block.shape, dtype=reference.dtype)
+    normalized[order, numpy.arange(block.shape[1])] = reference[:, numpy.newaxis]
+    return normalized
+
+def _resample(reference,num_rows):
+    '''
+    linearly interpolates a sorted reference distribution to num_rows values,
+    as done for quantile sketches with a different number of rows
+    '''
+    reference = numpy.sort(numpy.asarray(reference, dtype=numpy.float64).ravel())
+    if len(reference) == num_rows:
+        return reference
+    return numpy.interp(numpy.linspace(0, 1, num_rows),
+                        numpy.linspace(0, 1, len(reference)), reference)
+
+def reference_distribution(matrix,method='median',block_size=None,workers=None,
+                           tmp_dir=None):
+    '''
+    computes the quantile normalization reference of matrix (an array or a
+    GCTXMatrix): the median (or mean) across columns of the sorted columns.
+    Column blocks are sorted in a pool of workers threads.  The mean is
+    accumulated while streaming; for the median the sorted columns are spilled
+    to a temporary memmap in tmp_dir and reduced a block of ranks at a time.
+    '''
+    if method not in ('median', 'mean'):
+        raise ValueError("method must be 'median' or 'mean'")
+    if not workers:
+        workers = multiprocessing.cpu_count()
+    num_rows, num_cols = matrix.shape
+    sorted_blocks = blocks.threaded_blocks(_sort_block,
+                        blocks.iter_blocks(matrix, block_size), workers)
+    if method == 'mean':
+        total = numpy.zeros(num_rows, dtype=numpy.float64)
+        for start,stop,block in sorted_blocks:
+            total += block.sum(axis=1)
+        return total / max(1, num_cols)
+
+    fd, path = tempfile.mkstemp(suffix='.qnorm', dir=tmp_dir)
+    os.close(fd)
+    try:
+        ranks = numpy.memmap(path, dtype=matrix.dtype, mode='w+',
+                             shape=(num_rows, max(1, num_cols)))
+        for start,stop,block in sorted_blocks:
+            ranks[:,start:stop] = block
+        reference = numpy.empty(num_rows, dtype=numpy.float64)
+        rank_block = max(1, 2**22 // max(1, num_cols))
+        for start in range(0, num_rows, rank_block):
+            stop = min(start + rank_block, num_rows)
+            reference[start:stop] = numpy.median(ranks[start:stop,:num_cols], axis=1)
+        del ranks
+    finally:
+        os.remove(path)
+    return reference
+
+def qnorm(matrix,reference='median',block_size=None,workers=None):
+    '''
+    quantile normalizes the columns of the in memory matrix and returns the
+    result.  reference is 'median' or 'mean' (computed from matrix) or a
+    sorted target distribution (a quantile sketch), which is interpolated if
+    its length differs from the number of rows.
+
+    example usage:
+    import cmap.analytics.qnorm as qnorm
+    GCTObject.matrix = qnorm.qnorm(GCTObject.matrix)
+    '''
+    if not workers:
+        workers = multiprocessing.cpu_count()
+    if isinstance(reference, basestring):
+        reference = reference_distribution(matrix, reference, block_size, workers)
+    reference = _resample(reference, matrix.shape[0]).astype(matrix.dtype)
+    normalized = numpy.empty(matrix.shape, dtype=matrix.dtype)
+    for start,stop,block in blocks.threaded_blocks(_apply_reference,
+                blocks.iter_blocks(matrix, block_size), workers, reference):
+        normalized[:,start:stop] = block
+    return normalized
+
+def qnorm_gctx(src,dest,reference='median',block_size=None,workers=None,
+               tmp_dir=None,chunkshape=None,layout='col',compression='zlib',
+               complevel=6,dtype=numpy.float32):
+    '''
+    quantile normalizes the gctx file src and writes the result to the gctx
+    file dest without loading the matrix into memory.  The reference is built
+    by streaming column blocks (by default one chunk wide) from the matrix
+    node, then each block is normalized and appended to dest through a
+    GCTXWriter.  Memory use is a few column blocks (plus a block of ranks
+    when taking the median) regardless of the number of samples.  See qnorm
+    for reference and GCTXWriter for the output options.
+
+    example usage:
+    import cmap.analytics.qnorm as qnorm
+    qnorm.qnorm_gctx('plate_GEX.gctx', 'plate_QNORM.gctx', workers=8)
+    '''
+    if not workers:
+        workers = multiprocessing.cpu_count()
+    GCTObject = gct.GCT(src)
+    GCTObject.read(verbose=False, lazy=True)
+    if not isinstance(GCTObject.matrix, gct.GCTXMatrix):
+        raise gct.GCTException("could not read %s" % (src,))
+    matrix = GCTObject.matrix
+    try:
+        if isinstance(reference, basestring):
+            reference = reference_distribution(matrix, reference, block_size,
+                                               workers, tmp_dir)
+        reference = _resample(reference, matrix.shape[0]).astype(dtype)
+        col_meta = GCTObject.get_meta_fields('col')
+        writer = gct.GCTXWriter(dest, GCTObject.get_meta_fields('row'),
+                                chunkshape=chunkshape, layout=layout,
+                                compression=compression, complevel=complevel,
+                                dtype=dtype)
+        try:
+            for start,stop,block in blocks.threaded_blocks(_apply_reference,
+                        blocks.iter_blocks(matrix, block_size), workers, reference):
+                writer.append(block, [(header, values[start:stop])
+                                      for header,values in col_meta])
+        finally:
+            writer.close()
+    finally:
+        matrix.close()
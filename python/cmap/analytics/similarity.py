@@ -0,0 +1,231 @@
+'''
+Created on Oct 17, 2026
+provides blocked top k similarity search of query signatures against the
+columns of gctx files
+'''
+import os
+
+import numpy
+
+import cmap.io.gct as gct
+
+METRICS = ('pearson', 'spearman', 'cosine')
+
+def _block_ranks(block):
+    '''
+    returns the ascending ranks of each column of block, starting at 1, with
+    ties given the average of their ranks
+    '''
+    block = numpy.asarray(block)
+    num_rows, num_cols = block.shape
+    order = numpy.argsort(block, axis=0, kind='mergesort')
+    columns = numpy.arange(num_cols)
+    ordered = block[order, columns]
+
+    #find the first and last sorted position of the tie group of each entry
+    positions = numpy.arange(num_rows)[:, numpy.newaxis]
+    starts = numpy.ones(ordered.shape, dtype=bool)
+    starts[1:] = ordered[1:] != ordered[:-1]
+    first = numpy.maximum.accumulate(numpy.where(starts, positions, 0), axis=0)
+    ends = numpy.ones(ordered.shape, dtype=bool)
+    ends[:-1] = starts[1:]
+    last = numpy.minimum.accumulate(numpy.where(ends, positions, num_rows)[::-1],
+                                    axis=0)[::-1]
+    ranks = numpy.empty(block.shape, dtype=numpy.float64)
+    ranks[order, columns] = (first + last) / 2.0 + 1
+    return ranks
+
+def stats_path(src):
+    '''
+    returns the path of the column statistics sidecar of the gctx file src
+    '''
+    return os.path.splitext(src)[0] + '.simstats.npz'
+
+def ranks_path(src):
+    '''
+    returns the path of the rank sidecar of the gctx file src, a gctx file
+    holding the within column ranks of src.  The name is kept out of the
+    plate.*.gctx pattern of the layout siblings (see gct.sibling_path) so
+    that write_sibling cannot overwrite it and find_siblings never opens it.
+    '''
+    return os.path.splitext(src)[0] + '_simranks.gctx'
+
+def _is_fresh(path,src):
+    '''
+    returns True if the sidecar at path exists and is not older than src
+    '''
+    return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(src)
+
+def column_stats(src,ranks=False,block_size=None,refresh=False):
+    '''
+    returns a dictionary of per column statistics of the gctx file src used
+    to scale similarity scores: 'norm' (l2 norm), 'centered_norm' (l2 norm
+    after subtracting the column mean) and, if ranks is True,
+    'rank_centered_norm' (centered norm of the within column ranks).  The
+    statistics are computed in one streaming pass over src and cached in a
+    sidecar file (see stats_path); with ranks=True the ranks are also written
+    to a gctx sidecar (see ranks_path) for Spearman searches.  Sidecars older
+    than src, or all sidecars if refresh is True, are rebuilt.
+    '''
+    path = stats_path(src)
+    stats = None
+    if not refresh and _is_fresh(path, src):
+        with open(path, 'rb') as f:
+            data = numpy.load(f)
+            stats = dict((x, data[x]) for x in data.files)
+        if ranks and ('rank_centered_norm' not in stats or
+                      not _is_fresh(ranks_path(src), src)):
+            stats = None
+    if stats is not None:
+        return stats
+
+    GCTObject = gct.GCT(src)
+    writer = None
+    if ranks:
+        row_ids = GCTObject.get_gctx_rid(src)
+        writer = gct.GCTXWriter(ranks_path(src), [('id', row_ids)])
+    norms = []
+    centered_norms = []
+    rank_norms = []
+    try:
+        for ids,block in GCTObject.iter_column_blocks(src, block_size=block_size):
+            block = block.astype(numpy.float64)
+            norms.append(numpy.sqrt((block ** 2).sum(axis=0)))
+            centered = block - block.mean(axis=0)
+            centered_norms.append(numpy.sqrt((centered ** 2).sum(axis=0)))
+            if writer:
+                block_ranks = _block_ranks(block)
+                writer.append(block_ranks, [('id', ids)])
+                centered = block_ranks - block_ranks.mean(axis=0)
+                rank_norms.append(numpy.sqrt((centered ** 2).sum(axis=0)))
+    finally:
+        if writer:
+            writer.close()
+
+    stats = {'norm':numpy.concatenate(norms) if norms else numpy.zeros(0),
+             'centered_norm':numpy.concatenate(centered_norms) if norms else numpy.zeros(0)}
+    if ranks:
+        stats['rank_centered_norm'] = numpy.concatenate(rank_norms) if norms \
+                                      else numpy.zeros(0)
+    with open(path, 'wb') as f:
+        numpy.savez(f, **stats)
+    return stats
+
+def _prepare_queries(queries,metric):
+    '''
+    centers (except for cosine), ranks (for spearman) and scales each column
+    of the queries to unit length
+    '''
+    if metric == 'spearman':
+        queries = _block_ranks(queries)
+    if metric != 'cosine':
+        queries = queries - queries.mean(axis=0)
+    norms = numpy.sqrt((queries ** 2).sum(axis=0))
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        return queries / norms
+
+def search(src,queries,metric='pearson',k=100,row_ids=None,cid=None,
+           col_inds=None,tail='top',block_size=None,dtype=numpy.float32,
+           prefetch=1):
+    '''
+    searches the columns of the gctx file src for the k most similar to each
+    query signature.  queries holds one query per column (or a single query)
+    with one value per row of src, in the row order of src or, if row_ids is
+    given, in the order of row_ids.  metric is 'pearson', 'spearman' or
+    'cosine'.  cid or col_inds restrict the search to some columns as in
+    GCT.read.  tail='top' keeps the highest scores, 'bottom' the lowest and
+    'both' the highest absolute scores.
+
+    The columns are streamed from disk in blocks (see GCT.iter_column_blocks)
+    and scored against all queries with one matrix product per block in
+    dtype, scaled by the per column norms held in the sidecar built by
+    column_stats (Spearman searches stream the rank sidecar instead of src).
+    Only the best k scores of each query are kept between blocks, so memory
+    does not grow with the number of columns.  Columns with no variance
+    score NaN and are never returned.
+
+    Returns a list with one (ids, scores) tuple per query, best first.
+
+    example usage:
+    import cmap.analytics.similarity as similarity
+    hits = similarity.search('modz.gctx', signature, row_ids=landmarks, k=50)
+    ids, scores = hits[0]
+    '''
+    if metric not in METRICS:
+        raise ValueError("metric must be one of %s" % (', '.join(METRICS),))
+    if tail not in ('top', 'bottom', 'both'):
+        raise ValueError("tail must be 'top', 'bottom' or 'both'")
+
+    #put the queries in the row order of src
+    GCTObject = gct.GCT(src)
+    file_row_ids = GCTObject.get_gctx_rid(src)
+    queries = numpy.asarray(queries, dtype=numpy.float64)
+    if queries.ndim == 1:
+        queries = queries[:, numpy.newaxis]
+    if row_ids is not None:
+        positions = dict((x,ii) for ii,x in enumerate(row_ids))
+        missing = [x for x in file_row_ids if x not in positions]
+        if missing:
+            raise ValueError("the queries have no values for %d of the %d rows of %s"
+                             % (len(missing), len(file_row_ids), src))
+        queries = queries[[positions[x] for x in file_row_ids]]
+    if queries.shape[0] != len(file_row_ids):
+        raise ValueError("the queries have %d rows, %s has %d"
+                         % (queries.shape[0], src, len(file_row_ids)))
+    num_queries = queries.shape[1]
+    queries = _prepare_queries(queries, metric).astype(dtype)
+
+    #select the columns and look up their scaling
+    if col_inds is None or len(col_inds) == 0:
+        col_inds = GCTObject.get_gctx_cid_inds(src, match_list=cid)
+    col_inds = numpy.asarray(col_inds, dtype=numpy.int64)
+    if len(col_inds) == 0:
+        return [([], numpy.zeros(0)) for ii in range(num_queries)]
+    stats = column_stats(src, ranks=metric == 'spearman')
+    scale = {'pearson':'centered_norm', 'cosine':'norm',
+             'spearman':'rank_centered_norm'}[metric]
+    scale = stats[scale][col_inds]
+    source = ranks_path(src) if metric == 'spearman' else src
+
+    #score each block and merge it with the best scores so far
+    best_keys = numpy.zeros((0, num_queries))
+    best_scores = numpy.zeros((0, num_queries))
+    best_pos = numpy.zeros((0, num_queries), dtype=numpy.int64)
+    query_cols = numpy.arange(num_queries)
+    offset = 0
+    for ids,block in gct.GCT(source).iter_column_blocks(source, block_size=block_size,
+                                                     col_inds=col_inds, prefetch=prefetch):
+        width = block.shape[1]
+        scores = numpy.dot(block.transpose().astype(dtype, copy=False), queries)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            scores = scores / scale[offset:offset + width, numpy.newaxis]
+        if tail == 'bottom':
+            keys = -scores
+        elif tail == 'both':
+            keys = numpy.abs(scores)
+        else:
+            keys = scores.copy()
+        keys[~numpy.isfinite(keys)] = -numpy.inf
+        keys = numpy.vstack((best_keys, keys))
+        scores = numpy.vstack((best_scores, scores))
+        pos = numpy.vstack((best_pos, numpy.repeat(numpy.arange(offset, offset + width)
+                                                   [:, numpy.newaxis], num_queries, axis=1)))
+        if len(keys) > k:
+            keep = numpy.argpartition(-keys, k - 1, axis=0)[:k]
+            keys = keys[keep, query_cols]
+            scores = scores[keep, query_cols]
+            pos = pos[keep, query_cols]
+        best_keys, best_scores, best_pos = keys, scores, pos
+        offset += width
+
+    #sort the hits of each query, best first, and look up their ids
+    col_ids = GCTObject.get_gctx_cid(src)
+    results = []
+    for jj in range(num_queries):
+        keys = best_keys[:, jj]
+        order = numpy.argsort(-keys, kind='mergesort')
+        order = order[numpy.isfinite(keys[order])]
+        inds = col_inds[best_pos[order, jj]]
+        results.append(([col_ids[x] for x in inds],
+                        best_scores[order, jj].astype(numpy.float64)))
+    return results
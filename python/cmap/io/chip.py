@@ -0,0 +1,28 @@
+'''
+Created on Oct 17, 2026
+provides .chip (probe annotation table) file io modules
+'''
+import csv
+
+def read_chip(src):
+    '''
+    reads the tab delimited chip file in src, whose first line holds the field
+    names (pr_id first) and whose other lines annotate one probe each.
+    Returns a dictionary mapping each field name to a list of values.
+
+    example usage:
+    import cmap.io.chip as chip
+    annotations = chip.read_chip('HG_U133A.chip')
+    print(annotations['pr_gene_symbol'][:10])
+    '''
+    with open(src, 'r') as f:
+        reader = csv.reader(f, delimiter='\t')
+        headers = [x for x in next(reader) if x]
+        fields = [[] for x in headers]
+        for row in reader:
+            if not row:
+                continue
+            row = row + [''] * (len(headers) - len(row))
+            for values,value in zip(fields, row):
+                values.append(value)
+    return dict(zip(headers, fields))
@@ -0,0 +1,268 @@
+'''
+Created on Oct 17, 2026
+provides a columnar, in memory store for gct row and column meta data
+'''
+import operator
+import re
+
+import numpy
+
+def _is_number(s):
+    '''
+    determine if the string s can be represented as a number
+    '''
+    try:
+        float(s)
+        return True
+    except ValueError:
+        return False
+
+def _like_to_regex(pattern):
+    '''
+    translates an SQL LIKE pattern into an equivalent regular expression
+    '''
+    parts = []
+    for char in pattern:
+        if char == '%':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return re.compile('^' + ''.join(parts) + '$', re.IGNORECASE | re.DOTALL)
+
+#comparison operators supported in queries, keyed by their SQL spelling
+_OPERATORS = {'=':operator.eq, '==':operator.eq, '!=':operator.ne,
+              '<>':operator.ne, '<':operator.lt, '<=':operator.le,
+              '>':operator.gt, '>=':operator.ge}
+
+class MetaField(object):
+    '''
+    a single meta data field stored as a typed array.  Fields whose values
+    are all integers or all floats (and print back exactly as given) are
+    stored as int64 or float64 arrays, fields with many repeated values are
+    dictionary encoded as integer codes into an array of categories, and all
+    other fields are stored as a plain string array.
+    '''
+    def __init__(self,values,numeric=True):
+        values = [str(x) for x in values]
+        self.kind = 'string'
+        self.values = None
+        self.categories = None
+        self.codes = None
+        self._numbers = None
+
+        #try the numeric types first, keeping them only if they reproduce
+        #the original text
+        if numeric and values:
+            for dtype,kind in ((numpy.int64, 'int'), (numpy.float64, 'float')):
+                try:
+                    typed = numpy.array(values).astype(dtype)
+                except ValueError:
+                    continue
+                if [str(x) for x in typed.tolist()] == values:
+                    self.kind = kind
+                    self.values = typed
+                    return
+
+        #otherwise store strings, dictionary encoded if values repeat
+        strings = numpy.array(values) if values else numpy.array([], dtype='S1')
+        categories, codes = numpy.unique(strings, return_inverse=True)
+        if len(categories) <= len(strings) // 2:
+            self.kind = 'category'
+            self.categories = categories
+            self.codes = codes.astype(numpy.int32 if len(categories) < 2**31 else numpy.int64)
+        else:
+            self.values = strings
+
+    def __len__(self):
+        if self.kind == 'category':
+            return len(self.codes)
+        return len(self.values)
+
+    def text(self):
+        '''
+        returns the values of the field as a list of strings
+        '''
+        if self.kind == 'category':
+            return self.categories[self.codes].tolist()
+        if self.kind == 'string':
+            return self.values.tolist()
+        return [str(x) for x in self.values.tolist()]
+
+    def item(self,position):
+        '''
+        returns the value at the given position as a string
+        '''
+        if self.kind == 'category':
+            return str(self.categories[self.codes[position]])
+        if self.kind == 'string':
+            return str(self.values[position])
+        return str(self.values[position].tolist())
+
+    def take(self,positions):
+        '''
+        returns the values at the given positions as a numpy string array
+        '''
+        if self.kind == 'category':
+            return self.categories[self.codes[positions]]
+        if self.kind == 'string':
+            return self.values[positions]
+        return numpy.array([str(x) for x in self.values[positions].tolist()])
+
+    def numbers(self):
+        '''
+        returns the values of the field as floats, with NaN for entries that
+        are not numbers
+        '''
+        if self.kind in ('int', 'float'):
+            return self.values.astype(numpy.float64)
+        if self._numbers is None:
+            source = self.categories if self.kind == 'category' else self.values
+            numbers = numpy.array([float(x) if _is_number(x) else numpy.nan
+                                   for x in source.tolist()], dtype=numpy.float64)
+            if self.kind == 'category':
+                numbers = numbers[self.codes]
+            self._numbers = numbers
+        return self._numbers
+
+    def mask(self,desc,op='='):
+        '''
+        returns a boolean mask of the entries for which "entry op desc" holds.
+        If desc is a number the comparison is numeric, otherwise it compares
+        text.  op may be any SQL comparison operator or LIKE.
+        '''
+        op = op.strip()
+        if op.upper() == 'LIKE':
+            pattern = _like_to_regex(str(desc))
+            match = lambda source: numpy.array([bool(pattern.match(x)) for x in
+                                               source.tolist()], dtype=bool)
+            if self.kind == 'category':
+                return match(self.categories)[self.codes]
+            return match(self.values if self.kind == 'string'
+                         else numpy.array(self.text()))
+        if op not in _OPERATORS:
+            raise ValueError("unsupported operator %s" % (op,))
+        compare = _OPERATORS[op]
+
+        if _is_number(desc):
+            return compare(self.numbers(), float(desc))
+        desc = str(desc)
+        if self.kind == 'category':
+            return compare(self.categories, desc)[self.codes]
+        if self.kind == 'string':
+            return compare(self.values, desc)
+        return compare(numpy.array(self.text()), desc)
+
+class MetaTable(object):
+    '''
+    a meta data table of named MetaFields.  Rows are appended in bulk and
+    encoded into fields the first time the table is queried.
+    '''
+    def __init__(self,headers):
+        self.headers = list(headers)
+        self.fields = {}
+        self._pending = [[] for x in self.headers]
+        self._positions = None
+
+    def __len__(self):
+        self._encode()
+        if not self.headers:
+            return 0
+        return len(self.fields[self.headers[0]])
+
+    def add_rows(self,rows):
+        '''
+        appends the given rows, each a sequence with one value per header
+        '''
+        for row in rows:
+            for pending,value in zip(self._pending, row):
+                pending.append(value)
+        self._positions = None
+
+    def _encode(self):
+        '''
+        encodes any pending rows into the fields
+        '''
+        if not self.headers or (self.fields and not self._pending[0]):
+            return
+        for header,pending in zip(self.headers, self._pending):
+            if header in self.fields:
+                pending = self.fields[header].text() + [str(x) for x in pending]
+            self.fields[header] = MetaField(pending, numeric=(header != 'id'))
+        self._pending = [[] for x in self.headers]
+
+    def field(self,header):
+        '''
+        returns the MetaField for header
+        '''
+        self._encode()
+        if header not in self.fields:
+            raise KeyError("no meta data field named %s" % (header,))
+        return self.fields[header]
+
+    def position(self,entry_id):
+        '''
+        returns the position of the first row with the given id
+        '''
+        if self._positions is None:
+            ids = self.field('id').text()
+            positions = {}
+            for ii in range(len(ids) - 1, -1, -1):
+                positions[ids[ii]] = ii
+            self._positions = positions
+        if entry_id not in self._positions:
+            raise KeyError("no entry with id %s" % (entry_id,))
+        return self._positions[entry_id]
+
+    def positions(self,entry_ids):
+        '''
+        returns an array of the positions of the first rows with the given ids
+        '''
+        return numpy.array([self.position(x) for x in entry_ids], dtype=numpy.int64)
+
+    def record(self,entry_id):
+        '''
+        returns a dictionary of all fields of the row with the given id
+        '''
+        position = self.position(entry_id)
+        return dict((header, self.fields[header].item(position))
+                    for header in self.headers)
+
+    def inds_where(self,header,desc,op='='):
+        '''
+        returns the ind values of the rows for which "header op desc" holds
+        '''
+        mask = self.field(header).mask(desc, op)
+        return self.field('ind').numbers()[mask].astype(numpy.int64).tolist()
+
+class ColumnarMeta(object):
+    '''
+    columnar replacement for the in memory sqlite meta data database of a
+    GCT object, holding a 'row' and a 'col' MetaTable
+    '''
+    def __init__(self):
+        self.tables = {}
+
+    def create_table(self,table_name,headers):
+        '''
+        creates (or replaces) the table_name table with the given headers
+        '''
+        self.tables[table_name] = MetaTable(headers)
+
+    def table(self,table_name):
+        '''
+        returns the MetaTable named table_name
+        '''
+        if table_name not in self.tables:
+            raise KeyError("no meta data table named %s" % (table_name,))
+        return self.tables[table_name]
+
+    def headers(self,table_name):
+        '''
+        returns the headers of the table_name table, or an empty list if it
+        does not exist
+        '''
+        if table_name not in self.tables:
+            return []
+        return list(self.tables[table_name].headers)
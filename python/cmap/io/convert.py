@@ -0,0 +1,72 @@
+#! /usr/bin/env python
+'''
+Created on Oct 17, 2026
+provides a command line converter between text .gct files and .gctx files.
+Conversions are streamed, so files of any size convert in bounded memory.
+
+example usage (from the python directory):
+python -m cmap.io.convert plate.gct plate.gctx
+python -m cmap.io.convert --compression blosc plate.gct.gz plate.gctx
+python -m cmap.io.convert --reverse --gct-version 1.2 plate.gctx plate.gct
+'''
+import argparse
+import os
+import sys
+import time
+
+import numpy
+
+import cmap.io.gct as gct
+
+def convert(src,dest=None,reverse=False,**kwargs):
+    '''
+    converts the .gct file src to the .gctx file dest or, if reverse is True,
+    the .gctx file src to the .gct file dest.  If dest is not given it is src
+    with its extension replaced.  Further keyword arguments are passed to
+    gct.gct_to_gctx or gct.gctx_to_gct.  Returns dest.
+    '''
+    root = src[:-3] if src.endswith('.gz') else src
+    root = os.path.splitext(root)[0]
+    if reverse:
+        return gct.gctx_to_gct(src, dest or root + '.gct', **kwargs)
+    return gct.gct_to_gctx(src, dest or root + '.gctx', **kwargs)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='convert between .gct and .gctx files')
+    parser.add_argument('src', help='file to convert')
+    parser.add_argument('dest', nargs='?', help='output file (default: src with the new extension)')
+    parser.add_argument('--reverse', action='store_true', help='convert .gctx to .gct')
+    parser.add_argument('--chunkshape', default='', help='gctx chunk shape as rows,cols')
+    parser.add_argument('--compression', default='zlib', help='zlib, blosc or none')
+    parser.add_argument('--complevel', type=int, default=6, help='compression level')
+    parser.add_argument('--dtype', default='float32', help='gctx matrix data type')
+    parser.add_argument('--max-memory', dest='max_memory', type=int, default=2**27,
+                        help='approximate memory budget in bytes for the matrix blocks')
+    parser.add_argument('--gct-version', dest='gct_version', default='1.3',
+                        choices=['1.2', '1.3'], help='version of the gct file written')
+    parser.add_argument('--precision', type=int, default=4,
+                        help='decimal places of the gct values written')
+    args = parser.parse_args(argv)
+
+    if args.reverse:
+        kwargs = {'precision':args.precision, 'version':'#' + args.gct_version}
+    else:
+        kwargs = {'compression':None if args.compression == 'none' else args.compression,
+                  'complevel':args.complevel, 'dtype':numpy.dtype(args.dtype),
+                  'max_memory':args.max_memory}
+        if args.chunkshape:
+            kwargs['chunkshape'] = tuple(int(x) for x in args.chunkshape.split(','))
+    start = time.time()
+    try:
+        dest = convert(args.src, args.dest, args.reverse, **kwargs)
+    except gct.GCTException, (instance):
+        sys.stderr.write(instance.message + '\n')
+        return 1
+    except (IOError, OSError), (instance):
+        sys.stderr.write(str(instance) + '\n')
+        return 1
+    print('wrote %s in %.1f seconds' % (dest, time.time() - start))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
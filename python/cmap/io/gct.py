@@ -4,13 +4,26 @@ Created on Jan 12, 2012
 provides .gct file io modules
 @author: cflynn
 '''
+import collections
 import csv
+import glob
+import gzip
+import itertools
+import multiprocessing
 import os
+import Queue
 import sqlite3
+import tempfile
+import threading
+import time
 
 import numpy
 import tables 
 
+import cmap.io.columnar_meta as columnar_meta
+import cmap.io.gctx_index as gctx_index
+import cmap.io.instrument as instrumentation
+import cmap.io.query as query
 import cmap.util.progress as update
 
 class GCT(object):
@@ -29,13 +42,62 @@ class GCT(object):
     GCTObject.read(row_inds=range(100),col_inds=range(10))
     print(GCTObject.matrix)
 
+    Repeated reads from the same .gctx file can share a single open file 
+    handle by using the object as a context manager (or calling open and 
+    close explicitly).  Objects created with pooled=True borrow their handles
+    from the process wide handle_pool instead of opening the file themselves;
+    each thread borrows its own handles, since an open file must not be read
+    from two threads at once.
+    Objects created with cached=True serve .gctx matrix reads from the
+    decompressed chunks held in the process wide chunk_cache, so repeated
+    reads of overlapping slices only decompress each chunk once.
+    read_gctx_matrix reads from whichever sibling copy of a .gctx file 
+    written by write_sibling (e.g. one chunked by rows, or transposed) 
+    touches the fewest chunks for the requested selection; set 
+    route_layouts to False to always read the file itself.
+    With lazy=True, read leaves the .gctx matrix on disk and sets matrix to a
+    GCTXMatrix view that supports numpy style slicing.
+    With meta_backend='columnar', _meta is a ColumnarMeta store of typed,
+    dictionary encoded arrays instead of a sqlite database; the meta data 
+    methods of this class work the same way on either backend.
+    Row and column id lookups use an IdIndex that is built once per file and
+    cached; with persist_index=True it is also saved next to the .gctx file.
+    Passing a cmap.io.instrument.Instrument as instrument records the time
+    spent opening files, resolving ids, loading meta data and reading and
+    reordering matrix data, along with the hdf5 chunks touched, bytes read
+    and meta data rows inserted; without one reads are not instrumented.
+
+    example usage:
+    with gct.GCT('path_to_gctx_file') as GCTObject:
+        inds = GCTObject.get_gctx_cid_inds(GCTObject.src, match_list='A01')
+        GCTObject.read(col_inds=inds)
+
     '''
-    def __init__(self,src=None):
+    def __init__(self,src=None,pooled=False,persist_index=False,
+                 meta_backend='sqlite',instrument=None,cached=False):
         self.src = src
         self.version = ''
         self.matrix = ''
-        self._meta = sqlite3.connect(':memory:')
+        self.meta_backend = meta_backend
+        if meta_backend == 'sqlite':
+            self._meta = sqlite3.connect(':memory:')
+        elif meta_backend == 'columnar':
+            self._meta = columnar_meta.ColumnarMeta()
+        else:
+            raise GCTException("meta_backend must be 'sqlite' or 'columnar'")
         self._gctx_file = ''
+        self._gctx_handle = None
+        self._gctx_refs = 0
+        self._session = False
+        self.pooled = pooled
+        self.cached = cached
+        self.route_layouts = True
+        self.persist_index = persist_index
+        self.max_block_size = 2**22
+        self._meta_records = {}
+        if instrument is None:
+            instrument = instrumentation.NULL_INSTRUMENT
+        self.instrument = instrument
         
         self.matrix_node = ''
         self.column_id_node = ''
@@ -46,6 +108,14 @@ class GCT(object):
     def __repr__(self):
         return 'GCT(src=%r)' % (self.src,)
     
+    def __enter__(self):
+        if not self._session:
+            self.open()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
     def __str__(self):
         return '\n'.join(['src: ' + self.src,
                           'version: ' + self.version,
@@ -54,8 +124,13 @@ class GCT(object):
     
     def _add_table_to_meta_db(self,table_name,col_names):
         '''
-        constructs an in memory sqlite database for storage of row or column metadata
+        constructs an in memory sqlite database for storage of row or column
+        metadata, replacing the table left by any earlier read
         '''
+        self._meta_records.pop(table_name, None)
+        if self.meta_backend == 'columnar':
+            self._meta.create_table(table_name, col_names)
+            return
         
         #translate table_name and table_list into a valid SQL command
         command_string = 'create table ' + table_name + '('
@@ -68,6 +143,7 @@ class GCT(object):
         
         #connect to the db and create the table
         c = self._meta.cursor()
+        c.execute('drop table if exists ' + table_name)
         c.execute(command_string)
         self._meta.commit()
         c.close()
@@ -76,109 +152,192 @@ class GCT(object):
         '''
         adds the specified array of data to the desired metadata table
         '''
+        self._add_rows_to_meta_table(table_name, [data_array])
+    
+    def _add_rows_to_meta_table(self,table_name,rows):
+        '''
+        adds all of the rows in the given sequence to the desired metadata table
+        with a single parameterized executemany call and a single commit
+        '''
+        self._meta_records.pop(table_name, None)
+        if self.meta_backend == 'columnar':
+            if self.instrument.enabled:
+                rows = list(rows)
+                self.instrument.count('rows_inserted', len(rows))
+            self._meta.table(table_name).add_rows(rows)
+            return
         
+        rows = iter(rows)
+        try:
+            first_row = list(next(rows))
+        except StopIteration:
+            return
         
-        #translate table_name and table_list into a valid SQL command
-        command_string = "insert into %s values (" % (table_name,)
-        for i in range(len(data_array)):
-            command_string += "%s"
-            if not i == len(data_array)-1:
-                command_string += ", "
-        command_string += ")"
-        for i,item in enumerate(data_array):
-            if isinstance(item,str):
-                data_array[i] = '"' + str(item) + '"'
-            
-        command_string = command_string % tuple(data_array)
-              
-        #connect to the db and add data_array to the table
+        #build one placeholder per column of the table
+        command_string = "insert into %s values (%s)" % (table_name,
+                                        ", ".join(["?"] * len(first_row)))
+        
+        #connect to the db and add all rows inside of one transaction
         c = self._meta.cursor()
-        c.execute(command_string)
+        c.execute(command_string, first_row)
+        c.executemany(command_string, rows)
+        if self.instrument.enabled:
+            self.instrument.count('rows_inserted', c.rowcount + 1)
         self._meta.commit()
         c.close()
     
-    def _read_gct(self,src,verbose=True):
+    def _parse_gct_values(self,value_strings,num_cols,dtype):
         '''
-        reads tab delimited gct file 
+        parses a list of tab delimited strings of numbers, one per gct row, into
+        a two dimensional array with num_cols columns
+        '''
+        return _parse_gct_block(value_strings, num_cols, dtype)
+    
+    def _read_gct(self,src,verbose=True,dtype=numpy.float64,chunk_size=10000):
+        '''
+        reads tab delimited gct file.  The data rows are read in blocks of
+        chunk_size lines and parsed directly into a preallocated matrix of the
+        given dtype.
         '''
         #open a update indicator
         if verbose:
             progress_bar = update.DeterminateProgressBar('GCT_READER')
         
         #open the file
-        f = open(src,'rb')
-        reader = csv.reader(f, delimiter='\t')
+        instrument = self.instrument
+        with instrument.stage('open'):
+            f = open(src,'r')
         self.src = src
         
         #read the gct file header information and build the empty self.matrix 
         #array for later use
-        self.version = reader.next()[0]
-        dims = reader.next()
-        self.matrix = numpy.ndarray([int(dims[0]), int(dims[1])]) 
-        
-        #parse the first line to get sample names and row meta_data headers
-        titles = reader.next()
-        cid = titles[int(dims[2])+1:]
-        row_meta_headers = titles[:int(dims[2])+1]
-        row_meta_headers.insert(0,'ind')
-        self._add_table_to_meta_db('row', row_meta_headers)
-        
-        #parse the _meta data for the columns
-        col_meta_array = []
-        for ii,c in enumerate(cid):
-            col_meta_array.append([ii,c])
-        current_row = 0
-        col_meta_headers = ['ind','id']
-        while current_row < int(dims[3]):
-            tmp_row = reader.next()
-            col_meta_headers.append(tmp_row[0])
-            for ii,item in enumerate(tmp_row[int(dims[2])+1:]):
-                col_meta_array[ii].append(item)
-            current_row += 1
+        self.version, num_rows, num_cols, row_meta_headers, col_meta = \
+                read_gct_header(f)
+        num_rhd = len(row_meta_headers) - 1
+        self.matrix = numpy.empty((num_rows, num_cols), dtype=dtype)
+        self._add_table_to_meta_db('row', ['ind'] + row_meta_headers)
+        
+        #set up the _meta data for the columns
+        col_meta_headers = ['ind'] + [x[0] for x in col_meta]
+        col_meta_fields = [range(num_cols)] + [x[1] for x in col_meta]
         self._add_table_to_meta_db('col', col_meta_headers)
-        for item in col_meta_array:
-            self._add_row_to_meta_table('col', item)
-        
-        #parse the meta_data for the rows and store the data matrix
-        for ii,row in enumerate(reader):
-            row_meta_tmp = row[:int(dims[2])+1]
-            row_meta_tmp.insert(0,ii)
-            self._add_row_to_meta_table('row', row_meta_tmp)
-            self.matrix[ii] = row[int(dims[2])+1:]
+        with instrument.stage('meta_load'):
+            self._add_rows_to_meta_table('col', zip(*col_meta_fields))
+        
+        #parse the meta_data for the rows and store the data matrix one block
+        #of rows at a time
+        start_time = time.time()
+        current_row = 0
+        while current_row < num_rows:
+            with instrument.stage('matrix_read'):
+                lines = list(itertools.islice(f, min(chunk_size, num_rows - current_row)))
+            if not lines:
+                break
+            if instrument.enabled:
+                instrument.count('bytes_read', sum(len(x) for x in lines))
+            row_meta_block = []
+            value_strings = []
+            for ii,line in enumerate(lines):
+                row = line.rstrip('\r\n').split('\t', num_rhd + 1)
+                row_meta_tmp = row[:num_rhd+1]
+                row_meta_tmp.insert(0, current_row + ii)
+                row_meta_block.append(row_meta_tmp)
+                value_strings.append(row[num_rhd+1] if len(row) > num_rhd + 1 else '')
+            with instrument.stage('meta_load'):
+                self._add_rows_to_meta_table('row', row_meta_block)
+            with instrument.stage('matrix_read'):
+                self.matrix[current_row:current_row + len(lines)] = \
+                        self._parse_gct_values(value_strings, num_cols, dtype)
+            current_row += len(lines)
             if verbose:
-                progress_bar.update('reading gct file: ', ii, int(dims[0]))
+                rate = current_row / max(time.time() - start_time, 1e-6)
+                progress_bar.update('reading gct file (%d rows/sec): ' % (rate,),
+                                    current_row, num_rows)
+        f.close()
+        
+        if current_row < num_rows:
+            raise GCTException("expected %d data rows but found %d in %s"
+                               % (num_rows, current_row, src))
         
         if verbose:
             progress_bar.clear()
         
     def _open_gctx(self,src):
         '''
-        opens the target gctx file
+        opens the target gctx file.  Calls are reference counted, so if the
+        file is already open (e.g. during a session) the open handle is reused
         '''
+        if self._gctx_refs:
+            if os.path.abspath(src) != os.path.abspath(self._gctx_handle.src):
+                raise GCTException("%s is open, cannot also open %s" 
+                                   % (self._gctx_handle.src, src))
+            self._gctx_refs += 1
+            return
+        
+        #get an open handle, either from the shared pool or a new one
+        with self.instrument.stage('open'):
+            if self.pooled:
+                handle = handle_pool.acquire(src)
+            else:
+                handle = GCTXHandle(src)
+        self._gctx_handle = handle
+        self._gctx_refs = 1
+        
         #set self.src and self.version
         self.src = src
-        self._gctx_file = tables.openFile(src)
-        self.version = self._gctx_file.getNodeAttr("/","version")
+        self._gctx_file = handle.file
+        self.version = handle.version
         
         #create shortcut reference to matrix and metadata tables
-        self.matrix_node = self._gctx_file.getNode("/0/DATA/0", "matrix")
-        self.column_id_node = self._gctx_file.getNode("/0/META/COL", "id")
-        self.row_id_node = self._gctx_file.getNode("/0/META/ROW", "id")
-        self.column_data = self._gctx_file.listNodes("/0/META/COL")
-        self.row_data = self._gctx_file.listNodes("/0/META/ROW")
+        self.matrix_node = handle.matrix_node
+        self.column_id_node = handle.column_id_node
+        self.row_id_node = handle.row_id_node
+        self.column_data = handle.column_data
+        self.row_data = handle.row_data
     
     def _close_gctx(self):
         '''
-        close the open gctx file
+        close the open gctx file once the last reference to it is released
+        '''
+        self._gctx_refs -= 1
+        if self._gctx_refs > 0:
+            return
+        if self.pooled:
+            handle_pool.release(self._gctx_handle)
+        else:
+            self._gctx_handle.close()
+        self._gctx_handle = None
+    
+    def open(self,src=None):
+        '''
+        opens the gctx file given in src (or self.src) and keeps it open for
+        all subsequent gctx reads until close is called
+        '''
+        if not src:
+            src = self.src
+        if self._session:
+            self.close()
+        self._open_gctx(src)
+        self._session = True
+        return self
+    
+    def close(self):
+        '''
+        ends a session started with open, closing the gctx file
         '''
-        self._gctx_file.close()
+        if self._session:
+            self._session = False
+            self._close_gctx()
         
     
     def _read_gctx(self,src,verbose=True,cid=None,rid=None, 
-                    col_inds=None, row_inds=None):
+                    col_inds=None, row_inds=None, lazy=False, cache_path=None):
         '''
         reads hdf5 gctx file 
         '''
+        #note whether all rows and columns are requested
+        all_cols = not col_inds and cid is None
+        all_rows = not row_inds and rid is None
         
         #get the appropriate column indices
         if not col_inds:
@@ -194,10 +353,18 @@ class GCT(object):
         #read the row meta data
         self.read_gctx_row_meta(src, row_inds, verbose=verbose)
         
-        #read the matrix data
-        self.read_gctx_matrix(src=src,cid=cid,rid=rid,
-                              col_inds=col_inds,
-                              row_inds=row_inds)
+        #read the matrix data, or set up a lazy view of it
+        if lazy:
+            self.matrix = GCTXMatrix(src, row_inds=None if all_rows else row_inds,
+                                     col_inds=None if all_cols else col_inds,
+                                     cache_path=cache_path, pooled=self.pooled,
+                                     max_block_size=self.max_block_size,
+                                     instrument=self.instrument,
+                                     cached=self.cached)
+        else:
+            self.read_gctx_matrix(src=src,cid=cid,rid=rid,
+                                  col_inds=col_inds,
+                                  row_inds=row_inds)
         
     def _is_number(self,s):
         '''
@@ -209,155 +376,267 @@ class GCT(object):
         except ValueError:
             return False
     
-    def get_gctx_cid_inds(self,src,match_list=None):
+    def _get_gctx_id_index(self,axis):
         '''
-        finds all indices of cid entries that match any of the strings given in match_list
+        returns the IdIndex of the open gctx file for the 'row' or 'col' axis
         '''
-        #if match_list is a string, wrap it in a list
-        if type(match_list) == str:
-            match_list = [match_list]
-        
-        #open the gctx file
-        self._open_gctx(src)
-        
-        if match_list == None:
-            matches = range(len(self.column_id_node))
+        if axis == 'col':
+            id_node = self.column_id_node
         else:
-            #find all of the matching cids
-            matches = []
-            for match in match_list:
-                matches.extend([i for i in range(len(self.column_id_node)) if match in self.column_id_node[i]])
-            
-        self._close_gctx()
-        return matches
+            id_node = self.row_id_node
+        return gctx_index.get_id_index(self.src, id_node, axis,
+                                       persist=self.persist_index)
     
-    def get_gctx_cid(self,src,match_list=None):
+    def _match_gctx_ids(self,src,axis,match_list,exact=False,prefix=False):
         '''
-        finds all cid entries that match any of the strings given in match_list
+        returns the IdIndex for the given axis of src and the indices of the
+        ids matching match_list.  Ids match if they contain (or, if exact is 
+        True, equal or, if prefix is True, start with) one of the strings in 
+        match_list.  The indices are ordered by the entry of match_list they
+        match.
         '''
-        #if match_list is a string, wrap it in a list
-        if type(match_list) == str:
-            match_list = [match_list]
-        
         #open the gctx file
         self._open_gctx(src)
+        try:
+            with self.instrument.stage('id_resolution'):
+                index = self._get_gctx_id_index(axis)
+        finally:
+            self._close_gctx()
         
-        if match_list == None:
-            matches = [x for x in self.column_id_node]
-        else:
-            #find all of the matching cids
-            matches = []
-            for match in match_list:
-                matches.extend([self.column_id_node[i] for i in range(len(self.column_id_node)) if match in self.column_id_node[i]])
-            
-        self._close_gctx()
-        matches = [x.rstrip() for x in matches]
-        return matches
+        with self.instrument.stage('id_resolution'):
+            if match_list is None:
+                matches = range(len(index))
+            elif exact:
+                matches = index.exact(match_list)
+            elif prefix:
+                matches = index.prefix(match_list)
+            else:
+                matches = index.substring(match_list)
+        return index, matches
+    
+    def get_gctx_cid_inds(self,src,match_list=None,exact=False,prefix=False):
+        '''
+        finds all indices of cid entries that match any of the strings given in match_list
+        '''
+        return self._match_gctx_ids(src, 'col', match_list, exact, prefix)[1]
     
-    def get_gctx_rid_inds(self,src,match_list=None,exact=False):
+    def get_gctx_cid(self,src,match_list=None,exact=False,prefix=False):
+        '''
+        finds all cid entries that match any of the strings given in match_list
+        '''
+        index, matches = self._match_gctx_ids(src, 'col', match_list, exact, prefix)
+        return index.ids[matches].tolist()
+    
+    def get_gctx_rid_inds(self,src,match_list=None,exact=False,prefix=False):
         '''
         finds all the indices of rid entries that match any of the strings given in match_list
         '''
-        #if match_list is a string, wrap it in a list
-        if type(match_list) == str:
-            match_list = [match_list]
-        
-        #open the gctx file
-        self._open_gctx(src)
-        
-        if match_list == None:
-            matches = range(len(self.row_id_node))
-        else:
-            #find all of the matching rids
-            matches = []
-            if exact:
-                for match in match_list:
-                    matches.extend([i for i in range(len(self.row_id_node)) if match == self.row_id_node[i].rstrip()])
-                
-            else:
-                for match in match_list:
-                    matches.extend([i for i in range(len(self.row_id_node)) if match in self.row_id_node[i]])
-            
-        self._close_gctx()
-        return matches
+        return self._match_gctx_ids(src, 'row', match_list, exact, prefix)[1]
     
-    def get_gctx_rid(self,src,match_list=None):
+    def get_gctx_rid(self,src,match_list=None,exact=False,prefix=False):
         '''
         finds all rid entries that match any of the strings given in match_list
         '''
-        #if match_list is a string, wrap it in a list
-        if type(match_list) == str:
-            match_list = [match_list]
-        
-        #open the gctx file
-        self._open_gctx(src)
-        
-        if match_list == None:
-            matches = [x for x in self.row_id_node]
-        else:
-            #find all of the matching cids
-            matches = []
-            for match in match_list:
-                matches.extend([self.row_id_node[i] for i in range(len(self.row_id_node)) if match in self.row_id_node[i]])
-            
-        self._close_gctx()
-        matches = [x.rstrip() for x in matches]
-        return matches
+        index, matches = self._match_gctx_ids(src, 'row', match_list, exact, prefix)
+        return index.ids[matches].tolist()
     
     def read_gctx_matrix(self,src=None,cid=None,rid=None,col_inds=None,
                                             row_inds=None):
         '''
-        read just the matrix data from a gctx file
+        read just the matrix data from a gctx file.  The rows and columns of
+        the matrix follow the order given in row_inds and col_inds.
         '''
         if not src:
             src = self.src
         
         #get the appropriate column indices
-        if not col_inds:
+        if col_inds is None or len(col_inds) == 0:
             col_inds = self.get_gctx_cid_inds(src, match_list=cid)
         
         #get the appropriate row indices
-        if not row_inds:
+        if row_inds is None or len(row_inds) == 0:
             row_inds = self.get_gctx_rid_inds(src, match_list=rid)
         #open the gctx file
         self._open_gctx(src)
+        try:
+            #set up the indices 
+            if len(col_inds) == 0:
+                col_inds = range(len(self.column_id_node))
+            if len(row_inds) == 0:
+                row_inds = range(len(self.row_id_node))
+            
+            #read the data, from a sibling copy of the file if its chunk 
+            #layout is cheaper for this selection
+            sibling = None
+            if self.route_layouts:
+                sibling = cheapest_layout(src, self.matrix_node, row_inds, col_inds,
+                                          self._gctx_handle.siblings())
+            if sibling is None:
+                self.matrix = read_matrix_node(self.matrix_node, row_inds, col_inds,
+                                               self.max_block_size, self.instrument,
+                                               chunk_cache if self.cached else None)
+            else:
+                self.matrix = self._read_sibling(sibling, row_inds, col_inds)
+        finally:
+            #close the gctx file
+            self._close_gctx()
+    
+    def _read_sibling(self,sibling,row_inds,col_inds):
+        '''
+        reads the given rows and columns of the gctx file from the sibling
+        (path, transposed) returned by cheapest_layout
+        '''
+        path, transposed = sibling
+        self.instrument.count('sibling_reads')
+        with self.instrument.stage('open'):
+            if self.pooled:
+                handle = handle_pool.acquire(path)
+            else:
+                handle = GCTXHandle(path)
+        try:
+            cache = chunk_cache if self.cached else None
+            if transposed:
+                matrix = read_matrix_node(handle.matrix_node, col_inds, row_inds,
+                                          self.max_block_size, self.instrument,
+                                          cache)
+                return numpy.ascontiguousarray(matrix.transpose())
+            return read_matrix_node(handle.matrix_node, row_inds, col_inds,
+                                    self.max_block_size, self.instrument, cache)
+        finally:
+            if self.pooled:
+                handle_pool.release(handle)
+            else:
+                handle.close()
+    
+    def _iter_blocks(self,src,axis,block_size,cid,rid,col_inds,row_inds,
+                     exact,prefetch):
+        '''
+        iterates over blocks of the selected columns (axis=1) or rows (axis=0)
+        of the gctx file src, yielding (ids, block) tuples
+        '''
+        if not src:
+            src = self.src
+        if os.path.splitext(src)[1] != '.gctx':
+            raise GCTException("block iteration is only supported for .gctx files")
         
-        #set up the indices 
-        if not col_inds:
-            col_inds = range(len(self.column_id_node))
-        if not row_inds:
-            row_inds = range(len(self.row_id_node))
-
-        #read the data
-        if len(col_inds) < len(row_inds):
-            self.matrix = self.matrix_node[col_inds,:]
-            self.matrix = self.matrix[:,row_inds]
+        #resolve the selected columns and rows
+        col_index, matches = self._match_gctx_ids(src, 'col', cid, exact)
+        if col_inds is None or len(col_inds) == 0:
+            col_inds = matches
+        row_index, matches = self._match_gctx_ids(src, 'row', rid, exact)
+        if row_inds is None or len(row_inds) == 0:
+            row_inds = matches
+        col_inds = numpy.asarray(col_inds, dtype=numpy.int64)
+        row_inds = numpy.asarray(row_inds, dtype=numpy.int64)
+        if axis == 1:
+            inds, other_inds, ids = col_inds, row_inds, col_index.ids
         else:
-            chunk_size = 1000
-            self.matrix = numpy.zeros((len(self.column_id_node),len(row_inds)))
-            for i in range(0,len(self.column_id_node),chunk_size):
-                try:
-                    chunk_start = i
-                    chunk_end = i+chunk_size
-                    self.matrix[chunk_start:chunk_end,:] = self.matrix_node[chunk_start:chunk_end,row_inds]
-                except IndexError:
-                    chunk_start = i
-                    chunk_end = len(self.column_id_node)
-                    self.matrix[chunk_start:chunk_end,:] = self.matrix_node[chunk_start:chunk_end,row_inds]
-                except ValueError:
-                    chunk_start = i
-                    chunk_end = len(self.column_id_node)
-                    self.matrix[chunk_start:chunk_end,:] = self.matrix_node[chunk_start:chunk_end,row_inds]
-
-            self.matrix = self.matrix[col_inds,:]
-        # make sure the data is in the right order given the col_inds and row_inds
-        self.matrix = self.matrix[col_inds.sort(),:]
-        self.matrix = self.matrix[:,row_inds.sort()]
-        self.matrix =  numpy.reshape(self.matrix,(len(col_inds),len(row_inds)))
-        self.matrix = self.matrix.transpose()
-        
-        #close the gctx file
-        self._close_gctx()
+            inds, other_inds, ids = row_inds, col_inds, row_index.ids
+        
+        #blocks read ahead are read on the prefetch thread, so it gets a 
+        #handle of its own rather than one shared through the pool
+        matrix = GCTXMatrix(src, row_inds=row_inds, col_inds=col_inds,
+                            pooled=self.pooled and not prefetch,
+                            max_block_size=self.max_block_size,
+                            instrument=self.instrument, cached=self.cached)
+        try:
+            #by default fill max_block_size with whole chunks along axis
+            chunk_len = matrix.chunkshape[axis]
+            if block_size is None:
+                block_size = max(1, self.max_block_size // max(len(other_inds), 1)
+                                 // chunk_len) * chunk_len
+            
+            def read_blocks():
+                for start,stop in _block_slices(inds, block_size):
+                    if axis == 1:
+                        block = matrix[:,start:stop]
+                    else:
+                        block = matrix[start:stop,:]
+                    yield ids[inds[start:stop]].tolist(), block
+            
+            for result in _prefetch(read_blocks(), prefetch):
+                yield result
+        finally:
+            matrix.close()
+    
+    def iter_column_blocks(self,src=None,block_size=None,cid=None,rid=None,
+                           col_inds=None,row_inds=None,exact=False,prefetch=1):
+        '''
+        iterates over the columns of a gctx file one block at a time, yielding
+        (ids, block) tuples where ids lists the column ids of the block and
+        block is a numpy array with one row per selected row.  Columns and
+        rows are selected as in read.  Blocks hold block_size columns (by
+        default as many whole hdf5 chunks as fit in max_block_size elements),
+        with block boundaries on chunk boundaries wherever the selection is in
+        file order.  Up to prefetch blocks are read ahead on a background
+        thread so that reading overlaps with the caller's computation; with
+        prefetch=0 blocks are read on demand.  Only one block (plus those
+        prefetched) is held in memory at a time.
+
+        example usage:
+        GCTObject = gct.GCT('path_to_gctx_file')
+        for ids, block in GCTObject.iter_column_blocks(cid='A375'):
+            norms = numpy.sqrt((block ** 2).sum(axis=0))
+        '''
+        return self._iter_blocks(src, 1, block_size, cid, rid, col_inds,
+                                 row_inds, exact, prefetch)
+    
+    def iter_row_blocks(self,src=None,block_size=None,cid=None,rid=None,
+                        col_inds=None,row_inds=None,exact=False,prefetch=1):
+        '''
+        iterates over the rows of a gctx file one block at a time, yielding
+        (ids, block) tuples where ids lists the row ids of the block and
+        block is a numpy array with one column per selected column.  See
+        iter_column_blocks for the remaining arguments.
+        '''
+        return self._iter_blocks(src, 0, block_size, cid, rid, col_inds,
+                                 row_inds, exact, prefetch)
+    
+    def _read_meta_node(self,node,inds):
+        '''
+        reads the entries of the one dimensional meta data node at the given
+        indices and returns them as a numpy array of stripped strings.  The
+        indices are read in a few contiguous slices of the node that skip
+        over large gaps, so sparse selections do not read the whole node.
+        '''
+        inds = numpy.asarray(inds, dtype=numpy.int64)
+        if len(inds) == 0:
+            return numpy.array([], dtype=str)
+        
+        #read each run of nearby indices with one slice; unchunked nodes are
+        #split wherever more than 4096 entries would be skipped
+        unique, inverse = numpy.unique(inds, return_inverse=True)
+        chunk_len = node.chunkshape[0] if node.chunkshape else 4096
+        values = numpy.concatenate([node[start:stop][run - start] for start,stop,run
+                                    in _coalesce_inds(unique, chunk_len, len(node))])
+        values = values[inverse]
+        
+        #string nodes are space padded, everything else is converted to text
+        if values.dtype.kind in ('S', 'U'):
+            return numpy.char.rstrip(values)
+        return values.astype(str)
+    
+    def _read_gctx_meta(self,table_name,meta_nodes,inds,progress_bar=None):
+        '''
+        reads the meta data nodes given in meta_nodes at the indices given in
+        inds and loads them into the table_name meta data table
+        '''
+        headers = [x.name for x in meta_nodes]
+        headers.insert(0,'ind')
+        self._add_table_to_meta_db(table_name, headers)
+        
+        with self.instrument.stage('meta_load'):
+            #read each meta data field as one array
+            fields = []
+            for ii,node in enumerate(meta_nodes):
+                if progress_bar:
+                    progress_bar.update('reading %s meta data' % (table_name,),
+                                        ii + 1, len(meta_nodes))
+                fields.append(self._read_meta_node(node, inds).tolist())
+            
+            #load all of the rows in one transaction
+            self._add_rows_to_meta_table(table_name,
+                                         zip([int(i) for i in inds], *fields))
     
     def read_gctx_col_meta(self,src,col_inds=None, verbose=True):
         '''
@@ -365,35 +644,26 @@ class GCT(object):
         those columns specified are read.  
         '''
         #open an update indicator
+        progress_bar = None
         if verbose:
             progress_bar = update.DeterminateProgressBar('GCTX_READER')
         
         #open the gctx file
         self._open_gctx(src)
-        
-        #set up the indices 
-        if not col_inds:
-            col_inds = range(len(self.column_id_node))
-        
-        #read in the column meta data
-        column_headers = [x.name for x in self.column_data]
-        column_headers.insert(0,'ind')
-        self._add_table_to_meta_db("col", column_headers)
-        num_rows = self.column_data[0].shape[0]
-        for i in col_inds:
-            if verbose:
-                progress_bar.update('reading column meta data', i, num_rows)
-            data_list = [i]
-            for column in self.column_data:
-                data_list.append(str(column[i]).rstrip())
-            self._add_row_to_meta_table("col", data_list)
+        try:
+            #set up the indices 
+            if not col_inds:
+                col_inds = range(len(self.column_id_node))
+            
+            #read in the column meta data
+            self._read_gctx_meta("col", self.column_data, col_inds, progress_bar)
+        finally:
+            #close the gctx file
+            self._close_gctx()
         
         #clear the update indicator
         if verbose:
             progress_bar.clear()
-        
-        #close the gctx file
-        self._close_gctx()
     
     def read_gctx_row_meta(self,src,row_inds=None, verbose=True):
         '''
@@ -401,40 +671,85 @@ class GCT(object):
         those rows specified are read.  
         '''
         #open an update indicator
+        progress_bar = None
         if verbose:
             progress_bar = update.DeterminateProgressBar('GCTX_READER')
         
         #open the gctx file
         self._open_gctx(src)
-        
-        #set up the indices 
-        if not row_inds:
-            row_inds = range(len(self.row_id_node))
-        
-        #read in the row meta data
-        row_headers = [x.name for x in self.row_data]
-        row_headers.insert(0,'ind')
-        self._add_table_to_meta_db("row", row_headers)
-        num_rows = self.row_data[0].shape[0]
-        for i in row_inds:
-            if verbose:
-                progress_bar.update('reading row meta data', i, num_rows)
-            data_list = [i]
-            for column in self.row_data:
-                data_list.append(str(column[i]).rstrip())
-            self._add_row_to_meta_table("row", data_list)
+        try:
+            #set up the indices 
+            if not row_inds:
+                row_inds = range(len(self.row_id_node))
+            
+            #read in the row meta data
+            self._read_gctx_meta("row", self.row_data, row_inds, progress_bar)
+        finally:
+            #close the gctx file
+            self._close_gctx()
         
         #clear the update indicator
         if verbose:
             progress_bar.clear()
-            
-        #close the gctx file
-        self._close_gctx()
+    
+    def _read_meta_values(self,node):
+        '''
+        reads all entries of a meta data node, stripping padding from strings
+        '''
+        return _node_values(node)
+    
+    def _select_by_where(self,src,where,cid=None,rid=None,col_inds=None,
+                         row_inds=None):
+        '''
+        evaluates the where expression (see cmap.io.query) against only the 
+        meta data nodes it refers to and returns the indices of the matching
+        columns and rows, restricted to any cid, rid, col_inds and row_inds
+        given
+        '''
+        try:
+            filters = query.split_axes(where)
+        except ValueError, (instance):
+            raise GCTException(str(instance))
+        
+        self._open_gctx(src)
+        try:
+            selections = {}
+            for axis,inds,match_list,meta_nodes in (
+                    ('col', col_inds, cid, self.column_data),
+                    ('row', row_inds, rid, self.row_data)):
+                if inds is None or len(inds) == 0:
+                    inds = self._match_gctx_ids(src, axis, match_list)[1]
+                inds = numpy.asarray(inds, dtype=numpy.int64)
+                if axis in filters:
+                    #read just the meta data fields used by the filter
+                    nodes = dict((node.name, node) for node in meta_nodes)
+                    values = {}
+                    for field in filters[axis].fields():
+                        if field[1] not in nodes:
+                            raise GCTException("%s is not a %s meta data field"
+                                               % (field[1], axis))
+                        values[field] = self._read_meta_values(nodes[field[1]])
+                    inds = inds[filters[axis].evaluate(values)[inds]]
+                    if len(inds) == 0:
+                        raise GCTException("no %s meta data matches %r" 
+                                           % (axis, filters[axis]))
+                selections[axis] = inds.tolist()
+        finally:
+            self._close_gctx()
+        return selections['col'], selections['row']
     
     def read(self,src=None,verbose=True,cid=None,rid=None, 
-            col_inds=None, row_inds=None, matrix_only=False):
+            col_inds=None, row_inds=None, matrix_only=False, lazy=False,
+            cache_path=None, where=None, dtype=numpy.float64, chunk_size=10000):
         '''
-        reads data from src into metadata tables and data matrix 
+        reads data from src into metadata tables and data matrix.  If lazy is
+        True and src is a .gctx file, the matrix attribute is a GCTXMatrix 
+        view that reads data from disk only when it is indexed, optionally 
+        caching it in a numpy.memmap at cache_path.  For .gctx files, where 
+        may be a cmap.io.query expression over row and column meta data; it
+        is evaluated before any matrix data is read so that only the matching
+        rows and columns are read.  .gct files are parsed chunk_size lines at
+        a time into a matrix of the given dtype.
         '''
         #determine file type
         if not src:
@@ -442,43 +757,117 @@ class GCT(object):
         extension = os.path.splitext(src)[1]
         try:
             if extension == '.gct':
-                self._read_gct(src,verbose)
+                if where is not None:
+                    raise GCTException("where filters are only supported for .gctx files")
+                self._read_gct(src,verbose,dtype=dtype,chunk_size=chunk_size)
             elif extension == '.gctx':
-                if matrix_only:
-                    self.read_gctx_matrix(cid=cid,rid=rid,col_inds=col_inds,
-                                            row_inds=row_inds)
-                else:            
-                    self._read_gctx(src,verbose=verbose,cid=cid,rid=rid,col_inds=col_inds,
-                                row_inds=row_inds)
+                #hold the file open across all of the component reads
+                self._open_gctx(src)
+                try:
+                    if where is not None:
+                        col_inds, row_inds = self._select_by_where(src, where,
+                                    cid=cid, rid=rid, col_inds=col_inds,
+                                    row_inds=row_inds)
+                        cid = rid = None
+                    if matrix_only and not lazy:
+                        self.read_gctx_matrix(src=src,cid=cid,rid=rid,
+                                              col_inds=col_inds,row_inds=row_inds)
+                    else:            
+                        self._read_gctx(src,verbose=verbose,cid=cid,rid=rid,
+                                        col_inds=col_inds,row_inds=row_inds,
+                                        lazy=lazy,cache_path=cache_path)
+                finally:
+                    self._close_gctx()
             else:
                 raise GCTException("source file must be .gct or .gctx")
         except GCTException, (instance):
             print instance.message
         
-    def get_sample_meta(self,sample_name):
+    def _get_meta_records(self,table_name):
         '''
-        return a dictionary of the _meta data for the sample specified by sample_name
+        returns the headers, a dictionary mapping each header to a numpy array
+        of its values and a dictionary mapping each id to the position of its
+        first entry for the table_name table of the sqlite backend.  These are
+        built with a single pass over the table the first time they are needed
+        after loading and cached until the table changes.  (The columnar
+        backend is read directly, see _get_meta_many.)
         '''
-        #get the headers of the col database
-        chd = self.get_chd()
-        
-        #build a dictionary of _meta data for the sample
-        sample_meta = {}
+        if table_name in self._meta_records:
+            return self._meta_records[table_name]
+        headers = self.get_chd() if table_name == 'col' else self.get_rhd()
         c = self._meta.cursor()
-        for header in chd:
-            query = "SELECT %s FROM col WHERE id=?" % (header,)
-            c.execute(query, (sample_name,))
-            sample_meta.update({header : str(c.fetchone()[0])})
-        self._meta.commit()
+        c.execute("SELECT %s FROM %s ORDER BY rowid" % (', '.join(headers), table_name))
+        columns = zip(*[[str(x) for x in row] for row in c]) or [[] for x in headers]
         c.close()
-        
-        #return the dictionary
-        return sample_meta
+        arrays = dict((header, numpy.array(column, dtype=str))
+                      for header,column in zip(headers, columns))
+        positions = {}
+        for ii,entry_id in enumerate(arrays['id'].tolist()):
+            positions.setdefault(entry_id, ii)
+        self._meta_records[table_name] = (headers, arrays, positions)
+        return self._meta_records[table_name]
+    
+    def _get_meta_many(self,table_name,ids,fields=None,as_records=False):
+        '''
+        returns the meta data of the given ids in the table_name table as a
+        dictionary of arrays (or a numpy record array), one entry per id
+        '''
+        if isinstance(ids, basestring):
+            ids = [ids]
+        if self.meta_backend == 'columnar':
+            #read straight from the typed fields rather than copying them
+            table = self._meta.table(table_name)
+            inds = table.positions(ids)
+            if fields is None:
+                fields = table.headers
+            values = [table.field(header).take(inds) for header in fields]
+        else:
+            headers, arrays, positions = self._get_meta_records(table_name)
+            try:
+                inds = numpy.array([positions[x] for x in ids], dtype=numpy.int64)
+            except KeyError as e:
+                raise KeyError("no entry with id %s" % (e.args[0],))
+            if fields is None:
+                fields = headers
+            values = [arrays[header][inds] for header in fields]
+        if as_records:
+            return numpy.rec.fromarrays(values, names=list(fields)) if fields else None
+        return dict(zip(fields, values))
+    
+    def get_sample_meta(self,sample_name):
+        '''
+        return a dictionary of the _meta data for the sample specified by sample_name
+        '''
+        if self.meta_backend == 'columnar':
+            return self._meta.table('col').record(sample_name)
+        headers, arrays, positions = self._get_meta_records('col')
+        if sample_name not in positions:
+            raise KeyError("no entry with id %s" % (sample_name,))
+        return dict((header, str(arrays[header][positions[sample_name]]))
+                    for header in headers)
+    
+    def get_sample_meta_many(self,sample_names,fields=None,as_records=False):
+        '''
+        return the _meta data of all of the samples in sample_names as a 
+        dictionary mapping each field (by default all of them) to an array 
+        with one entry per sample, or as a numpy record array if as_records is
+        True.  Lookups use an id to position index, so this is a single pass 
+        regardless of the number of samples.
+
+        example usage:
+        meta = GCTObject.get_sample_meta_many(GCTObject.get_cids()[:100],
+                                              fields=['id','pert_type'])
+        print(meta['pert_type'])
+        '''
+        return self._get_meta_many('col', sample_names, fields, as_records)
     
     def get_column_meta(self,column_name):
         '''
         return a list of all meta data entries in the column specified by column_name
         '''
+        if self.meta_backend == 'columnar':
+            return self._meta.table('col').field(column_name).text()
+        
         c = self._meta.cursor()
         query = "SELECT %s FROM col" % (column_name,)
         c.execute(query)
@@ -492,6 +881,9 @@ class GCT(object):
         '''
         return a list of all meta data entries in the column specified by row_name
         '''
+        if self.meta_backend == 'columnar':
+            return self._meta.table('row').field(row_name).text()
+        
         c = self._meta.cursor()
         query = "SELECT %s FROM row" % (row_name,)
         c.execute(query)
@@ -505,27 +897,29 @@ class GCT(object):
         '''
         return a dictionary of the _meta data for the probe specified by probe_name
         '''
-        #get the headers of the row database
-        chd = self.get_rhd()
-        
-        #build a dictionary of _meta data for the sample
-        probe_meta = {}
-        c = self._meta.cursor()
-        for header in chd:
-            query = "SELECT %s FROM row WHERE id=?" % (header,)
-            c.execute(query, (sample_name,))
-            probe_meta.update({header : str(c.fetchone()[0])})
-        self._meta.commit()
-        c.close()
-        
-        #return the dictionary
-        return probe_meta
+        if self.meta_backend == 'columnar':
+            return self._meta.table('row').record(sample_name)
+        headers, arrays, positions = self._get_meta_records('row')
+        if sample_name not in positions:
+            raise KeyError("no entry with id %s" % (sample_name,))
+        return dict((header, str(arrays[header][positions[sample_name]]))
+                    for header in headers)
+    
+    def get_probe_meta_many(self,probe_names,fields=None,as_records=False):
+        '''
+        return the _meta data of all of the probes in probe_names, in the same
+        form as get_sample_meta_many
+        '''
+        return self._get_meta_many('row', probe_names, fields, as_records)
     
     def get_inds_by_cdesc(self,column,desc,op='='):
         '''
         look for all of the entries in the column _meta data matching cdesc in column and
         return their indices in an list
         '''
+        if self.meta_backend == 'columnar':
+            return self._meta.table('col').inds_where(column, desc, op)
+        
         #construct the query
         if self._is_number(desc):
             query = "SELECT ind FROM col WHERE CAST(%s AS REAL) %s '%s'" % (column,op,desc)
@@ -547,6 +941,9 @@ class GCT(object):
         look for all of the entries in the row _meta data matching cdesc in column and
         return their indices in an list
         '''
+        if self.meta_backend == 'columnar':
+            return self._meta.table('row').inds_where(column, desc, op)
+        
         #construct the query
         if self._is_number(desc):
             query = "SELECT ind FROM row WHERE CAST(%s AS REAL) %s '%s'" % (column,op,desc)
@@ -567,21 +964,18 @@ class GCT(object):
         '''
         returns a list of all column ids found in the dataset
         '''
-        #query the col database for all ids 
-        inds = []
-        ids = [] 
+        if self.meta_backend == 'columnar':
+            return self._meta.table('col').field('id').text()
+        
+        #query the col database for all ids in the order they were read,
+        #which matches the order of the matrix columns
+        ordered_ids = [] 
         c = self._meta.cursor()
-        c.execute("SELECT ind, id FROM col")
+        c.execute("SELECT id FROM col ORDER BY rowid")
         for row in c:
-            inds.append(int(row[0]))
-            ids.append(str(row[1]))
+            ordered_ids.append(str(row[0]))
         c.close()
         
-        #ensure that the ids are in the proper order according to ind
-        inds_ids = zip(inds,ids)
-        inds_ids.sort()
-        ordered_ids = [item[1] for item in inds_ids]
-        
         #return the result
         return ordered_ids
     
@@ -589,21 +983,18 @@ class GCT(object):
         '''
         returns a list of all row ids found in the dataset
         '''
-        #query the col database for all ids 
-        inds = []
-        ids = [] 
+        if self.meta_backend == 'columnar':
+            return self._meta.table('row').field('id').text()
+        
+        #query the row database for all ids in the order they were read,
+        #which matches the order of the matrix rows
+        ordered_ids = [] 
         c = self._meta.cursor()
-        c.execute("SELECT ind, id FROM row")
+        c.execute("SELECT id FROM row ORDER BY rowid")
         for row in c:
-            inds.append(int(row[0]))
-            ids.append(str(row[1]))
+            ordered_ids.append(str(row[0]))
         c.close()
         
-        #ensure that the ids are in the proper order according to ind
-        inds_ids = zip(inds,ids)
-        inds_ids.sort()
-        ordered_ids = [item[1] for item in inds_ids]
-        
         #return the result
         return ordered_ids
     
@@ -611,6 +1002,9 @@ class GCT(object):
         '''
         returns the names of the row _meta data headers in a list
         '''
+        if self.meta_backend == 'columnar':
+            return self._meta.headers('row')
+        
         #query the row data base for its headers using a pragma statement
         c = self._meta.cursor()
         c.execute("PRAGMA table_info(row)")
@@ -628,6 +1022,9 @@ class GCT(object):
         '''
         returns the names of the column _meta data headers in a list
         '''
+        if self.meta_backend == 'columnar':
+            return self._meta.headers('col')
+        
         #query the col data base for its headers using a pragma statement
         c = self._meta.cursor()
         c.execute("PRAGMA table_info(col)")
@@ -639,6 +1036,459 @@ class GCT(object):
         
         #return the header list
         return chd
+    
+    def get_meta_fields(self,table_name):
+        '''
+        returns the meta data in the table_name table as a list of (header, 
+        values) tuples, leaving out the ind field.  Values are in the order 
+        they were read, which matches the matrix.
+        '''
+        if table_name == 'col':
+            headers = self.get_chd()
+        else:
+            headers = self.get_rhd()
+        headers = [x for x in headers if x != 'ind']
+        if not headers:
+            return []
+        if self.meta_backend == 'columnar':
+            table = self._meta.table(table_name)
+            return [(header, table.field(header).text()) for header in headers]
+        c = self._meta.cursor()
+        c.execute("SELECT %s FROM %s ORDER BY rowid" % (', '.join(headers), table_name))
+        values = zip(*[[str(x) for x in row] for row in c])
+        c.close()
+        if not values:
+            values = [[] for x in headers]
+        return [(header, list(field)) for header,field in zip(headers, values)]
+    
+    def write_gctx(self,dest,chunkshape=None,layout='col',compression='zlib',
+                   complevel=6,dtype=numpy.float32):
+        '''
+        writes the matrix and meta data to the gctx file dest (see GCTXWriter
+        for a description of the chunkshape, layout, compression, complevel
+        and dtype options).  A lazy GCTXMatrix is copied one block at a time.
+        '''
+        col_meta = self.get_meta_fields('col')
+        writer = GCTXWriter(dest, self.get_meta_fields('row'), 
+                            chunkshape=chunkshape, layout=layout,
+                            compression=compression, complevel=complevel,
+                            dtype=dtype)
+        try:
+            block_size = writer.chunkshape[1]
+            num_cols = self.matrix.shape[1]
+            for start in range(0, num_cols, block_size):
+                stop = min(start + block_size, num_cols)
+                writer.append(self.matrix[:,start:stop],
+                              [(header, values[start:stop]) 
+                               for header,values in col_meta])
+        finally:
+            writer.close()
+
+    def write_gct(self,dest,precision=4,version='#1.3',block_size=None):
+        '''
+        writes the matrix and meta data to the text gct file dest, gzip 
+        compressed if dest ends with .gz.  Version '#1.3' files include all row
+        and column meta data; version '#1.2' files only the row ids and a 
+        Description field.  Values are written with the given number of
+        decimal places.  The matrix is read in blocks of whole rows holding 
+        about block_size values (max_block_size by default) and formatted with
+        array operations (see _format_gct_block), so memory use does not grow
+        with the size of the matrix.  Rows of a lazy GCTXMatrix are read from
+        every chunk of a column chunked file, so larger blocks mean fewer 
+        passes over such files.
+        '''
+        row_meta = self.get_meta_fields('row')
+        col_meta = self.get_meta_fields('col')
+        row_ids = dict(row_meta)['id']
+        col_ids = dict(col_meta)['id']
+        num_rows, num_cols = self.matrix.shape
+        
+        #set up the header lines
+        if version == '#1.2':
+            descriptions = dict(row_meta).get('Description', ['na'] * num_rows)
+            row_meta = [('Name', row_ids), ('Description', descriptions)]
+            header = ['#1.2', '%d\t%d' % (num_rows, num_cols),
+                      '\t'.join(['Name', 'Description'] + col_ids)]
+        elif version == '#1.3':
+            row_meta = [('id', row_ids)] + [x for x in row_meta if x[0] != 'id']
+            col_meta = [x for x in col_meta if x[0] != 'id']
+            header = ['#1.3', '%d\t%d\t%d\t%d' % (num_rows, num_cols,
+                                                  len(row_meta) - 1, len(col_meta)),
+                      '\t'.join([x[0] for x in row_meta] + col_ids)]
+            for chd,values in col_meta:
+                header.append('\t'.join([chd] + ['na'] * (len(row_meta) - 1) + values))
+        else:
+            raise GCTException("version must be '#1.2' or '#1.3'")
+        
+        #open the file
+        if dest.endswith('.gz'):
+            f = gzip.open(dest, 'wb')
+        else:
+            f = open(dest, 'w')
+        try:
+            f.write('\n'.join(header) + '\n')
+            
+            #write the data rows one block of rows at a time, formatting a few
+            #hundred thousand values at a time
+            row_meta_values = [x[1] for x in row_meta]
+            if block_size is None:
+                block_size = self.max_block_size
+            rows_per_block = max(1, block_size // max(num_cols, 1))
+            rows_per_format = max(1, 2**18 // max(num_cols, 1))
+            for start in range(0, num_rows, rows_per_block):
+                stop = min(start + rows_per_block, num_rows)
+                block = numpy.asarray(self.matrix[start:stop,:], dtype=numpy.float64)
+                for sub_start in range(0, stop - start, rows_per_format):
+                    sub_stop = min(sub_start + rows_per_format, stop - start)
+                    prefixes = ['\t'.join(x) + '\t' for x in 
+                                zip(*[values[start+sub_start:start+sub_stop] 
+                                      for values in row_meta_values])]
+                    rows = _format_gct_block(block[sub_start:sub_stop], precision)
+                    f.write(''.join([x + y for x,y in zip(prefixes, rows)]))
+        finally:
+            f.close()
+
+def read_gct_header(f):
+    '''
+    reads the header lines of the text gct file f, leaving f at the first data
+    row.  Returns the version, the number of rows and columns, the row meta
+    data headers (id first) and the column meta data as a list of (header,
+    values) tuples (id first).  version 1.2 files have no column meta data 
+    and a single Description row meta data field.
+    '''
+    version = f.readline().rstrip('\r\n').split('\t')[0]
+    dims = [int(x) for x in f.readline().rstrip('\r\n').split('\t') if x]
+    num_rows, num_cols = dims[0], dims[1]
+    if len(dims) == 4:
+        num_rhd, num_chd = dims[2], dims[3]
+    else:
+        num_rhd, num_chd = 1, 0
+    
+    #parse the first line to get sample names and row meta_data headers
+    titles = f.readline().rstrip('\r\n').split('\t')
+    row_meta_headers = titles[:num_rhd+1]
+    row_meta_headers[0] = 'id'
+    col_meta = [('id', titles[num_rhd+1:])]
+    
+    #parse the meta data for the columns
+    for ii in range(num_chd):
+        tmp_row = f.readline().rstrip('\r\n').split('\t')
+        col_meta.append((tmp_row[0], tmp_row[num_rhd+1:]))
+    return version, num_rows, num_cols, row_meta_headers, col_meta
+
+def _parse_gct_block(value_strings,num_cols,dtype):
+    '''
+    parses a list of tab delimited strings of numbers, one per gct row, into
+    a two dimensional array with num_cols columns
+    '''
+    #fast path: parse the whole block with a single numpy call.  The total
+    #count alone would let a short row and a long row cancel out, so each
+    #row must also hold the right number of fields
+    values = numpy.fromstring('\n'.join(value_strings), dtype=dtype, sep='\t')
+    if values.size == len(value_strings) * num_cols and \
+            all(x.count('\t') == num_cols - 1 for x in value_strings):
+        return values.reshape((len(value_strings), num_cols))
+    
+    #slow path for blocks containing missing or non-numeric entries
+    values = numpy.empty((len(value_strings), num_cols), dtype=dtype)
+    for ii,value_string in enumerate(value_strings):
+        row = value_string.split('\t')
+        if len(row) != num_cols:
+            raise GCTException("expected %d values but found %d in data row"
+                               % (num_cols, len(row)))
+        values[ii] = [_gct_float(x) for x in row]
+    return values
+
+#the four digit strings of 0 to 9999 as rows of characters
+_DIGIT_GROUPS = numpy.frombuffer(''.join(['%04d' % (x,) for x in range(10000)]),
+                                 dtype=numpy.uint8).reshape((10000, 4))
+
+def _format_gct_block(block,precision):
+    '''
+    formats the rows of the two dimensional array block as gct data lines, 
+    returning one tab delimited, newline terminated string per row with the
+    values written to the given number of decimal places exactly as '%.4f'
+    style formatting would.  The digits of every value are built at once
+    with integer arithmetic into a character array, which is then packed 
+    into text with a single mask.  Rows holding values that are not finite,
+    too large for exact integer arithmetic or within rounding error of a
+    tie are formatted with a format string instead.
+    '''
+    block = numpy.asarray(block, dtype=numpy.float64)
+    num_rows, num_cols = block.shape
+    if num_cols == 0:
+        return ['\n'] * num_rows
+    
+    #round the magnitudes to integers holding precision decimal places
+    scale = 10 ** precision
+    scaled = numpy.abs(block)
+    scaled *= scale
+    with numpy.errstate(invalid='ignore'):
+        fast = scaled < 1e12
+    if not fast.all():
+        scaled[~fast] = 0
+    rounded = numpy.rint(scaled)
+    scaled -= rounded
+    numpy.abs(scaled, scaled)
+    fast &= scaled < 0.5 - (float(rounded.max()) * 2.3e-16 + 1e-12)
+    slow_rows = numpy.nonzero(~fast.all(axis=1))[0]
+    itype = numpy.int32 if rounded.max() < 2**31 else numpy.int64
+    int_part, frac_part = numpy.divmod(rounded.astype(itype), itype(scale))
+    
+    #lay each value out as sign, integer digits padded to a multiple of four,
+    #decimal point, fraction digits and separator; keep marks the characters
+    #that are written
+    int_groups = -(-len(str(int(int_part.max()))) // 4)
+    frac_groups = -(-precision // 4)
+    int_width = 4 * int_groups
+    width = 1 + int_width + (1 + 4 * frac_groups if precision else 0) + 1
+    chars = numpy.empty((num_rows, num_cols, width), dtype=numpy.uint8)
+    keep = numpy.zeros((num_rows, num_cols, width), dtype=bool)
+    negative = numpy.signbit(block)
+    chars[:,:,0] = ord('-')
+    keep[:,:,0] = negative
+    lengths = negative.sum(axis=1) + num_cols * (2 + (1 + precision if precision else 0))
+    for ii in range(int_groups):
+        group = int_part // itype(10 ** (4 * (int_groups - 1 - ii)))
+        chars[:,:,1+4*ii:5+4*ii] = _DIGIT_GROUPS[group % itype(10000)]
+    for jj in range(int_width - 1):
+        #leading zeros are dropped, the units digit is always kept
+        digits = int_part >= itype(10 ** (int_width - 1 - jj))
+        keep[:,:,1+jj] = digits
+        lengths += digits.sum(axis=1)
+    keep[:,:,int_width] = True
+    if precision:
+        pos = 1 + int_width
+        chars[:,:,pos] = ord('.')
+        frac_part *= itype(10 ** (4 * frac_groups - precision))
+        for ii in range(frac_groups):
+            group = frac_part // itype(10 ** (4 * (frac_groups - 1 - ii)))
+            chars[:,:,pos+1+4*ii:pos+5+4*ii] = _DIGIT_GROUPS[group % itype(10000)]
+        keep[:,:,pos:pos+1+precision] = True
+    chars[:,:,-1] = ord('\t')
+    chars[:,-1,-1] = ord('\n')
+    keep[:,:,-1] = True
+    
+    #pack the kept characters and split them into rows
+    text = chars[keep].tostring()
+    offsets = numpy.concatenate(([0], numpy.cumsum(lengths))).tolist()
+    rows = [text[offsets[ii]:offsets[ii+1]] for ii in range(num_rows)]
+    if len(slow_rows):
+        row_format = '\t'.join(['%%.%df' % (precision,)] * num_cols) + '\n'
+        for ii in slow_rows.tolist():
+            rows[ii] = row_format % tuple(block[ii].tolist())
+    return rows
+
+def _gct_float(s):
+    '''
+    converts the gct value s to a float, or NaN if it is not a number
+    '''
+    try:
+        return float(s)
+    except ValueError:
+        return numpy.nan
+
+def read_matrix_node(matrix_node,row_inds,col_inds,max_block_size=2**22,
+                     instrument=instrumentation.NULL_INSTRUMENT,cache=None):
+    '''
+    reads the given rows and columns of a gctx matrix node (which is stored 
+    with one hdf5 row per gct column).  The requested indices are coalesced 
+    into runs that only span the hdf5 chunks holding requested data, and each
+    block read (at most max_block_size elements) is scattered straight into a
+    matrix with one row per entry of row_inds and one column per entry of 
+    col_inds, in the order given.  Block reads and the scatter are timed as
+    the 'matrix_read' and 'reorder' stages of instrument, which also counts
+    the hdf5 chunks each block touches and their decompressed size in bytes.
+    If cache (a ChunkCache) is given, blocks are assembled from the cached
+    chunks of chunked nodes and only the missing chunks are read from disk.
+    '''
+    col_inds = numpy.asarray(col_inds, dtype=numpy.int64)
+    row_inds = numpy.asarray(row_inds, dtype=numpy.int64)
+    chunkshape = matrix_node.chunkshape or (1, 1)
+    cache_key = None
+    if cache is not None and matrix_node.chunkshape:
+        src = os.path.abspath(matrix_node._v_file.filename)
+        cache_key = (src, os.path.getmtime(src), matrix_node._v_pathname)
+    col_unique, col_first, col_inverse = numpy.unique(col_inds, 
+                                return_index=True, return_inverse=True)
+    row_unique, row_first, row_inverse = numpy.unique(row_inds, 
+                                return_index=True, return_inverse=True)
+    
+    #read the data one block at a time
+    matrix = numpy.empty((len(row_inds), len(col_inds)), dtype=matrix_node.dtype)
+    max_row_span = max(chunkshape[1], max_block_size // chunkshape[0])
+    for row_start,row_stop,row_run in _coalesce_inds(row_unique, 
+                                            chunkshape[1], max_row_span):
+        row_pos = row_first[numpy.searchsorted(row_unique, row_run)]
+        max_col_span = max(chunkshape[0], 
+                           max_block_size // (row_stop - row_start))
+        for col_start,col_stop,col_run in _coalesce_inds(col_unique,
+                                            chunkshape[0], max_col_span):
+            col_pos = col_first[numpy.searchsorted(col_unique, col_run)]
+            if cache_key is not None:
+                with instrument.stage('matrix_read'):
+                    block = _read_cached_block(matrix_node, cache, cache_key,
+                                col_start, col_stop, row_start, row_stop,
+                                instrument)
+            else:
+                with instrument.stage('matrix_read'):
+                    block = matrix_node[col_start:col_stop,row_start:row_stop]
+            if instrument.enabled and cache_key is None:
+                chunks = ((-(-col_stop // chunkshape[0]) - col_start // chunkshape[0]) *
+                          (-(-row_stop // chunkshape[1]) - row_start // chunkshape[1]))
+                instrument.count('chunks', chunks)
+                instrument.count('bytes_read', chunks * chunkshape[0] *
+                                 chunkshape[1] * matrix.itemsize)
+            with instrument.stage('reorder'):
+                block = block[numpy.ix_(col_run - col_start, row_run - row_start)]
+                matrix[numpy.ix_(row_pos, col_pos)] = block.transpose()
+    
+    #fill in any indices that were requested more than once
+    with instrument.stage('reorder'):
+        _fill_duplicates(matrix, row_first, row_inverse, 0)
+        _fill_duplicates(matrix, col_first, col_inverse, 1)
+    return matrix
+
+def _block_slices(inds,block_size):
+    '''
+    splits the positions of inds into (start, stop) slices of at most
+    block_size entries.  If inds is in increasing order it is split where it
+    crosses a multiple of block_size so that blocks follow the file's chunk
+    layout.
+    '''
+    slices = []
+    if len(inds) == 0:
+        return slices
+    bounds = [0, len(inds)]
+    if numpy.all(numpy.diff(inds) > 0):
+        breaks = numpy.nonzero(numpy.diff(inds // block_size))[0] + 1
+        bounds = [0] + breaks.tolist() + [len(inds)]
+    for start,stop in zip(bounds[:-1], bounds[1:]):
+        for block_start in range(start, stop, block_size):
+            slices.append((block_start, min(block_start + block_size, stop)))
+    return slices
+
+def _prefetch(iterable,depth):
+    '''
+    yields the items of iterable, producing up to depth items ahead on a
+    background thread.  Exceptions raised by iterable are raised in the
+    caller, and the thread is stopped when the caller stops iterating.
+    '''
+    if depth < 1:
+        for item in iterable:
+            yield item
+        return
+    results = Queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+    
+    def produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        results.put((item, None), timeout=0.1)
+                        break
+                    except Queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+            results.put((done, None))
+        except Exception as e:
+            results.put((done, e))
+    
+    thread = threading.Thread(target=produce)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            item, error = results.get()
+            if error is not None:
+                raise error
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+        while thread.is_alive():
+            try:
+                results.get(timeout=0.1)
+            except Queue.Empty:
+                pass
+        thread.join()
+
+def _read_cached_block(matrix_node,cache,cache_key,col_start,col_stop,
+                      row_start,row_stop,instrument):
+    '''
+    returns matrix_node[col_start:col_stop,row_start:row_stop], copied from
+    the chunks held in cache under cache_key plus the chunk coordinates.
+    Missing chunks are read whole from disk and added to the cache.
+    '''
+    chunkshape = matrix_node.chunkshape
+    shape = matrix_node.shape
+    block = numpy.empty((col_stop - col_start, row_stop - row_start),
+                        dtype=matrix_node.dtype)
+    for ci in range(col_start // chunkshape[0], -(-col_stop // chunkshape[0])):
+        chunk_col_start = ci * chunkshape[0]
+        chunk_col_stop = min(chunk_col_start + chunkshape[0], shape[0])
+        col_lo = max(chunk_col_start, col_start)
+        col_hi = min(chunk_col_stop, col_stop)
+        for ri in range(row_start // chunkshape[1], -(-row_stop // chunkshape[1])):
+            chunk_row_start = ri * chunkshape[1]
+            chunk_row_stop = min(chunk_row_start + chunkshape[1], shape[1])
+            key = cache_key + (ci, ri)
+            chunk = cache.get(key)
+            if chunk is None:
+                chunk = matrix_node[chunk_col_start:chunk_col_stop,
+                                    chunk_row_start:chunk_row_stop]
+                cache.put(key, chunk)
+                if instrument.enabled:
+                    instrument.count('chunks')
+                    instrument.count('bytes_read', chunk.nbytes)
+                    instrument.count('cache_misses')
+            elif instrument.enabled:
+                instrument.count('cache_hits')
+            row_lo = max(chunk_row_start, row_start)
+            row_hi = min(chunk_row_stop, row_stop)
+            block[col_lo - col_start:col_hi - col_start,
+                  row_lo - row_start:row_hi - row_start] = \
+                    chunk[col_lo - chunk_col_start:col_hi - chunk_col_start,
+                          row_lo - chunk_row_start:row_hi - chunk_row_start]
+    return block
+
+def _coalesce_inds(inds,chunk_len,max_span):
+    '''
+    splits the sorted unique indices in inds into runs that each span only 
+    hdf5 chunks of length chunk_len containing at least one requested index
+    and that are at most max_span long.  Returns a list of (start, stop, run)
+    tuples where run holds the indices falling in [start, stop)
+    '''
+    runs = []
+    if len(inds) == 0:
+        return runs
+    
+    #break wherever a chunk without any requested index is skipped over
+    chunk_ids = inds // chunk_len
+    breaks = numpy.nonzero(numpy.diff(chunk_ids) > 1)[0] + 1
+    for group in numpy.split(inds, breaks):
+        while len(group):
+            n = numpy.searchsorted(group, group[0] + max_span, 'left')
+            runs.append((int(group[0]), int(group[n-1]) + 1, group[:n]))
+            group = group[n:]
+    return runs
+
+def _fill_duplicates(matrix,first,inverse,axis):
+    '''
+    copies the first occurrence of each repeated index along the given axis of
+    matrix into the positions of the later occurrences
+    '''
+    source = first[inverse]
+    dups = numpy.nonzero(source != numpy.arange(len(inverse)))[0]
+    if len(dups):
+        if axis == 0:
+            matrix[dups,:] = matrix[source[dups],:]
+        else:
+            matrix[:,dups] = matrix[:,source[dups]]
 
 class GCTException(Exception):
     '''
@@ -649,6 +1499,1339 @@ class GCTException(Exception):
     def __str__(self):
         return repr(self.message)
 
+class GCTXHandle(object):
+    '''
+    an open gctx file along with shortcut references to its matrix and meta
+    data nodes
+    '''
+    def __init__(self,src):
+        self.src = src
+        self.mtime = os.path.getmtime(src)
+        self.file = tables.openFile(src)
+        self.version = self.file.getNodeAttr("/","version")
+        self.matrix_node = self.file.getNode("/0/DATA/0", "matrix")
+        self.column_id_node = self.file.getNode("/0/META/COL", "id")
+        self.row_id_node = self.file.getNode("/0/META/ROW", "id")
+        self.column_data = self.file.listNodes("/0/META/COL")
+        self.row_data = self.file.listNodes("/0/META/ROW")
+        self.users = 0
+        self.key = None
+        self._siblings = None
+    
+    def __repr__(self):
+        return 'GCTXHandle(src=%r)' % (self.src,)
+    
+    def siblings(self):
+        '''
+        returns the sibling layouts of the file (see find_siblings), looked
+        up once per handle
+        '''
+        if self._siblings is None:
+            self._siblings = find_siblings(self.src)
+        return self._siblings
+    
+    def close(self):
+        '''
+        close the underlying gctx file
+        '''
+        self.file.close()
+
+class GCTXHandlePool(object):
+    '''
+    a thread safe least recently used pool of open gctx file handles.  At most
+    max_size handles are kept open; handles that are in use are never closed.
+    Handles are reopened when the file on disk has been modified.  Handles
+    are pooled per thread, so a handle is only ever read from the thread that
+    acquired it; pass it to another thread only if the acquiring thread stops
+    using it.
+    '''
+    def __init__(self,max_size=8):
+        self.max_size = max_size
+        self._handles = collections.OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._handles)
+    
+    def acquire(self,src):
+        '''
+        returns an open GCTXHandle for src owned by the calling thread, 
+        marking it as in use
+        '''
+        key = (os.path.abspath(src), threading.current_thread().ident)
+        with self._lock:
+            handle = self._handles.pop(key, None)
+            if (handle is not None and not handle.users and 
+                    handle.mtime != os.path.getmtime(src)):
+                handle.close()
+                handle = None
+            if handle is None:
+                handle = GCTXHandle(src)
+                handle.key = key
+            handle.users += 1
+            self._handles[key] = handle
+            self._evict()
+        return handle
+    
+    def release(self,handle):
+        '''
+        marks a handle returned by acquire as no longer in use
+        '''
+        with self._lock:
+            handle.users -= 1
+            if self._handles.get(handle.key) is not handle and not handle.users:
+                handle.close()
+            self._evict()
+    
+    def resize(self,max_size):
+        '''
+        changes the maximum number of open handles
+        '''
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+    
+    def clear(self):
+        '''
+        closes all handles that are not in use
+        '''
+        with self._lock:
+            for key in list(self._handles.keys()):
+                if not self._handles[key].users:
+                    self._handles.pop(key).close()
+    
+    def _evict(self):
+        '''
+        closes least recently used idle handles until the pool fits max_size
+        '''
+        for key in list(self._handles.keys()):
+            if len(self._handles) <= self.max_size:
+                break
+            if not self._handles[key].users:
+                self._handles.pop(key).close()
+
+class ChunkCache(object):
+    '''
+    a thread safe least recently used cache of decompressed gctx matrix
+    chunks.  Chunks are keyed by file, modification time, node and chunk
+    coordinates, so entries of a file that has been rewritten are never
+    served.  Least recently used chunks are evicted once the cache holds
+    more than max_bytes of data or (if given) max_chunks chunks; chunks
+    larger than max_bytes are not cached.  hits, misses and evictions are
+    counted (see stats).
+
+    example usage:
+    import cmap.io.gct as gct
+    gct.chunk_cache.resize(max_bytes=2**30)
+    GCTObject = gct.GCT('path_to_gctx_file', cached=True)
+    GCTObject.read_gctx_matrix(col_inds=range(100))
+    print(gct.chunk_cache.stats())
+    '''
+    def __init__(self,max_bytes=2**28,max_chunks=None):
+        self.max_bytes = max_bytes
+        self.max_chunks = max_chunks
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._chunks = collections.OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._chunks)
+    
+    def __repr__(self):
+        return 'ChunkCache(max_bytes=%r, chunks=%d, nbytes=%d)' % (
+                    self.max_bytes, len(self._chunks), self.nbytes)
+    
+    def get(self,key):
+        '''
+        returns the chunk stored under key, or None on a miss
+        '''
+        with self._lock:
+            chunk = self._chunks.pop(key, None)
+            if chunk is None:
+                self.misses += 1
+                return None
+            self._chunks[key] = chunk
+            self.hits += 1
+        return chunk
+    
+    def put(self,key,chunk):
+        '''
+        stores chunk under key.  The chunk is marked read only since it is
+        shared by all readers.
+        '''
+        if chunk.nbytes > self.max_bytes:
+            return
+        chunk.flags.writeable = False
+        with self._lock:
+            old = self._chunks.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._chunks[key] = chunk
+            self.nbytes += chunk.nbytes
+            self._evict()
+    
+    def invalidate(self,src):
+        '''
+        drops all chunks of the file src
+        '''
+        src = os.path.abspath(src)
+        with self._lock:
+            for key in [x for x in self._chunks if x[0] == src]:
+                self.nbytes -= self._chunks.pop(key).nbytes
+    
+    def resize(self,max_bytes=None,max_chunks=None):
+        '''
+        changes the maximum number of bytes and chunks held and evicts
+        chunks until the cache fits
+        '''
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            self.max_chunks = max_chunks
+            self._evict()
+    
+    def clear(self):
+        '''
+        drops all chunks and resets the statistics
+        '''
+        with self._lock:
+            self._chunks.clear()
+            self.nbytes = 0
+            self.hits = self.misses = self.evictions = 0
+    
+    def stats(self):
+        '''
+        returns a dictionary of the hit, miss and eviction counts, the hit
+        rate and the number of chunks and bytes held
+        '''
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'hits':self.hits, 'misses':self.misses,
+                    'evictions':self.evictions,
+                    'hit_rate':float(self.hits) / lookups if lookups else 0.0,
+                    'chunks':len(self._chunks), 'nbytes':self.nbytes,
+                    'max_bytes':self.max_bytes}
+    
+    def _evict(self):
+        '''
+        drops least recently used chunks until the cache fits its limits
+        '''
+        while self._chunks and (self.nbytes > self.max_bytes or 
+                (self.max_chunks is not None and len(self._chunks) > self.max_chunks)):
+            self.nbytes -= self._chunks.popitem(last=False)[1].nbytes
+            self.evictions += 1
+
+class GCTXWriter(object):
+    '''
+    streaming writer for gctx files.  The row meta data is given up front as
+    a list of (header, values) tuples (or a dict) that must include an id 
+    field; the matrix is then appended one block of columns at a time along 
+    with the column meta data of the block, so outputs of any size can be 
+    written without holding them in memory.  The column meta data of each 
+    block is spilled to a temporary file next to dest as it is appended and
+    copied into dest one block at a time when the writer is closed, once the
+    type of each field is known.
+
+    The matrix is stored as dtype (float32 by default) in chunks of the given
+    chunkshape, given as (rows, columns).  If chunkshape is not given it is
+    chosen for the layout: 'col' favors reading whole columns (samples), 'row'
+    favors reading whole rows (probes).  compression may be 'zlib', 'blosc' or
+    None.
+
+    example usage:
+    import cmap.io.gct as gct
+    writer = gct.GCTXWriter('out.gctx', [('id', rids)], layout='col')
+    for cids, block in blocks:
+        writer.append(block, [('id', cids)])
+    writer.close()
+    '''
+    chunk_size = 2**16
+    
+    def __init__(self,dest,row_meta,chunkshape=None,layout='col',
+                 compression='zlib',complevel=6,dtype=numpy.float32,
+                 version='GCTX1.0'):
+        self.dest = dest
+        self.row_meta = _as_meta_list(row_meta)
+        self.num_rows = len(dict(self.row_meta)['id'])
+        self.dtype = numpy.dtype(dtype)
+        self.num_cols = 0
+        self._fields = collections.OrderedDict()
+        self._block_sizes = []
+        self._spill = None
+        self._spill_path = None
+        
+        #choose the chunk shape, in (rows, columns)
+        if chunkshape is None:
+            if layout == 'col':
+                rows = max(1, self.num_rows)
+            elif layout == 'row':
+                rows = max(1, min(self.num_rows, 8))
+            else:
+                raise GCTException("layout must be 'col' or 'row'")
+            chunkshape = (rows, max(1, self.chunk_size // rows))
+        self.chunkshape = tuple(int(x) for x in chunkshape)
+        
+        #create the gctx layout, storing the matrix with one hdf5 row per
+        #gct column so that it can be extended a block of columns at a time
+        filters = _gctx_filters(compression, complevel)
+        self._file = _create_gctx_file(dest, version)
+        self.matrix_node = self._file.createEArray('/0/DATA/0', 'matrix',
+                                tables.Atom.from_dtype(self.dtype), 
+                                (0, self.num_rows), filters=filters,
+                                chunkshape=(self.chunkshape[1], self.chunkshape[0]))
+        _write_meta_nodes(self._file, '/0/META/ROW', self.row_meta)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def append(self,matrix,col_meta):
+        '''
+        appends the columns of matrix (one row per row of the file) to the 
+        file.  col_meta is the column meta data of the block as a list of 
+        (header, values) tuples or a dict, and must include an id field.
+        '''
+        matrix = numpy.asarray(matrix)
+        col_meta = _as_meta_list(col_meta)
+        if matrix.shape[0] != self.num_rows:
+            raise GCTException("expected %d rows but the block has %d" 
+                               % (self.num_rows, matrix.shape[0]))
+        for header,values in col_meta:
+            if len(values) != matrix.shape[1]:
+                raise GCTException("%s has %d values for %d columns" 
+                                   % (header, len(values), matrix.shape[1]))
+        self.matrix_node.append(matrix.transpose().astype(self.dtype))
+        
+        #spill the column meta data of the block
+        if self._spill is None:
+            fd, self._spill_path = tempfile.mkstemp(suffix='.colmeta.h5',
+                                        dir=os.path.dirname(os.path.abspath(self.dest)))
+            os.close(fd)
+            self._spill = tables.openFile(self._spill_path, 'w')
+        block = len(self._block_sizes)
+        for header,values in col_meta:
+            if header not in self._fields:
+                self._fields[header] = _SpilledMetaField(header, 'f%d' % (len(self._fields),))
+            self._fields[header].add(self._spill, block, values)
+        self._block_sizes.append(matrix.shape[1])
+        self.num_cols += matrix.shape[1]
+    
+    def close(self):
+        '''
+        writes the column meta data and closes the file
+        '''
+        if self._file is None:
+            return
+        try:
+            if not self._block_sizes:
+                _write_meta_nodes(self._file, '/0/META/COL', [('id', [])])
+            for field in self._fields.values():
+                field.write(self._file, '/0/META/COL', self._block_sizes)
+        finally:
+            self._file.close()
+            self._file = None
+            if self._spill is not None:
+                self._spill.close()
+                os.remove(self._spill_path)
+                self._spill = None
+
+class _SpilledMetaField(object):
+    '''
+    one column meta data field of a GCTXWriter.  The values of each block are
+    appended as NUL separated text to a single node of the spill file as they
+    arrive, and only their offsets and what is needed to choose the type of
+    the field (see _write_meta_nodes) are kept in memory.  Blocks without 
+    the field hold MISSING_META_VALUE.
+    '''
+    def __init__(self,header,name):
+        self.header = header
+        self.name = name
+        self.node = None
+        self.blocks = {}
+        self.dtype = None
+        self.numeric = True
+        self.lossless = [numpy.int64, numpy.float64]
+        self.itemsize = len(MISSING_META_VALUE)
+    
+    def add(self,spill,block,values):
+        '''
+        appends the values of the given block to the spill file
+        '''
+        values = numpy.asarray(values)
+        kind = values.dtype.kind
+        if kind in ('i', 'u', 'f'):
+            self.dtype = values.dtype if self.dtype is None else \
+                         numpy.result_type(self.dtype, values.dtype)
+            text = numpy.array([str(x) for x in values.tolist()], dtype=str)
+        else:
+            self.numeric = False
+            kind = 'S'
+            text = values.astype(str)
+        
+        #floats are spilled with repr so that no precision is lost
+        if kind == 'f':
+            stored = '\0'.join([repr(x) for x in values.tolist()])
+        else:
+            stored = '\0'.join(text.tolist())
+        if self.node is None:
+            self.node = spill.createEArray('/', self.name, tables.UInt8Atom(), (0,))
+        start = self.node.nrows
+        if len(values):
+            self.itemsize = max(self.itemsize, text.dtype.itemsize)
+            self.lossless = [x for x in _lossless_dtypes(text) if x in self.lossless]
+            if stored:
+                self.node.append(numpy.frombuffer(stored, dtype=numpy.uint8))
+        self.blocks[block] = (start, self.node.nrows, kind)
+    
+    def write(self,gctx_file,where,block_sizes):
+        '''
+        writes the field to where in gctx_file, copying it from the spill file
+        one block at a time
+        '''
+        if any(size and block not in self.blocks for block,size in enumerate(block_sizes)):
+            self.numeric = False
+            self.lossless = [x for x in _lossless_dtypes(numpy.array([MISSING_META_VALUE]))
+                             if x in self.lossless]
+        if self.numeric and self.dtype is not None:
+            dtype = self.dtype
+        elif self.lossless and self.header != 'id':
+            dtype = numpy.dtype(self.lossless[0])
+        else:
+            dtype = numpy.dtype('S%d' % (self.itemsize,))
+        node = gctx_file.createEArray(where, self.header, tables.Atom.from_dtype(dtype),
+                                      (0,), expectedrows=max(sum(block_sizes), 1))
+        for block,size in enumerate(block_sizes):
+            if not size:
+                continue
+            if block not in self.blocks:
+                values = numpy.array([MISSING_META_VALUE] * size)
+            else:
+                start, stop, kind = self.blocks[block]
+                values = numpy.array(self.node[start:stop].tostring().split('\0'))
+                if kind == 'f' and dtype.kind == 'S':
+                    values = numpy.array([str(float(x)) for x in values.tolist()])
+            node.append(values.astype(dtype))
+
+def _gctx_filters(compression,complevel):
+    '''
+    returns the hdf5 filters for compression ('zlib', 'blosc' or None) at the
+    given level
+    '''
+    if compression in (None, 'none'):
+        return tables.Filters(complevel=0)
+    if compression in ('zlib', 'blosc'):
+        if not tables.whichLibVersion(compression):
+            raise GCTException("%s compression is not available" % (compression,))
+        return tables.Filters(complevel=complevel, complib=compression,
+                              shuffle=True)
+    raise GCTException("compression must be 'zlib', 'blosc' or None")
+
+def _create_gctx_file(dest,version):
+    '''
+    creates the gctx file dest with its groups, ready for the matrix and meta
+    data nodes to be added
+    '''
+    gctx_file = tables.openFile(dest, 'w')
+    gctx_file.setNodeAttr('/', 'version', version)
+    gctx_file.createGroup('/', '0')
+    gctx_file.createGroup('/0', 'DATA')
+    gctx_file.createGroup('/0/DATA', '0')
+    gctx_file.createGroup('/0', 'META')
+    gctx_file.createGroup('/0/META', 'COL')
+    gctx_file.createGroup('/0/META', 'ROW')
+    return gctx_file
+
+def gct_to_gctx(src,dest,chunkshape=None,compression='zlib',complevel=6,
+                dtype=numpy.float32,max_memory=2**27,version='GCTX1.0'):
+    '''
+    converts the text gct file src (version 1.2 or 1.3, gzip compressed if it
+    ends with .gz) to the gctx file dest in a single streaming pass.  Blocks
+    of data rows are parsed and appended to a matrix node that is extended
+    along the row axis, so memory use is bounded by max_memory (plus the meta
+    data) whatever the size of src.  The matrix is stored as dtype in chunks
+    of the given chunkshape, given as (rows, columns); by default chunks span
+    up to 1024 rows, which for L1000 sized files is every row, so whole
+    columns are read from one chunk.  Files with many more rows can be 
+    rechunked afterwards with rechunk_gctx.
+
+    example usage:
+    import cmap.io.gct as gct
+    gct.gct_to_gctx('plate.gct', 'plate.gctx')
+    '''
+    if src.endswith('.gz'):
+        f = gzip.open(src, 'rb')
+    else:
+        f = open(src, 'r')
+    try:
+        src_version, num_rows, num_cols, row_meta_headers, col_meta = \
+                read_gct_header(f)
+        num_rhd = len(row_meta_headers) - 1
+        dtype = numpy.dtype(dtype)
+        
+        #parse whole chunks of rows at a time; a parsed value takes about 32
+        #bytes between its text, the float64 parse and the transposed copy
+        block_rows = max(1, min(num_rows, max_memory // (32 * max(num_cols, 1))))
+        if chunkshape is None:
+            rows = max(1, min(block_rows, 1024))
+            chunkshape = (rows, max(1, min(num_cols, GCTXWriter.chunk_size // rows)))
+        chunkshape = tuple(int(x) for x in chunkshape)
+        block_rows = max(1, block_rows // chunkshape[0]) * chunkshape[0]
+        
+        gctx_file = _create_gctx_file(dest, version)
+        try:
+            matrix_node = gctx_file.createEArray('/0/DATA/0', 'matrix',
+                                tables.Atom.from_dtype(dtype), (num_cols, 0),
+                                filters=_gctx_filters(compression, complevel),
+                                chunkshape=(chunkshape[1], chunkshape[0]))
+            _write_meta_nodes(gctx_file, '/0/META/COL', col_meta)
+            
+            #append the data rows one block at a time
+            row_meta = [[] for x in row_meta_headers]
+            current_row = 0
+            while current_row < num_rows:
+                lines = list(itertools.islice(f, min(block_rows, num_rows - current_row)))
+                if not lines:
+                    break
+                value_strings = []
+                for line in lines:
+                    row = line.rstrip('\r\n').split('\t', num_rhd + 1)
+                    for values,value in zip(row_meta, row[:num_rhd+1]):
+                        values.append(value)
+                    value_strings.append(row[num_rhd+1] if len(row) > num_rhd + 1 else '')
+                block = _parse_gct_block(value_strings, num_cols, numpy.float64)
+                matrix_node.append(block.transpose().astype(dtype))
+                current_row += len(lines)
+            if current_row < num_rows:
+                raise GCTException("expected %d data rows but found %d in %s"
+                                   % (num_rows, current_row, src))
+            _write_meta_nodes(gctx_file, '/0/META/ROW', zip(row_meta_headers, row_meta))
+        finally:
+            gctx_file.close()
+    finally:
+        f.close()
+    return dest
+
+def gctx_to_gct(src,dest,precision=4,version='#1.3',block_size=None):
+    '''
+    converts the gctx file src to the text gct file dest (gzip compressed if
+    it ends with .gz), reading the matrix in blocks of whole rows holding
+    about block_size values (see GCT.write_gct for the block_size, precision
+    and version options)
+
+    example usage:
+    import cmap.io.gct as gct
+    gct.gctx_to_gct('plate.gctx', 'plate.gct', version='#1.2')
+    '''
+    GCTObject = GCT(src)
+    GCTObject.read(verbose=False, lazy=True)
+    if not isinstance(GCTObject.matrix, GCTXMatrix):
+        raise GCTException("could not read %s" % (src,))
+    try:
+        GCTObject.write_gct(dest, precision=precision, version=version,
+                            block_size=block_size)
+    finally:
+        GCTObject.matrix.close()
+    return dest
+
+def _as_meta_list(meta):
+    '''
+    converts meta data given as a dict or a list of (header, values) tuples to
+    a list of (header, values) tuples, checking that it includes an id field
+    '''
+    if isinstance(meta, dict):
+        meta = sorted(meta.items())
+    meta = [(header, list(values)) for header,values in meta]
+    if 'id' not in dict(meta):
+        raise GCTException("meta data must include an id field")
+    return meta
+
+def _lossless_dtypes(values):
+    '''
+    returns the numeric dtypes, of int64 and float64, that the numpy string
+    array values can be stored as and read back unchanged
+    '''
+    text = [str(x) for x in values.tolist()]
+    dtypes = []
+    for dtype in (numpy.int64, numpy.float64):
+        try:
+            typed = values.astype(dtype)
+        except ValueError:
+            continue
+        if [str(x) for x in typed.tolist()] == text:
+            dtypes.append(dtype)
+    return dtypes
+
+def _write_meta_nodes(gctx_file,where,meta):
+    '''
+    writes each (header, values) field of meta as an array node under where.
+    Fields whose values are all numbers are stored as numbers, everything 
+    else (and always the id field) as strings.  String fields are only
+    stored as numbers if every value reads back unchanged, so values such
+    as '007' or '1e3' keep their text.
+    '''
+    for header,values in meta:
+        values = numpy.asarray(values)
+        if header != 'id' and values.dtype.kind in ('S', 'U') and len(values):
+            dtypes = _lossless_dtypes(values)
+            if dtypes:
+                values = values.astype(dtypes[0])
+        if values.dtype.kind not in ('i', 'u', 'f'):
+            values = values.astype(str)
+        if len(values) == 0:
+            values = numpy.array([], dtype='S1')
+        gctx_file.createArray(where, header, values)
+
+def rechunk_gctx(src,dest,chunkshape=None,layout='col',transpose=False,
+                 compression='zlib',complevel=6,dtype=None,max_memory=2**28):
+    '''
+    rewrites the gctx file src to dest with a new chunkshape (or a chunk
+    shape chosen for layout, see GCTXWriter), compression and dtype (by
+    default that of src).  With transpose=True the rows and columns of dest
+    are the columns and rows of src, along with their meta data.  The matrix
+    is streamed through in blocks of whole output chunks using about 
+    max_memory bytes, so files of any size can be rewritten; when the source
+    chunks span more than a block (e.g. transposing a column chunked file)
+    the source is first copied once, uncompressed, to a temporary file next
+    to dest so that no chunk is decompressed more than once.  dest records
+    the name of src and whether it is transposed, which lets readers of src
+    use it as a sibling layout (see write_sibling).
+
+    example usage:
+    import cmap.io.gct as gct
+    gct.rechunk_gctx('plate.gctx', 'plate_rows.gctx', layout='row')
+    '''
+    handle = GCTXHandle(src)
+    try:
+        node = handle.matrix_node
+        src_cols, src_rows = node.shape
+        row_meta = [(x.name, _node_values(x).tolist()) for x in handle.row_data]
+        col_meta = [(x.name, _node_values(x).tolist()) for x in handle.column_data]
+        if transpose:
+            row_meta, col_meta = col_meta, row_meta
+        num_rows = src_cols if transpose else src_rows
+        num_cols = src_rows if transpose else src_cols
+        if dtype is None:
+            dtype = node.dtype
+        
+        writer = GCTXWriter(dest, row_meta, chunkshape=chunkshape, layout=layout,
+                            compression=compression, complevel=complevel,
+                            dtype=dtype)
+        spill_path = None
+        try:
+            #append as many whole chunks of columns as fit in max_memory; a
+            #block is held about three times over (read, cast and transposed)
+            chunk_cols = writer.chunkshape[1]
+            itemsize = max(writer.dtype.itemsize, node.dtype.itemsize)
+            width = max(1, max_memory // (3 * itemsize * max(num_rows, 1)) 
+                        // chunk_cols) * chunk_cols
+            
+            #each block decompresses every source chunk it crosses, so if
+            #source chunks are longer than a block along the output columns
+            #the source is instead read once along its other axis into an 
+            #uncompressed spill file that the blocks are cut from
+            spill = None
+            col_axis = 1 if transpose else 0
+            if node.chunkshape and node.chunkshape[col_axis] > width:
+                fd, spill_path = tempfile.mkstemp(suffix='.rechunk',
+                                    dir=os.path.dirname(os.path.abspath(dest)))
+                os.close(fd)
+                spill = numpy.memmap(spill_path, dtype=node.dtype, mode='w+',
+                                     shape=(max(num_rows, 1), max(num_cols, 1)))
+                row_chunk = node.chunkshape[1 - col_axis]
+                height = max(1, max_memory // (2 * itemsize * max(num_cols, 1)) 
+                             // row_chunk) * row_chunk
+                for start in range(0, num_rows, height):
+                    stop = min(start + height, num_rows)
+                    if transpose:
+                        spill[start:stop,:num_cols] = node[start:stop,:]
+                    else:
+                        spill[start:stop,:num_cols] = node[:,start:stop].transpose()
+            
+            all_inds = numpy.arange(num_rows)
+            for start in range(0, num_cols, width):
+                stop = min(start + width, num_cols)
+                inds = numpy.arange(start, stop)
+                if spill is not None:
+                    block = numpy.array(spill[:num_rows,start:stop])
+                elif transpose:
+                    block = read_matrix_node(node, inds, all_inds).transpose()
+                else:
+                    block = read_matrix_node(node, all_inds, inds)
+                writer.append(block, [(header, values[start:stop]) 
+                                      for header,values in col_meta])
+            del spill
+            writer._file.setNodeAttr('/', 'rechunked_from', os.path.basename(src))
+            writer._file.setNodeAttr('/', 'transposed', int(bool(transpose)))
+        finally:
+            writer.close()
+            if spill_path is not None:
+                os.remove(spill_path)
+    finally:
+        handle.close()
+    return dest
+
+def _node_values(node):
+    '''
+    reads all entries of a meta data node, stripping padding from strings
+    '''
+    values = node[:]
+    if values.dtype.kind in ('S', 'U'):
+        values = numpy.char.rstrip(values)
+    return values
+
+def sibling_path(src,name):
+    '''
+    returns the path of the sibling of the gctx file src with the given name,
+    e.g. plate.row.gctx for plate.gctx and 'row'
+    '''
+    return '%s.%s.gctx' % (os.path.splitext(src)[0], name)
+
+def write_sibling(src,layout='row',transpose=False,**kwargs):
+    '''
+    writes a copy of the gctx file src with the chunk layout given in layout
+    ('col' or 'row'), transposed if transpose is True, next to src (see
+    sibling_path) and returns its path.  Further keyword arguments are passed
+    to rechunk_gctx.  Reads of src through GCT.read_gctx_matrix then use the
+    sibling whenever it touches fewer chunks.
+
+    example usage:
+    import cmap.io.gct as gct
+    gct.write_sibling('plate.gctx', layout='row')
+    GCTObject = gct.GCT('plate.gctx')
+    GCTObject.read_gctx_matrix(row_inds=[10])
+    '''
+    name = layout + ('_T' if transpose else '')
+    return rechunk_gctx(src, sibling_path(src, name), layout=layout,
+                        transpose=transpose, **kwargs)
+
+_siblings = {}
+_siblings_lock = threading.Lock()
+
+def find_siblings(src):
+    '''
+    returns a list of (path, transposed, chunkshape) tuples for the sibling
+    layouts of the gctx file src that are at least as new as src.  
+    chunkshape is the hdf5 chunk shape of the sibling's matrix node.  The 
+    result is cached until src or its directory changes.
+    '''
+    src = os.path.abspath(src)
+    key = (os.path.getmtime(src), os.path.getmtime(os.path.dirname(src)))
+    with _siblings_lock:
+        cached = _siblings.get(src)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    
+    siblings = []
+    name = os.path.basename(src)
+    for path in sorted(glob.glob(sibling_path(src, '*'))):
+        if os.path.getmtime(path) < key[0]:
+            continue
+        try:
+            gctx_file = tables.openFile(path)
+        except Exception:
+            continue
+        try:
+            attrs = gctx_file.root._v_attrs
+            if getattr(attrs, 'rechunked_from', None) != name:
+                continue
+            node = gctx_file.getNode('/0/DATA/0', 'matrix')
+            siblings.append((path, bool(getattr(attrs, 'transposed', 0)),
+                             node.chunkshape))
+        finally:
+            gctx_file.close()
+    with _siblings_lock:
+        _siblings[src] = (key, siblings)
+    return siblings
+
+def _chunks_touched(chunkshape,dim0_inds,dim1_inds):
+    '''
+    returns the number of elements in the hdf5 chunks of the given shape
+    that hold the given indices along the two dimensions of a matrix node
+    '''
+    chunkshape = chunkshape or (1, 1)
+    return (len(numpy.unique(numpy.asarray(dim0_inds) // chunkshape[0])) *
+            len(numpy.unique(numpy.asarray(dim1_inds) // chunkshape[1])) *
+            chunkshape[0] * chunkshape[1])
+
+def cheapest_layout(src,matrix_node,row_inds,col_inds,siblings=None):
+    '''
+    returns the (path, transposed) sibling of the gctx file src (whose matrix
+    node is matrix_node) that reads the given rows and columns by
+    decompressing the fewest elements, or None if there are no siblings or
+    src itself is cheapest.  siblings is the result of find_siblings(src), 
+    which is looked up if not given.
+    '''
+    if siblings is None:
+        siblings = find_siblings(src)
+    if not siblings:
+        return None
+    best = None
+    best_cost = _chunks_touched(matrix_node.chunkshape, col_inds, row_inds)
+    for path,transposed,chunkshape in siblings:
+        if transposed:
+            cost = _chunks_touched(chunkshape, row_inds, col_inds)
+        else:
+            cost = _chunks_touched(chunkshape, col_inds, row_inds)
+        if cost < best_cost:
+            best, best_cost = (path, transposed), cost
+    return best
+
+#process wide pool used by GCT objects created with pooled=True
+handle_pool = GCTXHandlePool()
+
+#process wide cache used by GCT objects created with cached=True
+chunk_cache = ChunkCache()
+
+class GCTXMatrix(object):
+    '''
+    lazy, read only view of the matrix in a gctx file.  The view supports
+    numpy style indexing (integers, slices, index lists and boolean masks on
+    the row and column axes) and only reads the requested data from disk.  
+    If row_inds or col_inds are given the view is restricted to those rows
+    and columns of the file.  If cache_path is given, column blocks are copied
+    into a numpy.memmap at that path the first time they are touched and
+    served from there afterwards.  Reads are recorded by instrument (see
+    cmap.io.instrument) if one is given, and with cached=True they go
+    through the process wide chunk_cache.
+
+    example usage:
+    with gct.GCTXMatrix('path_to_gctx_file') as matrix:
+        print(matrix.shape)
+        block = matrix[:, 1000:2000]
+        for start, stop, block in matrix.iter_blocks(axis=1):
+            print(block.mean())
+    '''
+    def __init__(self,src,row_inds=None,col_inds=None,cache_path=None,
+                 pooled=False,max_block_size=2**22,instrument=None,
+                 cached=False):
+        self.src = src
+        self.pooled = pooled
+        self.cached = cached
+        self.max_block_size = max_block_size
+        if instrument is None:
+            instrument = instrumentation.NULL_INSTRUMENT
+        self.instrument = instrument
+        with instrument.stage('open'):
+            if pooled:
+                self._handle = handle_pool.acquire(src)
+            else:
+                self._handle = GCTXHandle(src)
+        self.matrix_node = self._handle.matrix_node
+        
+        #the node is stored with one hdf5 row per gct column
+        num_cols, num_rows = self.matrix_node.shape
+        self.row_inds = None if row_inds is None else numpy.asarray(row_inds, dtype=numpy.int64)
+        self.col_inds = None if col_inds is None else numpy.asarray(col_inds, dtype=numpy.int64)
+        self.shape = (num_rows if self.row_inds is None else len(self.row_inds),
+                      num_cols if self.col_inds is None else len(self.col_inds))
+        self.dtype = self.matrix_node.dtype
+        chunkshape = self.matrix_node.chunkshape or (1, num_rows)
+        self.chunkshape = (chunkshape[1], chunkshape[0])
+        
+        #set up the memmap cache and a flag per cached column block
+        self.cache_path = cache_path
+        self._cache = None
+        if cache_path:
+            self._cache = numpy.memmap(cache_path, dtype=self.dtype, mode='w+',
+                                       shape=self.shape)
+            self._cached = numpy.zeros(-(-self.shape[1] // self.chunkshape[1]),
+                                       dtype=bool)
+    
+    def __repr__(self):
+        return 'GCTXMatrix(src=%r, shape=%r)' % (self.src, self.shape)
+    
+    def __len__(self):
+        return self.shape[0]
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def __array__(self,dtype=None):
+        matrix = self[:,:]
+        if dtype is not None:
+            matrix = matrix.astype(dtype)
+        return matrix
+    
+    def __iter__(self):
+        for start,stop,block in self.iter_blocks(axis=0):
+            for row in block:
+                yield row
+    
+    def close(self):
+        '''
+        releases the gctx file and flushes the cache
+        '''
+        if self._handle is None:
+            return
+        if self.pooled:
+            handle_pool.release(self._handle)
+        else:
+            self._handle.close()
+        self._handle = None
+        if self._cache is not None:
+            self._cache.flush()
+    
+    def _normalize_key(self,key,length):
+        '''
+        converts an index along an axis of the given length to an array of
+        indices and a flag that is True if the axis should be dropped
+        '''
+        if isinstance(key, slice):
+            return numpy.arange(length)[key], False
+        if isinstance(key, (int, long, numpy.integer)):
+            if key < -length or key >= length:
+                raise IndexError('index %d is out of bounds for axis with size %d'
+                                 % (key, length))
+            return numpy.array([key % length]), True
+        key = numpy.asarray(key)
+        if key.dtype == bool:
+            if len(key) != length:
+                raise IndexError('boolean index of length %d does not match axis of size %d'
+                                 % (len(key), length))
+            return numpy.nonzero(key)[0], False
+        key = key.astype(numpy.int64)
+        if len(key) and (key.min() < -length or key.max() >= length):
+            raise IndexError('index out of bounds for axis with size %d' % (length,))
+        return key % length if len(key) else key, False
+    
+    def _read(self,row_inds,col_inds):
+        '''
+        reads the given view rows and columns from the gctx file
+        '''
+        if self.row_inds is not None:
+            row_inds = self.row_inds[row_inds]
+        if self.col_inds is not None:
+            col_inds = self.col_inds[col_inds]
+        return read_matrix_node(self.matrix_node, row_inds, col_inds,
+                                self.max_block_size, self.instrument,
+                                chunk_cache if self.cached else None)
+    
+    def _fill_cache(self,col_inds):
+        '''
+        copies the column blocks holding the given view columns into the cache
+        '''
+        width = self.chunkshape[1]
+        blocks = numpy.unique(col_inds // width)
+        for block in blocks[~self._cached[blocks]]:
+            start = block * width
+            stop = min(start + width, self.shape[1])
+            self._cache[:,start:stop] = self._read(numpy.arange(self.shape[0]),
+                                                   numpy.arange(start, stop))
+            self._cached[block] = True
+    
+    def __getitem__(self,key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        if len(key) != 2:
+            raise IndexError('GCTXMatrix only supports two dimensional indexing')
+        row_inds, drop_row = self._normalize_key(key[0], self.shape[0])
+        col_inds, drop_col = self._normalize_key(key[1], self.shape[1])
+        
+        if self._handle is None:
+            raise GCTException("%s has been closed" % (self.src,))
+        if self._cache is not None:
+            self._fill_cache(col_inds)
+            matrix = self._cache[numpy.ix_(row_inds, col_inds)]
+        else:
+            matrix = self._read(row_inds, col_inds)
+        
+        #drop the axes indexed by integers
+        if drop_row and drop_col:
+            return matrix[0,0]
+        if drop_row:
+            return matrix[0]
+        if drop_col:
+            return matrix[:,0]
+        return matrix
+    
+    def iter_blocks(self,axis=1,block_size=None):
+        '''
+        iterates over blocks of rows (axis=0) or columns (axis=1), yielding
+        (start, stop, block) tuples.  By default blocks follow the chunk 
+        layout of the file.
+        '''
+        if block_size is None:
+            block_size = self.chunkshape[axis]
+        for start in range(0, self.shape[axis], block_size):
+            stop = min(start + block_size, self.shape[axis])
+            if axis == 0:
+                yield start, stop, self[start:stop,:]
+            else:
+                yield start, stop, self[:,start:stop]
+
+#value used for meta data fields that are missing from some of the sources
+MISSING_META_VALUE = '-666'
+
+def _read_many_meta(args):
+    '''
+    read_many worker that resolves the selected columns and the rows of one
+    gctx file and reads their meta data
+    '''
+    path, cid, rid, exact = args
+    gct = GCT(path)
+    gct._open_gctx(path)
+    try:
+        col_inds = gct.get_gctx_cid_inds(path, match_list=cid, exact=exact)
+        row_inds = gct.get_gctx_rid_inds(path, match_list=rid, exact=exact)
+        col_meta = [(node.name, gct._read_meta_node(node, col_inds).tolist())
+                    for node in gct.column_data]
+        row_meta = [(node.name, gct._read_meta_node(node, row_inds).tolist())
+                    for node in gct.row_data]
+        dtype = gct.matrix_node.dtype.str
+    finally:
+        gct._close_gctx()
+    return {'path':path, 'dtype':dtype, 'col_inds':list(col_inds), 
+            'row_inds':list(row_inds), 'col_meta':col_meta, 'row_meta':row_meta}
+
+#shared output matrix of the read_many worker processes
+_read_many_output = None
+
+def _init_read_many(shared,dtype,shape):
+    '''
+    read_many worker initializer that maps the shared output matrix
+    '''
+    global _read_many_output
+    _read_many_output = numpy.frombuffer(shared, dtype=dtype).reshape(shape)
+
+def _read_many_block(args,output=None):
+    '''
+    read_many worker that reads the selected data of one gctx file straight 
+    into its columns of the output matrix (by default the shared one)
+    '''
+    if output is None:
+        output = _read_many_output
+    path, row_inds, row_pos, col_inds, col_offset = args
+    handle = GCTXHandle(path)
+    try:
+        block = read_matrix_node(handle.matrix_node, row_inds, col_inds)
+    finally:
+        handle.close()
+    output[row_pos, col_offset:col_offset + len(col_inds)] = block
+    return path
+
+def _meta_table_rows(meta_list,ids,positions):
+    '''
+    merges the (header, values) meta data of several sources into a header
+    list and rows for the entries in ids.  positions gives, for each id, the
+    index of the source and of the entry in it that provides its meta data.
+    Fields missing from a source are set to MISSING_META_VALUE.
+    '''
+    headers = ['ind','id']
+    for meta in meta_list:
+        for header,values in meta:
+            if header not in headers:
+                headers.append(header)
+    fields = [dict(meta) for meta in meta_list]
+    rows = []
+    for ii,(entry_id,(source,pos)) in enumerate(zip(ids, positions)):
+        row = [ii, entry_id]
+        for header in headers[2:]:
+            if header in fields[source]:
+                row.append(fields[source][header][pos])
+            else:
+                row.append(MISSING_META_VALUE)
+        rows.append(row)
+    return headers, rows
+
+def read_many(paths,cid=None,rid=None,workers=None,join='inner',exact=False):
+    '''
+    reads many gctx files in a pool of worker processes and returns a GCT 
+    object whose matrix holds the selected columns of every file side by side,
+    with the rows aligned by rid.  cid and rid select columns and rows of each
+    file as in GCT.read.  With join='inner' only rows found in every file are
+    kept, with join='outer' all rows are kept and missing values are NaN.
+    The workers write into a shared memory matrix so the data is never 
+    pickled between processes.
+
+    example usage:
+    import cmap.io.gct as gct
+    GCTObject = gct.read_many(glob.glob('plates/*.gctx'), rid=landmarks,
+                              exact=True, workers=8)
+    print(GCTObject.matrix.shape)
+    '''
+    if join not in ('inner', 'outer'):
+        raise GCTException("join must be 'inner' or 'outer'")
+    if not workers:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(paths))
+    
+    #resolve the rows and columns of each file
+    tasks = [(path, cid, rid, exact) for path in paths]
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        try:
+            metas = pool.map(_read_many_meta, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        metas = map(_read_many_meta, tasks)
+    
+    #align the rows of all files by id
+    file_row_ids = [dict(meta['row_meta'])['id'] for meta in metas]
+    if join == 'inner':
+        common = set(file_row_ids[0]) if file_row_ids else set()
+        for ids in file_row_ids[1:]:
+            common.intersection_update(ids)
+        row_ids = [x for x in file_row_ids[0] if x in common] if file_row_ids else []
+    else:
+        row_ids = []
+        for ids in file_row_ids:
+            row_ids.extend(ids)
+        row_ids = [x for x,first in zip(row_ids, _first_occurrences(row_ids)) if first]
+    row_positions = dict((x,ii) for ii,x in enumerate(row_ids))
+    
+    #set up the shared output matrix
+    dtype = numpy.result_type(*[numpy.dtype(meta['dtype']) for meta in metas]) \
+            if metas else numpy.dtype(numpy.float32)
+    num_cols = sum(len(meta['col_inds']) for meta in metas)
+    shape = (len(row_ids), num_cols)
+    shared = multiprocessing.RawArray('b', max(1, shape[0] * shape[1] * dtype.itemsize))
+    matrix = numpy.frombuffer(shared, dtype=dtype, count=shape[0] * shape[1])
+    matrix = matrix.reshape(shape)
+    if join == 'outer':
+        matrix.fill(numpy.nan)
+    
+    #read the matrix data of each file into its columns
+    tasks = []
+    col_offset = 0
+    row_meta_source = {}
+    col_meta_source = []
+    col_ids = []
+    for ii,meta in enumerate(metas):
+        file_rows = [(ind, row_positions[x], pos) for pos,(ind,x) in 
+                     enumerate(zip(meta['row_inds'], file_row_ids[ii])) if x in row_positions]
+        for ind,row_pos,pos in file_rows:
+            row_meta_source.setdefault(row_ids[row_pos], (ii, pos))
+        for pos,x in enumerate(dict(meta['col_meta'])['id']):
+            col_meta_source.append((ii, pos))
+            col_ids.append(x)
+        tasks.append((meta['path'], [x[0] for x in file_rows], 
+                      [x[1] for x in file_rows], meta['col_inds'], col_offset))
+        col_offset += len(meta['col_inds'])
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=_init_read_many,
+                                    initargs=(shared, dtype, shape))
+        try:
+            pool.map(_read_many_block, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for task in tasks:
+            _read_many_block(task, matrix)
+    
+    #package the matrix and the merged meta data in a GCT object
+    gct = GCT()
+    gct.matrix = matrix
+    headers, rows = _meta_table_rows([meta['row_meta'] for meta in metas],
+                                     row_ids, [row_meta_source[x] for x in row_ids])
+    gct._add_table_to_meta_db('row', headers)
+    gct._add_rows_to_meta_table('row', rows)
+    headers, rows = _meta_table_rows([meta['col_meta'] for meta in metas],
+                                     col_ids, col_meta_source)
+    gct._add_table_to_meta_db('col', headers)
+    gct._add_rows_to_meta_table('col', rows)
+    return gct
+
+def _concat_block(args):
+    '''
+    concat_gctx worker that reads a block of columns of one gctx file and
+    places its rows at their positions in the output rows
+    '''
+    path, row_inds, row_pos, num_rows, col_inds, dtype = args
+    #open a private handle so that no file stays open in the pool of the
+    #calling process when blocks are read in process
+    handle = GCTXHandle(path)
+    try:
+        block = read_matrix_node(handle.matrix_node, row_inds, col_inds)
+    finally:
+        handle.close()
+    if row_pos is None:
+        return block.astype(dtype, copy=False)
+    output = numpy.empty((num_rows, len(col_inds)), dtype=dtype)
+    output.fill(numpy.nan)
+    output[row_pos] = block
+    return output
+
+def concat_gctx(paths,dest,cid=None,rid=None,join='inner',exact=False,
+                workers=None,chunkshape=None,layout='col',compression='zlib',
+                complevel=6,dtype=None,max_memory=2**28):
+    '''
+    concatenates the selected columns of many gctx files into the gctx file
+    dest without holding more than one block of columns of each worker in
+    memory.  Rows are aligned by rid as in read_many: with join='inner' only
+    rows found in every file are kept (in the order of the first file), with
+    join='outer' all rows are kept and missing values are NaN.  Row meta data
+    comes from the first file holding each row; the column meta data fields
+    of all files are merged, with fields missing from a file set to 
+    MISSING_META_VALUE.  Blocks are read and aligned in a pool of worker
+    processes while the previous blocks are written, and are sized so that
+    the blocks in flight take about max_memory bytes.  chunkshape, layout,
+    compression and complevel are passed on to GCTXWriter; dtype defaults
+    to the common dtype of the files.
+
+    example usage:
+    import cmap.io.gct as gct
+    gct.concat_gctx(glob.glob('plates/*.gctx'), 'combined.gctx', workers=4)
+    '''
+    if join not in ('inner', 'outer'):
+        raise GCTException("join must be 'inner' or 'outer'")
+    if not paths:
+        raise GCTException("no gctx files to concatenate")
+    if not workers:
+        workers = multiprocessing.cpu_count()
+    workers = max(1, min(workers, len(paths)))
+    
+    #resolve the rows and columns of each file, keeping only the row meta
+    #data of the files that provide rows of the output
+    tasks = [(path, cid, rid, exact) for path in paths]
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        metas = pool.imap(_read_many_meta, tasks) if pool else itertools.imap(_read_many_meta, tasks)
+        files = []
+        row_ids = []
+        row_source = {}
+        common = None
+        for ii,meta in enumerate(metas):
+            ids = dict(meta['row_meta'])['id']
+            if join == 'inner':
+                common = set(ids) if common is None else common.intersection(ids)
+            new_rows = []
+            if join == 'outer' or ii == 0:
+                for pos,x in enumerate(ids):
+                    if x not in row_source:
+                        row_source[x] = (ii, len(new_rows))
+                        new_rows.append(pos)
+                        row_ids.append(x)
+            row_meta = None
+            if new_rows:
+                row_meta = [(header, [values[x] for x in new_rows])
+                            for header,values in meta['row_meta']]
+            files.append({'path':meta['path'], 'dtype':numpy.dtype(meta['dtype']),
+                          'row_inds':meta['row_inds'], 'row_ids':ids,
+                          'col_inds':meta['col_inds'], 'col_meta':meta['col_meta'],
+                          'row_meta':row_meta})
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    if join == 'inner':
+        row_ids = [x for x in row_ids if x in common]
+    row_positions = dict((x,ii) for ii,x in enumerate(row_ids))
+    if dtype is None:
+        dtype = numpy.result_type(*[x['dtype'] for x in files])
+    dtype = numpy.dtype(dtype)
+    if join == 'outer' and dtype.kind != 'f':
+        dtype = numpy.result_type(dtype, numpy.float32)
+    
+    #merge the row meta data of the files providing the rows
+    headers = ['id']
+    for entry in files:
+        for header,values in entry['row_meta'] or []:
+            if header not in headers:
+                headers.append(header)
+    fields = [dict(x['row_meta']) if x['row_meta'] else {} for x in files]
+    row_meta = []
+    for header in headers:
+        values = []
+        for x in row_ids:
+            source, pos = row_source[x]
+            values.append(fields[source][header][pos] if header in fields[source]
+                          else MISSING_META_VALUE)
+        row_meta.append((header, values))
+    for entry in files:
+        entry['row_meta'] = None
+    
+    #set up the read of each block of columns of each file
+    width = max(1, max_memory // (3 * dtype.itemsize * max(len(row_ids), 1) * workers))
+    tasks = []
+    for entry in files:
+        file_rows = [(ind, row_positions[x]) for ind,x in 
+                     zip(entry['row_inds'], entry['row_ids']) if x in row_positions]
+        row_inds = [x[0] for x in file_rows]
+        row_pos = [x[1] for x in file_rows]
+        if row_pos == range(len(row_ids)):
+            row_pos = None
+        col_meta = entry['col_meta']
+        for start in range(0, len(entry['col_inds']), width):
+            stop = min(start + width, len(entry['col_inds']))
+            tasks.append(((entry['path'], row_inds, row_pos, len(row_ids),
+                           entry['col_inds'][start:stop], dtype),
+                          [(header, values[start:stop]) for header,values in col_meta]))
+    
+    #read blocks in the workers, at most two per worker in flight, while
+    #the main process writes them in order
+    writer = GCTXWriter(dest, row_meta, chunkshape=chunkshape, layout=layout,
+                        compression=compression, complevel=complevel, dtype=dtype)
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        pending = collections.deque()
+        for task,col_meta in tasks:
+            if pool is None:
+                writer.append(_concat_block(task), col_meta)
+                continue
+            pending.append((pool.apply_async(_concat_block, (task,)), col_meta))
+            if len(pending) >= 2 * workers:
+                result, block_meta = pending.popleft()
+                writer.append(result.get(), block_meta)
+        while pending:
+            result, block_meta = pending.popleft()
+            writer.append(result.get(), block_meta)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        writer.close()
+    return dest
+
+def make_gct(matrix,row_meta,col_meta,meta_backend='sqlite'):
+    '''
+    builds a GCT object from a rows x columns matrix and its row and column
+    meta data, each given as a dict or a list of (header, values) tuples that
+    includes an id field
+
+    example usage:
+    import cmap.io.gct as gct
+    GCTObject = gct.make_gct(numpy.zeros((2,3)), {'id':['r1','r2']},
+                             [('id',['c1','c2','c3']), ('pert_type',['trt_cp']*3)])
+    GCTObject.write_gctx('out.gctx')
+    '''
+    matrix = numpy.asarray(matrix)
+    gct = GCT(meta_backend=meta_backend)
+    gct.matrix = matrix
+    for table_name,meta,size in (('row', row_meta, matrix.shape[0]),
+                                 ('col', col_meta, matrix.shape[1])):
+        meta = _as_meta_list(meta)
+        meta = [('id', dict(meta)['id'])] + [x for x in meta if x[0] != 'id']
+        for header,values in meta:
+            if len(values) != size:
+                raise GCTException("%s meta data field %s has %d values, expected %d"
+                                   % (table_name, header, len(values), size))
+        gct._add_table_to_meta_db(table_name, ['ind'] + [x[0] for x in meta])
+        gct._add_rows_to_meta_table(table_name,
+                                    zip(range(size), *[x[1] for x in meta]))
+    return gct
+
+def _first_occurrences(values):
+    '''
+    returns a list flagging the first occurrence of each entry of values
+    '''
+    seen = set()
+    flags = []
+    for value in values:
+        flags.append(value not in seen)
+        seen.add(value)
+    return flags
+
 def parse_gct_dict(file_path):
     '''
     parses the .gct file at the given file path into a dictionary structure
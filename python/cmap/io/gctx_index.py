@@ -0,0 +1,167 @@
+'''
+Created on Oct 17, 2026
+provides id indexes for fast lookup of row and column ids in .gctx files
+'''
+import collections
+import contextlib
+import os
+import re
+import threading
+
+import numpy
+
+class IdIndex(object):
+    '''
+    index over the row or column ids of a gctx file.  The ids are read once
+    and kept in a sorted array so that exact and prefix lookups are binary
+    searches and substring lookups are a single scan over the joined ids.
+    All lookups return positions grouped in the order of the requested ids.
+
+    example usage:
+    index = IdIndex(column_id_node[:])
+    inds = index.exact(['CPC001_A375_6H:A01','CPC002_A375_6H:A02'])
+    '''
+    def __init__(self,ids,sorted_ids=None,order=None):
+        self.ids = numpy.char.rstrip(numpy.asarray(ids))
+        if order is None:
+            order = numpy.argsort(self.ids, kind='mergesort')
+            sorted_ids = self.ids[order]
+        self.order = order
+        self.sorted_ids = sorted_ids
+        self._blob = None
+        self._starts = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _as_ids(self,match_list):
+        '''
+        converts match_list to an array with the same string type as the index
+        '''
+        if isinstance(match_list, basestring):
+            match_list = [match_list]
+        return numpy.asarray(match_list).astype(self.ids.dtype.kind)
+
+    def _ranges_to_positions(self,lo,hi):
+        '''
+        expands the sorted id ranges [lo,hi) into file positions, keeping the
+        ranges in the given order and the positions within a range ascending
+        '''
+        positions = []
+        for start,stop in zip(lo,hi):
+            if stop > start:
+                positions.extend(numpy.sort(self.order[start:stop]).tolist())
+        return positions
+
+    def exact(self,match_list):
+        '''
+        returns the positions of the ids that exactly equal an entry of match_list
+        '''
+        match_array = self._as_ids(match_list)
+        lo = numpy.searchsorted(self.sorted_ids, match_array, 'left')
+        hi = numpy.searchsorted(self.sorted_ids, match_array, 'right')
+        return self._ranges_to_positions(lo, hi)
+
+    def prefix(self,match_list):
+        '''
+        returns the positions of the ids that start with an entry of match_list
+        '''
+        match_array = self._as_ids(match_list)
+        lo = numpy.searchsorted(self.sorted_ids, match_array, 'left')
+
+        #the end of each prefix range is the first id that sorts after every
+        #string beginning with the prefix
+        ends = numpy.array([m + '\xff' for m in match_array.tolist()])
+        hi = numpy.searchsorted(self.sorted_ids, ends.astype(self.ids.dtype.kind), 'left')
+        return self._ranges_to_positions(lo, hi)
+
+    def substring(self,match_list):
+        '''
+        returns the positions of the ids that contain an entry of match_list
+        '''
+        if self._blob is None:
+            #join all ids into a single newline separated string and record
+            #the offset at which each id starts
+            id_list = self.ids.tolist()
+            lengths = numpy.array([len(x) + 1 for x in id_list], dtype=numpy.int64)
+            self._starts = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1]))
+            self._blob = '\n'.join(id_list)
+
+        positions = []
+        for match in self._as_ids(match_list).tolist():
+            if not match:
+                positions.extend(range(len(self.ids)))
+                continue
+            if '\n' in match:
+                #would match across the separators of the joined ids
+                continue
+            offsets = numpy.fromiter((m.start() for m in
+                                      re.finditer(re.escape(match), self._blob)),
+                                     dtype=numpy.int64)
+            inds = numpy.searchsorted(self._starts, offsets, 'right') - 1
+            positions.extend(numpy.unique(inds).tolist())
+        return positions
+
+    def save(self,path):
+        '''
+        saves the index to the .npz file given in path
+        '''
+        with open(path, 'wb') as f:
+            numpy.savez(f, sorted_ids=self.sorted_ids, order=self.order)
+
+    @classmethod
+    def load(cls,path):
+        '''
+        loads an index saved with save
+        '''
+        with contextlib.closing(numpy.load(path)) as data:
+            sorted_ids = data['sorted_ids']
+            order = data['order']
+        ids = numpy.empty_like(sorted_ids)
+        ids[order] = sorted_ids
+        return cls(ids, sorted_ids=sorted_ids, order=order)
+
+def sidecar_path(src,axis):
+    '''
+    returns the path of the persisted index for the given axis ('row' or 'col')
+    of the gctx file in src
+    '''
+    return '%s.%s_ids.npz' % (src, axis)
+
+#in memory cache of indexes keyed by file, modification time and axis
+_index_cache = collections.OrderedDict()
+_index_cache_lock = threading.Lock()
+max_cached_indexes = 32
+
+def get_id_index(src,id_node,axis,persist=False):
+    '''
+    returns the IdIndex for the ids in id_node, the row or column ('row' or
+    'col' axis) id node of the gctx file src.  Indexes are cached in memory for
+    as long as the file is unchanged.  If persist is True the index is also
+    saved next to the gctx file and loaded from there by later processes.
+    '''
+    mtime = os.path.getmtime(src)
+    key = (os.path.abspath(src), mtime, axis)
+    with _index_cache_lock:
+        index = _index_cache.pop(key, None)
+        if index is not None:
+            _index_cache[key] = index
+            return index
+
+    #try the sidecar file before building the index from the id node
+    index = None
+    path = sidecar_path(src, axis)
+    if persist and os.path.exists(path) and os.path.getmtime(path) >= mtime:
+        index = IdIndex.load(path)
+        if len(index) != len(id_node):
+            index = None
+    if index is None:
+        index = IdIndex(id_node[:])
+        if persist:
+            index.save(path)
+
+    with _index_cache_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > max_cached_indexes:
+            _index_cache.popitem(last=False)
+    return index
@@ -0,0 +1,31 @@
+'''
+Created on Oct 17, 2026
+provides .gmx (gene set matrix) file io modules
+'''
+import csv
+
+def read_gmx(src):
+    '''
+    reads the gmx file in src, in which each column is a gene set: the first
+    line holds the set names, the second their descriptions and the remaining
+    lines the members.  Returns a list of (name, description, members) tuples
+    in file order.
+
+    example usage:
+    import cmap.io.gmx as gmx
+    for name, desc, members in gmx.read_gmx('epsilon_cal.gmx'):
+        print(name, members)
+    '''
+    with open(src, 'r') as f:
+        lines = [line.rstrip('\r\n') for line in f]
+    rows = list(csv.reader(lines, delimiter='\t'))
+    if len(rows) < 2:
+        return []
+    names = rows[0]
+    descriptions = rows[1] + [''] * (len(names) - len(rows[1]))
+    members = [[] for x in names]
+    for row in rows[2:]:
+        for ii,entry in enumerate(row[:len(names)]):
+            if entry:
+                members[ii].append(entry)
+    return zip(names, descriptions, members)
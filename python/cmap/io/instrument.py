@@ -0,0 +1,156 @@
+'''
+Created on Oct 17, 2026
+provides opt in stage timers and counters for the gct readers
+'''
+import threading
+import time
+
+class Instrument(object):
+    '''
+    collects the time spent in named stages of a read (e.g. 'open',
+    'id_resolution', 'meta_load', 'matrix_read', 'reorder') and named counters
+    (e.g. 'chunks', 'bytes_read', 'rows_inserted').  Hooks added with add_hook
+    are called as hook(kind, name, value) each time a stage finishes (kind
+    'stage', value in seconds) or a counter is incremented (kind 'counter'),
+    so the measurements can be forwarded to a metrics system as they happen.
+    Instruments are safe to share between threads.
+
+    example usage:
+    import cmap.io.gct as gct
+    import cmap.io.instrument as instrument
+    stats = instrument.Instrument()
+    GCTObject = gct.GCT('path_to_gctx_file', instrument=stats)
+    GCTObject.read(col_inds=range(100))
+    print(stats.report())
+    '''
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hooks = []
+        self.reset()
+
+    def __repr__(self):
+        return 'Instrument(stages=%r, counters=%r)' % (sorted(self.timers),
+                                                       sorted(self.counters))
+
+    def reset(self):
+        '''
+        clears all timers and counters
+        '''
+        with self._lock:
+            self.timers = {}
+            self.calls = {}
+            self.counters = {}
+
+    def add_hook(self,hook):
+        '''
+        adds a callable that is called as hook(kind, name, value) for every
+        finished stage and counter increment
+        '''
+        self.hooks.append(hook)
+
+    def remove_hook(self,hook):
+        '''
+        removes a hook added with add_hook
+        '''
+        self.hooks.remove(hook)
+
+    def stage(self,name):
+        '''
+        returns a context manager that adds the time spent inside it to the
+        timer of the named stage
+        '''
+        return _Stage(self, name)
+
+    def add_time(self,name,seconds):
+        '''
+        adds seconds to the timer of the named stage
+        '''
+        with self._lock:
+            self.timers[name] = self.timers.get(name, 0.0) + seconds
+            self.calls[name] = self.calls.get(name, 0) + 1
+        for hook in self.hooks:
+            hook('stage', name, seconds)
+
+    def count(self,name,value=1):
+        '''
+        adds value to the named counter
+        '''
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        for hook in self.hooks:
+            hook('counter', name, value)
+
+    def snapshot(self):
+        '''
+        returns a dictionary with copies of the stage timers, the number of
+        times each stage ran and the counters
+        '''
+        with self._lock:
+            return {'timers':dict(self.timers), 'calls':dict(self.calls),
+                    'counters':dict(self.counters)}
+
+    def report(self):
+        '''
+        returns the timers and counters formatted as a table
+        '''
+        data = self.snapshot()
+        lines = ['%-16s %10s %8s' % ('stage', 'seconds', 'calls')]
+        for name in sorted(data['timers']):
+            lines.append('%-16s %10.4f %8d' % (name, data['timers'][name],
+                                               data['calls'][name]))
+        lines.append('%-16s %19s' % ('counter', 'value'))
+        for name in sorted(data['counters']):
+            lines.append('%-16s %19d' % (name, data['counters'][name]))
+        return '\n'.join(lines)
+
+class _Stage(object):
+    '''
+    context manager timing one pass through a stage of an Instrument
+    '''
+    def __init__(self,instrument,name):
+        self.instrument = instrument
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.instrument.add_time(self.name, time.time() - self.start)
+
+class _NullStage(object):
+    '''
+    context manager that does nothing, shared by all stages of NullInstrument
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+class NullInstrument(object):
+    '''
+    instrument that records nothing.  It is used when instrumentation is
+    disabled, so that the readers pay one method call per stage and callers
+    can skip computing counter values by checking enabled.
+    '''
+    enabled = False
+    _stage = _NullStage()
+
+    def __repr__(self):
+        return 'NullInstrument()'
+
+    def stage(self,name):
+        return self._stage
+
+    def add_time(self,name,seconds):
+        pass
+
+    def count(self,name,value=1):
+        pass
+
+#shared instrument used by readers that are not instrumented
+NULL_INSTRUMENT = NullInstrument()
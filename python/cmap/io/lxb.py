@@ -0,0 +1,194 @@
+'''
+Created on Oct 17, 2026
+provides .lxb (FCS 3.0 list mode) file io modules
+'''
+import multiprocessing
+import os
+
+import numpy
+
+class LXBException(Exception):
+    '''
+    custom exception class for LXB object exceptions
+    '''
+    def __init__(self, message):
+        self.message = 'LXBException: ' + message
+    def __str__(self):
+        return repr(self.message)
+
+class LXB(object):
+    '''
+    reader for the bead level .lxb files produced by Luminex scanners.  LXB
+    files follow the FCS 3.0 standard; the TEXT segment keywords are parsed
+    into the text attribute and the DATA segment is decoded with a single
+    numpy.frombuffer call into one array per measurement parameter.  The two
+    main parameters are RID (the analyte/bead region id, 0 for unclassified
+    beads) and RP1 (the reporter intensity).
+
+    example usage:
+    import cmap.io.lxb as lxb
+    LXBObject = lxb.LXB('path_to_lxb_file')
+    LXBObject.read()
+    print(LXBObject['RID'], LXBObject['RP1'])
+    '''
+    def __init__(self,src=None):
+        self.src = src
+        self.version = ''
+        self.text = {}
+        self.params = []
+        self.data = {}
+
+    def __repr__(self):
+        return 'LXB(src=%r)' % (self.src,)
+
+    def __getitem__(self,param):
+        return self.data[param]
+
+    def _parse_text(self,segment):
+        '''
+        parses the delimited keyword/value pairs of a TEXT segment into a
+        dictionary.  Doubled delimiters inside keywords or values stand for a
+        literal delimiter.
+        '''
+        delimiter = segment[0]
+        escaped = delimiter + delimiter
+        placeholder = '\0'
+        tokens = segment[1:].replace(escaped, placeholder).split(delimiter)
+        tokens = [x.replace(placeholder, delimiter) for x in tokens]
+        if len(tokens) % 2:
+            tokens = tokens[:-1]
+        return dict((tokens[ii].upper(), tokens[ii+1])
+                    for ii in range(0, len(tokens), 2))
+
+    def _data_dtype(self):
+        '''
+        builds the structured numpy dtype of one event of the DATA segment
+        '''
+        byteorder = self.text.get('$BYTEORD', '1,2,3,4').replace(' ', '')
+        endian = '<' if byteorder in ('1,2,3,4', '1,2') else '>'
+        datatype = self.text.get('$DATATYPE', 'I').upper()
+        fields = []
+        for ii,name in enumerate(self.params):
+            bits = int(self.text['$P%dB' % (ii+1,)])
+            if datatype == 'I':
+                code = 'u%d' % (bits // 8,)
+            elif datatype == 'F':
+                code = 'f4'
+            elif datatype == 'D':
+                code = 'f8'
+            else:
+                raise LXBException("unsupported $DATATYPE %s" % (datatype,))
+            fields.append((name, endian + code))
+        return numpy.dtype(fields)
+
+    def read(self,src=None,params=None,mask_range=False):
+        '''
+        reads the lxb file in src.  If params is given only those parameters
+        (e.g. ['RID','RP1']) are kept in the data attribute.  If mask_range is
+        True integer values are masked to the bit range given by $PnR, as the
+        FCS standard suggests; by default the raw values are kept, matching 
+        the java and R readers.
+        '''
+        if not src:
+            src = self.src
+        self.src = src
+        with open(src, 'rb') as f:
+            contents = f.read()
+
+        #parse the HEADER segment: version followed by the byte offsets of
+        #the TEXT, DATA and ANALYSIS segments
+        self.version = contents[:6]
+        if not self.version.startswith('FCS'):
+            raise LXBException("%s is not an FCS file" % (src,))
+        try:
+            offsets = [int(contents[10+8*ii:18+8*ii]) for ii in range(4)]
+        except ValueError:
+            raise LXBException("%s has a malformed header" % (src,))
+        text_start, text_end, data_start, data_end = offsets
+
+        #parse the TEXT segment, which also holds the DATA offsets when they
+        #do not fit in the header
+        self.text = self._parse_text(contents[text_start:text_end+1])
+        if data_start == 0 and data_end == 0:
+            data_start = int(self.text['$BEGINDATA'])
+            data_end = int(self.text['$ENDDATA'])
+        if self.text.get('$MODE', 'L').upper() != 'L':
+            raise LXBException("only list mode FCS files are supported")
+        num_params = int(self.text['$PAR'])
+        num_events = int(self.text['$TOT'])
+        self.params = [self.text.get('$P%dN' % (ii+1,), 'P%d' % (ii+1,))
+                       for ii in range(num_params)]
+
+        #decode the DATA segment in one call
+        dtype = self._data_dtype()
+        if data_end - data_start + 1 < num_events * dtype.itemsize:
+            raise LXBException("%s has a truncated DATA segment" % (src,))
+        events = numpy.frombuffer(contents, dtype=dtype, count=num_events,
+                                  offset=data_start)
+
+        #keep the requested parameters
+        if params is None:
+            params = self.params
+        self.data = {}
+        for param in params:
+            if param not in self.params:
+                raise LXBException("%s has no parameter %s" % (src, param))
+            values = events[param]
+            if mask_range and values.dtype.kind == 'u':
+                value_range = int(self.text.get('$P%dR' % (self.params.index(param)+1,), 0))
+                if value_range and value_range & (value_range - 1) == 0 and \
+                        value_range < 2 ** (8 * values.dtype.itemsize):
+                    values = values & (value_range - 1)
+            self.data[param] = numpy.ascontiguousarray(values).astype(
+                                    values.dtype.newbyteorder('='))
+        return self
+
+def read_lxb(src,params=('RID','RP1')):
+    '''
+    reads the given parameters of the lxb file in src and returns them in a
+    dictionary of numpy arrays
+    '''
+    return LXB(src).read(params=params).data
+
+def _read_lxb_task(args):
+    '''
+    iter_lxb worker that reads one lxb file
+    '''
+    src, params = args
+    return src, read_lxb(src, params)
+
+def iter_lxb(paths,params=('RID','RP1'),workers=None):
+    '''
+    reads many lxb files (e.g. all wells of a plate), yielding (path, data)
+    tuples in the order of paths where data is the dictionary returned by
+    read_lxb.  If workers is greater than 1 the files are decoded in a pool
+    of that many processes while earlier results are consumed.
+
+    example usage:
+    import glob
+    import cmap.io.lxb as lxb
+    for path, data in lxb.iter_lxb(sorted(glob.glob('plate/*.lxb')), workers=4):
+        print(path, len(data['RID']))
+    '''
+    tasks = [(path, params) for path in paths]
+    if not workers or workers < 2:
+        for task in tasks:
+            yield _read_lxb_task(task)
+        return
+    pool = multiprocessing.Pool(workers)
+    try:
+        for result in pool.imap(_read_lxb_task, tasks, chunksize=4):
+            yield result
+    finally:
+        pool.close()
+        pool.join()
+
+def read_lxb_dir(path,params=('RID','RP1'),workers=None):
+    '''
+    reads all .lxb files in the directory path and returns a dictionary
+    mapping each file name (without extension) to its data dictionary
+    '''
+    paths = sorted(os.path.join(path, x) for x in os.listdir(path)
+                   if x.lower().endswith('.lxb'))
+    return dict((os.path.splitext(os.path.basename(src))[0], data)
+                for src,data in iter_lxb(paths, params, workers))
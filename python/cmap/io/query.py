@@ -0,0 +1,247 @@
+'''
+Created on Oct 17, 2026
+provides filter expressions over gct row and column meta data
+'''
+import abc
+import operator
+
+import numpy
+
+def _is_number(s):
+    '''
+    determine if s can be represented as a number
+    '''
+    try:
+        float(s)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def _to_numbers(values):
+    '''
+    converts an array of strings to floats, with NaN for non-numbers
+    '''
+    return numpy.array([float(x) if _is_number(x) else numpy.nan
+                        for x in values.tolist()], dtype=numpy.float64)
+
+def _harmonize(values,operand):
+    '''
+    converts values so it can be compared with operand: numerically if
+    operand is a number, as text otherwise
+    '''
+    if _is_number(operand):
+        if values.dtype.kind in ('S', 'U'):
+            values = _to_numbers(values)
+        return values, float(operand)
+    if values.dtype.kind not in ('S', 'U'):
+        values = values.astype(str)
+    return values, str(operand)
+
+class Expression(object):
+    '''
+    abstract base class of meta data filter expressions.  Expressions are 
+    combined with & (and), | (or) and ~ (not).
+    '''
+    __metaclass__ = abc.ABCMeta
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+    @abc.abstractmethod
+    def fields(self):
+        '''
+        returns the set of (axis, name) meta data fields used
+        '''
+
+    @abc.abstractmethod
+    def evaluate(self,values):
+        '''
+        returns the boolean mask of the expression given a dictionary mapping
+        each (axis, name) field to an array of its values
+        '''
+
+class Condition(Expression):
+    '''
+    a comparison of a single meta data field with an operand
+    '''
+    _operators = {'==':operator.eq, '!=':operator.ne, '<':operator.lt,
+                  '<=':operator.le, '>':operator.gt, '>=':operator.ge}
+
+    def __init__(self,field,op,operand):
+        self.field = field
+        self.op = op
+        self.operand = operand
+
+    def __repr__(self):
+        return '(%r %s %r)' % (self.field, self.op, self.operand)
+
+    def fields(self):
+        return set([(self.field.axis, self.field.name)])
+
+    def evaluate(self,values):
+        field_values = values[(self.field.axis, self.field.name)]
+        if self.op == 'in':
+            numeric = all(_is_number(x) for x in self.operand)
+            if numeric and field_values.dtype.kind in ('S', 'U'):
+                field_values = _to_numbers(field_values)
+            elif not numeric and field_values.dtype.kind not in ('S', 'U'):
+                field_values = field_values.astype(str)
+            operand = [float(x) if numeric else str(x) for x in self.operand]
+            return numpy.in1d(field_values, operand)
+        if self.op == 'between':
+            low, high = self.operand
+            return (Condition(self.field, '>=', low).evaluate(values) &
+                    Condition(self.field, '<=', high).evaluate(values))
+        if self.op == 'contains':
+            field_values = field_values.astype(str)
+            return numpy.char.find(field_values, str(self.operand)) >= 0
+        field_values, operand = _harmonize(field_values, self.operand)
+        return numpy.asarray(self._operators[self.op](field_values, operand),
+                             dtype=bool)
+
+class And(Expression):
+    '''
+    true where all of the given expressions are true
+    '''
+    def __init__(self,*expressions):
+        self.expressions = expressions
+
+    def __repr__(self):
+        return '(' + ' & '.join([repr(x) for x in self.expressions]) + ')'
+
+    def fields(self):
+        return set().union(*[x.fields() for x in self.expressions])
+
+    def evaluate(self,values):
+        mask = self.expressions[0].evaluate(values)
+        for expression in self.expressions[1:]:
+            mask = mask & expression.evaluate(values)
+        return mask
+
+class Or(And):
+    '''
+    true where any of the given expressions is true
+    '''
+    def __repr__(self):
+        return '(' + ' | '.join([repr(x) for x in self.expressions]) + ')'
+
+    def evaluate(self,values):
+        mask = self.expressions[0].evaluate(values)
+        for expression in self.expressions[1:]:
+            mask = mask | expression.evaluate(values)
+        return mask
+
+class Not(Expression):
+    '''
+    true where the given expression is false
+    '''
+    def __init__(self,expression):
+        self.expression = expression
+
+    def __repr__(self):
+        return '~%r' % (self.expression,)
+
+    def fields(self):
+        return self.expression.fields()
+
+    def evaluate(self,values):
+        return ~self.expression.evaluate(values)
+
+class Field(object):
+    '''
+    a named row or column meta data field used to build conditions
+
+    example usage:
+    from cmap.io.query import col, row
+    where = ((col('pert_type') == 'trt_cp') & col('pert_dose').between(5, 10)
+             & row('pr_gene_symbol').isin(['TP53','EGFR']))
+    '''
+    def __init__(self,axis,name):
+        if axis not in ('row', 'col'):
+            raise ValueError("axis must be 'row' or 'col'")
+        self.axis = axis
+        self.name = name
+
+    def __repr__(self):
+        return '%s(%r)' % (self.axis, self.name)
+
+    def __eq__(self, operand):
+        return Condition(self, '==', operand)
+
+    def __ne__(self, operand):
+        return Condition(self, '!=', operand)
+
+    def __lt__(self, operand):
+        return Condition(self, '<', operand)
+
+    def __le__(self, operand):
+        return Condition(self, '<=', operand)
+
+    def __gt__(self, operand):
+        return Condition(self, '>', operand)
+
+    def __ge__(self, operand):
+        return Condition(self, '>=', operand)
+
+    def isin(self,operands):
+        '''
+        true where the field equals any of the given operands
+        '''
+        return Condition(self, 'in', list(operands))
+
+    def between(self,low,high):
+        '''
+        true where low <= field <= high
+        '''
+        return Condition(self, 'between', (low, high))
+
+    def contains(self,substring):
+        '''
+        true where the field contains the given substring
+        '''
+        return Condition(self, 'contains', substring)
+
+def col(name):
+    '''
+    returns the column meta data Field with the given name
+    '''
+    return Field('col', name)
+
+def row(name):
+    '''
+    returns the row meta data Field with the given name
+    '''
+    return Field('row', name)
+
+def split_axes(expression):
+    '''
+    splits the expression into independent row and column filters, returning
+    a dictionary mapping 'row' and/or 'col' to an Expression.  The top level
+    of the expression must be a conjunction of terms that each only refer to
+    a single axis.
+    '''
+    by_axis = {}
+    for term in _conjunction_terms(expression):
+        axes = set(axis for axis,name in term.fields())
+        if len(axes) != 1:
+            raise ValueError("%r mixes row and column meta data" % (term,))
+        by_axis.setdefault(axes.pop(), []).append(term)
+    return dict((axis, terms[0] if len(terms) == 1 else And(*terms))
+                for axis,terms in by_axis.items())
+
+def _conjunction_terms(expression):
+    '''
+    flattens nested conjunctions into a list of terms
+    '''
+    if isinstance(expression, And) and not isinstance(expression, Or):
+        terms = []
+        for term in expression.expressions:
+            terms.extend(_conjunction_terms(term))
+        return terms
+    return [expression]
@@ -0,0 +1,68 @@
+'''
+Created on Oct 17, 2026
+provides small gct objects, files and temporary directories shared by the
+tests
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+import cmap.io.gct as gct
+
+def make(num_rows,num_cols,seed=0,row_prefix='',col_prefix='CPC',
+         meta_backend='sqlite'):
+    '''
+    builds a GCT object holding random values and a few meta data fields
+    '''
+    random = numpy.random.RandomState(seed)
+    matrix = random.randn(num_rows, num_cols).astype(numpy.float32)
+    row_meta = [('id', ['%s%d_at' % (row_prefix, 200000 + ii) for ii in range(num_rows)]),
+                ('pr_gene_symbol', ['G%d' % (ii,) for ii in range(num_rows)])]
+    col_meta = [('id', ['%s%03d:A%02d' % (col_prefix, ii, ii % 24) for ii in range(num_cols)]),
+                ('pert_type', ['trt_cp' if ii % 3 else 'ctl_vehicle' for ii in range(num_cols)]),
+                ('pert_dose', ['%d' % (ii % 5,) for ii in range(num_cols)])]
+    return gct.make_gct(matrix, row_meta, col_meta, meta_backend=meta_backend)
+
+def write_text(path,lines):
+    '''
+    writes the given lines to the text file at path
+    '''
+    with open(path, 'w') as f:
+        f.write(''.join(x + '\n' for x in lines))
+    return path
+
+def read(path,**kwargs):
+    '''
+    returns a GCT object holding the contents of path
+    '''
+    meta_backend = kwargs.pop('meta_backend', 'sqlite')
+    GCTObject = gct.GCT(path, meta_backend=meta_backend)
+    GCTObject.read(verbose=False, **kwargs)
+    return GCTObject
+
+class TempDirTestCase(unittest.TestCase):
+    '''
+    test case that runs each test in a fresh temporary directory and leaves
+    no pooled handles or cached chunks behind
+    '''
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        gct.handle_pool.clear()
+        gct.chunk_cache.clear()
+        shutil.rmtree(self.dir)
+
+    def path(self,name):
+        return os.path.join(self.dir, name)
+
+    def assertSameMeta(self,expected,actual):
+        self.assertEqual(actual.get_rids(), expected.get_rids())
+        self.assertEqual(actual.get_cids(), expected.get_cids())
+        for cid in expected.get_cids():
+            self.assertEqual(actual.get_sample_meta(cid), expected.get_sample_meta(cid))
+        for rid in expected.get_rids():
+            self.assertEqual(actual.get_probe_meta(rid), expected.get_probe_meta(rid))
@@ -0,0 +1,83 @@
+'''
+Created on Oct 17, 2026
+tests that the columnar meta data backend answers queries the same way as
+the sqlite backend
+'''
+import unittest
+
+import numpy
+
+import cmap.io.columnar_meta as columnar_meta
+import cmap.io.query as query
+
+import fixtures
+
+class TestMetaField(unittest.TestCase):
+    def test_kinds(self):
+        self.assertEqual(columnar_meta.MetaField(['1', '2', '-3']).kind, 'int')
+        self.assertEqual(columnar_meta.MetaField(['0.5', '2.25']).kind, 'float')
+        self.assertEqual(columnar_meta.MetaField(['007', '1']).kind, 'string')
+        self.assertEqual(columnar_meta.MetaField(['a', 'b', 'a', 'a']).kind, 'category')
+        self.assertEqual(columnar_meta.MetaField(['1', '2'], numeric=False).kind, 'string')
+        field = columnar_meta.MetaField(['007', '1'])
+        self.assertEqual(field.text(), ['007', '1'])
+        self.assertEqual(field.numbers().tolist(), [7.0, 1.0])
+
+class TestParity(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        fixtures.make(12, 15).write_gctx(self.path('a.gctx'))
+        self.sqlite = fixtures.read(self.path('a.gctx'))
+        self.columnar = fixtures.read(self.path('a.gctx'), meta_backend='columnar')
+
+    def test_ids_and_headers(self):
+        self.assertSameMeta(self.sqlite, self.columnar)
+        self.assertEqual(self.columnar.get_chd(), self.sqlite.get_chd())
+        self.assertEqual(self.columnar.get_rhd(), self.sqlite.get_rhd())
+        for header in self.sqlite.get_chd():
+            self.assertEqual(self.columnar.get_column_meta(header),
+                             self.sqlite.get_column_meta(header))
+        self.assertEqual(self.columnar.get_meta_fields('row'),
+                         self.sqlite.get_meta_fields('row'))
+
+    def test_meta_many(self):
+        cids = self.sqlite.get_cids()[::-2] + self.sqlite.get_cids()[:1]
+        expected = self.sqlite.get_sample_meta_many(cids)
+        actual = self.columnar.get_sample_meta_many(cids)
+        self.assertEqual(sorted(actual.keys()), sorted(expected.keys()))
+        for header in expected:
+            self.assertEqual(actual[header].tolist(), expected[header].tolist())
+        rids = self.sqlite.get_rids()[3:6]
+        fields = ['pr_gene_symbol', 'id']
+        for as_records in (False, True):
+            expected = self.sqlite.get_probe_meta_many(rids, fields, as_records)
+            actual = self.columnar.get_probe_meta_many(rids, fields, as_records)
+            for header in fields:
+                self.assertEqual(actual[header].tolist(), expected[header].tolist())
+        for backend in (self.sqlite, self.columnar):
+            self.assertRaises(KeyError, backend.get_sample_meta_many, ['missing'])
+            self.assertRaises(KeyError, backend.get_probe_meta, 'missing')
+
+    def test_inds_by_desc(self):
+        queries = [('pert_type', 'trt_cp', '='), ('pert_type', 'ctl_vehicle', '!='),
+                   ('pert_dose', '2', '>='), ('pert_dose', '3', '<'),
+                   ('id', 'CPC00%', 'LIKE'), ('id', 'cpc01_:a%', 'like')]
+        for column,desc,op in queries:
+            expected = self.sqlite.get_inds_by_cdesc(column, desc, op)
+            self.assertTrue(expected)
+            self.assertEqual(sorted(self.columnar.get_inds_by_cdesc(column, desc, op)),
+                             sorted(expected))
+        self.assertEqual(self.columnar.get_inds_by_rdesc('pr_gene_symbol', 'G3'),
+                         self.sqlite.get_inds_by_rdesc('pr_gene_symbol', 'G3'))
+
+    def test_where(self):
+        where = ((query.col('pert_type') == 'trt_cp') & 
+                 query.row('pr_gene_symbol').isin(['G1', 'G4', 'G7']))
+        expected = fixtures.read(self.path('a.gctx'), where=where)
+        actual = fixtures.read(self.path('a.gctx'), where=where, meta_backend='columnar')
+        self.assertEqual(actual.matrix.shape, (3, 10))
+        numpy.testing.assert_array_equal(actual.matrix, expected.matrix)
+        self.assertSameMeta(expected, actual)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+'''
+Created on Oct 17, 2026
+tests the command line converter between .gct and .gctx files
+'''
+import gzip
+import shutil
+
+import numpy
+import tables
+
+import cmap.io.convert as convert
+
+import fixtures
+
+class TestConvert(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        self.source = fixtures.make(23, 17)
+        self.source.write_gct(self.path('a.gct'), precision=6)
+
+    def test_round_trip(self):
+        self.assertEqual(convert.main([self.path('a.gct'), '--chunkshape', '4,3',
+                                       '--compression', 'none']), 0)
+        with tables.openFile(self.path('a.gctx')) as f:
+            self.assertEqual(f.getNode('/0/DATA/0/matrix').chunkshape, (3, 4))
+        result = fixtures.read(self.path('a.gctx'))
+        numpy.testing.assert_allclose(result.matrix, self.source.matrix, atol=1e-6)
+        self.assertSameMeta(self.source, result)
+
+        for version in ('1.2', '1.3'):
+            self.assertEqual(convert.main(['--reverse', '--precision', '6', 
+                                           '--gct-version', version,
+                                           self.path('a.gctx'), self.path('b.gct')]), 0)
+            result = fixtures.read(self.path('b.gct'))
+            self.assertEqual(result.version, '#' + version)
+            numpy.testing.assert_allclose(result.matrix, self.source.matrix, atol=1e-6)
+            self.assertEqual(result.get_rids(), self.source.get_rids())
+            self.assertEqual(result.get_cids(), self.source.get_cids())
+        self.assertSameMeta(self.source, result)
+
+    def test_gzip(self):
+        with open(self.path('a.gct'), 'rb') as f:
+            with gzip.open(self.path('z.gct.gz'), 'wb') as out:
+                shutil.copyfileobj(f, out)
+        self.assertEqual(convert.convert(self.path('z.gct.gz')), self.path('z.gctx'))
+        result = fixtures.read(self.path('z.gctx'))
+        numpy.testing.assert_allclose(result.matrix, self.source.matrix, atol=1e-6)
+        self.assertEqual(convert.convert(self.path('z.gctx'), self.path('c.gct.gz'),
+                                         reverse=True, precision=6), self.path('c.gct.gz'))
+        #column meta data rows come back in the order of the gctx nodes, the
+        #data rows are unchanged
+        with gzip.open(self.path('c.gct.gz')) as f:
+            lines = f.read().splitlines()
+        with open(self.path('a.gct')) as f:
+            expected = f.read().splitlines()
+        self.assertEqual(lines[:3], expected[:3])
+        self.assertEqual(sorted(lines[3:5]), sorted(expected[3:5]))
+        self.assertEqual(lines[5:], expected[5:])
+
+    def test_errors(self):
+        self.assertEqual(convert.main([self.path('missing.gct')]), 1)
+        fixtures.write_text(self.path('a.txt'), ['not a gct file'])
+        self.assertEqual(convert.main(['--reverse', self.path('a.txt'),
+                                       self.path('b.gct')]), 1)
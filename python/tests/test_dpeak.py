@@ -0,0 +1,88 @@
+'''
+Created on Oct 17, 2026
+tests peak deconvolution of bead level data
+'''
+import os
+import shutil
+import unittest
+
+import numpy
+
+import cmap.analytics.dpeak as dpeak
+
+import fixtures
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data')
+
+def beads(analyte,log_values):
+    '''
+    returns the rid and rp1 arrays of beads of one analyte with the given
+    (analyte, count) log2 intensities
+    '''
+    rp1 = numpy.concatenate([numpy.repeat(2 ** value, count) for value,count in log_values])
+    return numpy.repeat(analyte, len(rp1)), rp1
+
+class TestDetectPeaks(unittest.TestCase):
+    def setUp(self):
+        #analyte 20 has three levels of 50, 20 and 30 beads, analyte 21 has
+        #too few beads to fit, analyte 5 is not a duo, 22 has no good beads
+        #and 23 no beads at all
+        parts = [beads(20, [(6, 50), (9, 20), (12, 30)]), beads(21, [(7, 4), (10, 3)]),
+                 beads(5, [(8, 15), (11, 10)]), beads(22, [(2, 12), (16, 3)])]
+        self.rid = numpy.concatenate([x[0] for x in parts])
+        self.rp1 = numpy.concatenate([x[1] for x in parts])
+        self.analytes = [5, 20, 21, 22, 23]
+
+    def detect(self,pkmethod):
+        return dpeak.detect_peaks(self.rid, self.rp1, analytes=self.analytes,
+                                  pkmethod=pkmethod)
+
+    def test_kmeans_opt(self):
+        pkstats = self.detect('kmeans_opt')
+        #three peaks give supports of 50% and 30%, closer to 65/35 than the
+        #50/50 split of two peaks
+        self.assertEqual(pkstats['npeak'].tolist(), [1, 3, 1, 1, 1])
+        self.assertEqual(pkstats['pksupport'][1].tolist(), [50, 30])
+        self.assertEqual(pkstats['pkexp'][1].tolist(), [64, 4096])
+        self.assertEqual(pkstats['pksupport_pct'][1].tolist(), [50.0, 30.0])
+        self.assertEqual(pkstats['method'].tolist(),
+                         ['median', 'kmeans_opt', 'median', 'median', 'missing'])
+
+    def test_kmeans(self):
+        pkstats = self.detect('kmeans')
+        self.assertEqual(pkstats['npeak'].tolist(), [1, 2, 1, 1, 1])
+        self.assertEqual(pkstats['pksupport'][1].tolist(), [50, 50])
+        self.assertEqual(pkstats['pkexp'][1].tolist(), [64, 4096])
+        self.assertTrue((pkstats['pkheight'][1] > 0).all())
+
+    def test_median_and_missing(self):
+        for pkmethod in ('kmeans_opt', 'kmeans', 'median'):
+            pkstats = self.detect(pkmethod)
+            self.assertEqual(pkstats['pkexp'][[0, 2, 3, 4], 0].tolist(), [256, 128, 2, 2])
+            self.assertTrue(numpy.isnan(pkstats['pkexp'][[0, 2, 3, 4], 1]).all())
+            self.assertEqual(pkstats['totbead'].tolist(), [25, 100, 7, 15, 0])
+            self.assertEqual(pkstats['ngoodbead'].tolist(), [25, 100, 7, 0, 0])
+            self.assertEqual(pkstats['medexp'][3:].tolist(), [1.0, 1.0])
+            self.assertEqual(pkstats['pksupport_pct'][:, 0].tolist()[2:], [100.0, 100.0, 0.0])
+        self.assertEqual(self.detect('median')['pkexp'][1, 0], round(2 ** 7.5))
+        self.assertRaises(ValueError, self.detect, 'gmm')
+
+class TestDpeakPlate(fixtures.TempDirTestCase):
+    def test_plate(self):
+        paths = []
+        for well in ('A01', 'A02'):
+            paths.append(self.path(well + '.lxb'))
+            shutil.copy(os.path.join(DATA, 'A10.lxb'), paths[-1])
+        GCTObject = dpeak.dpeak_plate(paths, workers=1)
+        row_meta = dpeak.gex_row_meta()
+        self.assertEqual(GCTObject.get_cids(), ['A01', 'A02'])
+        self.assertEqual(GCTObject.get_rids(), row_meta[0][1])
+        self.assertEqual(GCTObject.matrix.shape, (988, 2))
+        pkstats = dpeak.dpeak(paths[0])
+        numpy.testing.assert_array_equal(GCTObject.matrix[:, 1],
+                                         dpeak.gex_values(pkstats))
+        self.assertEqual(GCTObject.get_column_meta('totbead'),
+                         [str(pkstats['totbead'].sum())] * 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,410 @@
+'''
+Created on Oct 17, 2026
+tests of the gct and gctx readers and writers in cmap.io.gct
+
+run from the python directory with:
+python -m unittest discover -s tests
+'''
+import os
+import threading
+import unittest
+
+import numpy
+import tables
+
+import cmap.io.gct as gct
+import cmap.io.instrument as instrument
+
+import fixtures
+
+GCT_LINES = ['#1.3', '3\t2\t1\t1',
+             'id\tpr_gene_symbol\tS1\tS2',
+             'pert_type\tna\ttrt_cp\tctl_vehicle',
+             'P1\tG1\t1.5\t-2',
+             'P2\tG2\tNA\t3e2',
+             'P3\tG3\t0\t4.25']
+
+class TestReadGCT(fixtures.TempDirTestCase):
+    def test_read(self):
+        path = fixtures.write_text(self.path('a.gct'), GCT_LINES)
+        for chunk_size in (1, 2, 10000):
+            result = fixtures.read(path, dtype=numpy.float32, chunk_size=chunk_size)
+            self.assertEqual(result.matrix.dtype, numpy.float32)
+            numpy.testing.assert_array_equal(result.matrix,
+                    numpy.array([[1.5, -2], [numpy.nan, 300], [0, 4.25]], dtype=numpy.float32))
+            self.assertEqual(result.get_rids(), ['P1', 'P2', 'P3'])
+            self.assertEqual(result.get_cids(), ['S1', 'S2'])
+            self.assertEqual(result.get_sample_meta('S2')['pert_type'], 'ctl_vehicle')
+            self.assertEqual(result.get_probe_meta('P3')['pr_gene_symbol'], 'G3')
+
+    def test_parse_block(self):
+        values = gct._parse_gct_block(['1\t2\t3', '4\t5\t6'], 3, numpy.float64)
+        numpy.testing.assert_array_equal(values, [[1, 2, 3], [4, 5, 6]])
+        values = gct._parse_gct_block(['1\tNaN\t3', '4\t-\t6'], 3, numpy.float64)
+        self.assertTrue(numpy.isnan(values[1, 1]))
+
+    def test_parse_block_uneven_rows(self):
+        #a short row followed by a long one holds the right number of values
+        self.assertRaises(gct.GCTException, gct._parse_gct_block,
+                          ['1\t2', '3\t4\t5\t6'], 3, numpy.float64)
+
+class TestSession(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        self.source = fixtures.make(12, 9)
+        self.source.write_gctx(self.path('a.gctx'), chunkshape=(12, 2))
+
+    def test_repeated_reads(self):
+        for meta_backend in ('sqlite', 'columnar'):
+            with gct.GCT(self.path('a.gctx'), meta_backend=meta_backend) as GCTObject:
+                GCTObject.read(verbose=False, col_inds=[0, 1])
+                GCTObject.read(verbose=False, col_inds=[5], rid=['200003_at'])
+                self.assertEqual(GCTObject.get_cids(), ['CPC005:A05'])
+                self.assertEqual(GCTObject.get_rids(), ['200003_at'])
+                numpy.testing.assert_array_equal(GCTObject.matrix, self.source.matrix[[3]][:,[5]])
+                self.assertTrue(GCTObject._gctx_handle.file.isopen)
+            self.assertTrue(GCTObject._gctx_handle is None)
+
+    def test_pooled(self):
+        for ii in range(3):
+            GCTObject = gct.GCT(self.path('a.gctx'), pooled=True)
+            GCTObject.read(verbose=False, col_inds=[ii])
+            numpy.testing.assert_array_equal(GCTObject.matrix, self.source.matrix[:,[ii]])
+        self.assertEqual(len(gct.handle_pool), 1)
+
+class TestHandlePool(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        self.source = fixtures.make(40, 30)
+        self.source.write_gctx(self.path('a.gctx'), chunkshape=(40, 4))
+
+    def test_handles_per_thread(self):
+        pool = gct.GCTXHandlePool()
+        handle = pool.acquire(self.path('a.gctx'))
+        self.assertTrue(pool.acquire(self.path('a.gctx')) is handle)
+        other = []
+        thread = threading.Thread(target=lambda: other.append(pool.acquire(self.path('a.gctx'))))
+        thread.start()
+        thread.join()
+        self.assertFalse(other[0] is handle)
+        for x in (handle, handle, other[0]):
+            pool.release(x)
+        self.assertEqual(len(pool), 2)
+        pool.clear()
+        self.assertEqual(len(pool), 0)
+
+    def test_pooled_reads_while_prefetching(self):
+        GCTObject = gct.GCT(self.path('a.gctx'), pooled=True)
+        blocks = []
+        for ids,block in GCTObject.iter_column_blocks(block_size=4, prefetch=2):
+            reader = gct.GCT(self.path('a.gctx'), pooled=True)
+            reader.read_gctx_matrix(col_inds=[29, 0])
+            numpy.testing.assert_array_equal(reader.matrix, self.source.matrix[:,[29, 0]])
+            blocks.append(block)
+        numpy.testing.assert_array_equal(numpy.hstack(blocks), self.source.matrix)
+
+class _SliceRecorder(object):
+    '''
+    one dimensional node stand in that records the slices read from it
+    '''
+    chunkshape = None
+
+    def __init__(self,values):
+        self.values = numpy.asarray(values)
+        self.slices = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self,key):
+        self.slices.append((key.start, key.stop))
+        return self.values[key]
+
+class TestOrderedReads(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        self.source = fixtures.make(37, 29)
+
+    def test_out_of_order_and_duplicates(self):
+        row_inds = [36, 0, 5, 5, 17, 1, 36]
+        col_inds = [28, 3, 3, 0, 14, 2, 27, 28]
+        expected = self.source.matrix[row_inds][:,col_inds]
+        for chunkshape in ((37, 1), (4, 3), (1, 29)):
+            self.source.write_gctx(self.path('a.gctx'), chunkshape=chunkshape)
+            for max_block_size in (2**22, 10):
+                GCTObject = gct.GCT(self.path('a.gctx'))
+                GCTObject.max_block_size = max_block_size
+                GCTObject.read(verbose=False, row_inds=row_inds, col_inds=col_inds)
+                numpy.testing.assert_array_equal(GCTObject.matrix, expected)
+                cids = self.source.get_cids()
+                self.assertEqual(GCTObject.get_cids(), [cids[x] for x in col_inds])
+                self.assertEqual(GCTObject.get_sample_meta(cids[3])['pert_type'], 'ctl_vehicle')
+
+    def test_sparse_meta_read(self):
+        node = _SliceRecorder(['id%d ' % (ii,) for ii in range(100000)])
+        values = gct.GCT()._read_meta_node(node, [99999, 0, 99999, 1])
+        self.assertEqual(values.tolist(), ['id99999', 'id0', 'id99999', 'id1'])
+        self.assertEqual(node.slices, [(0, 2), (99999, 100000)])
+
+    def test_read_error_releases_handle(self):
+        self.source.write_gctx(self.path('a.gctx'))
+        GCTObject = gct.GCT(self.path('a.gctx'), pooled=True)
+        self.assertRaises(IndexError, GCTObject.read_gctx_matrix, col_inds=[0, 29])
+        self.assertEqual([x.users for x in gct.handle_pool._handles.values()], [0])
+        self.assertEqual(GCTObject._gctx_refs, 0)
+
+class TestChunkCache(fixtures.TempDirTestCase):
+    def test_lru(self):
+        cache = gct.ChunkCache(max_bytes=3 * 80)
+        src = self.path('a.gctx')
+        chunks = [numpy.zeros(10) + ii for ii in range(4)]
+        for ii in range(3):
+            cache.put((src, ii), chunks[ii])
+        self.assertTrue(cache.get((src, 0)) is chunks[0])
+        self.assertFalse(chunks[0].flags.writeable)
+        cache.put((src, 3), chunks[3])
+        #chunk 1 is the least recently used once chunk 0 has been read
+        self.assertEqual(cache.get((src, 1)), None)
+        self.assertEqual([cache.get((src, ii)) is not None for ii in (0, 2, 3)],
+                         [True, True, True])
+        cache.put((src, 4), numpy.zeros(31))
+        self.assertEqual(len(cache), 3)
+        cache.resize(max_chunks=1)
+        self.assertEqual(cache.stats(), {'hits':4, 'misses':1, 'evictions':3,
+                                         'hit_rate':0.8, 'chunks':1, 'nbytes':80,
+                                         'max_bytes':240})
+        cache.invalidate(src)
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+        cache.clear()
+        self.assertEqual(cache.stats()['hits'], 0)
+
+    def test_cached_reads(self):
+        source = fixtures.make(20, 30)
+        source.write_gctx(self.path('a.gctx'), chunkshape=(5, 4))
+        col_inds = [9, 2, 3, 17]
+        expected = source.matrix[:, col_inds]
+        for ii in range(2):
+            GCTObject = gct.GCT(self.path('a.gctx'), cached=True)
+            GCTObject.read_gctx_matrix(col_inds=col_inds)
+            numpy.testing.assert_array_equal(GCTObject.matrix, expected)
+        #columns 2 to 17 of a 20 row file touch 3 column chunks of 4 row chunks
+        stats = gct.chunk_cache.stats()
+        self.assertEqual((stats['misses'], stats['hits'], stats['chunks']), (12, 12, 12))
+
+        #a rewritten file is read again rather than served from the cache
+        fixtures.make(20, 30, seed=1).write_gctx(self.path('a.gctx'), chunkshape=(5, 4))
+        os.utime(self.path('a.gctx'), (1, 1))
+        GCTObject = gct.GCT(self.path('a.gctx'), cached=True)
+        GCTObject.read_gctx_matrix(col_inds=col_inds)
+        numpy.testing.assert_array_equal(GCTObject.matrix,
+                                         fixtures.make(20, 30, seed=1).matrix[:, col_inds])
+        self.assertEqual(gct.chunk_cache.stats()['misses'], 24)
+
+class TestWriteGCTX(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        self.source = fixtures.make(23, 17)
+
+    def node_kinds(self,path):
+        with tables.openFile(path) as f:
+            return dict((x.name, x.dtype.kind) for x in f.listNodes('/0/META/COL'))
+
+    def test_round_trip(self):
+        for layout,compression in (('col', 'zlib'), ('row', None)):
+            self.source.write_gctx(self.path('a.gctx'), layout=layout,
+                                   compression=compression)
+            result = fixtures.read(self.path('a.gctx'))
+            numpy.testing.assert_array_equal(result.matrix, self.source.matrix)
+            self.assertSameMeta(self.source, result)
+        self.source.write_gctx(self.path('a.gctx'), chunkshape=(5, 4))
+        result = fixtures.read(self.path('a.gctx'))
+        numpy.testing.assert_array_equal(result.matrix, self.source.matrix)
+        self.assertEqual(os.listdir(self.dir), ['a.gctx'])
+
+    def test_meta_text(self):
+        source = gct.make_gct(numpy.zeros((2, 4)), {'id':['r1', 'r2']},
+                              [('id', ['c1', 'c2', 'c3', 'c4']),
+                               ('plate', ['007', '010', '1', '2']),
+                               ('dose', ['1e3', '10', '0.5', '2']),
+                               ('well', ['01', '02', '03', '04']),
+                               ('count', ['3', '-4', '10', '0']),
+                               ('pert_dose', ['0.5', '1.0', '10.0', '-2.5'])])
+        source.write_gctx(self.path('a.gctx'))
+        result = fixtures.read(self.path('a.gctx'))
+        self.assertSameMeta(source, result)
+        self.assertEqual(self.node_kinds(self.path('a.gctx')),
+                         {'id':'S', 'plate':'S', 'dose':'S', 'well':'S', 
+                          'count':'i', 'pert_dose':'f'})
+
+    def test_writer_blocks(self):
+        writer = gct.GCTXWriter(self.path('a.gctx'), [('id', ['r1', 'r2'])],
+                                chunkshape=(2, 2))
+        writer.append(numpy.ones((2, 3)), [('id', ['c1', 'c2', 'c3']),
+                                           ('dose', numpy.array([1, 2, 3])),
+                                           ('score', numpy.array([0.1 + 0.2, 1e-300, -1.5])),
+                                           ('plate', ['1', '2', '3'])])
+        writer.append(numpy.zeros((2, 0)), [('id', [])])
+        writer.append(numpy.zeros((2, 2)), [('id', ['c4', 'c5']),
+                                            ('dose', numpy.array([0.5, 4])),
+                                            ('score', numpy.array([2.5, 1.0 / 3])),
+                                            ('plate', ['04', '5']),
+                                            ('cell_id', ['MCF7', 'PC3'])])
+        writer.close()
+        self.assertEqual(os.listdir(self.dir), ['a.gctx'])
+        result = fixtures.read(self.path('a.gctx'))
+        numpy.testing.assert_array_equal(result.matrix, [[1, 1, 1, 0, 0]] * 2)
+        self.assertEqual(result.get_cids(), ['c1', 'c2', 'c3', 'c4', 'c5'])
+        self.assertEqual([result.get_sample_meta(x)['dose'] for x in result.get_cids()],
+                         ['1.0', '2.0', '3.0', '0.5', '4.0'])
+        self.assertEqual([result.get_sample_meta(x)['plate'] for x in result.get_cids()],
+                         ['1', '2', '3', '04', '5'])
+        self.assertEqual([result.get_sample_meta(x)['cell_id'] for x in result.get_cids()],
+                         [gct.MISSING_META_VALUE] * 3 + ['MCF7', 'PC3'])
+        self.assertEqual(self.node_kinds(self.path('a.gctx')),
+                         {'id':'S', 'dose':'f', 'score':'f', 'plate':'S', 'cell_id':'S'})
+        with tables.openFile(self.path('a.gctx')) as f:
+            self.assertEqual(f.getNode('/0/META/COL/score')[:].tolist(),
+                             [0.1 + 0.2, 1e-300, -1.5, 2.5, 1.0 / 3])
+
+    def test_writer_empty(self):
+        gct.GCTXWriter(self.path('a.gctx'), [('id', ['r1'])]).close()
+        with tables.openFile(self.path('a.gctx')) as f:
+            self.assertEqual(f.getNode('/0/DATA/0/matrix').shape, (0, 1))
+            self.assertEqual(len(f.getNode('/0/META/COL/id')), 0)
+
+class TestSiblings(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        self.source = fixtures.make(23, 17)
+        self.source.write_gctx(self.path('a.gctx'), chunkshape=(23, 1))
+
+    def test_rechunk(self):
+        #a tiny memory budget makes every block narrower than the source
+        #chunks, which are then copied through a spill file
+        for max_memory in (1, 2**20):
+            gct.rechunk_gctx(self.path('a.gctx'), self.path('t.gctx'), transpose=True,
+                             chunkshape=(17, 4), max_memory=max_memory)
+            gct.rechunk_gctx(self.path('t.gctx'), self.path('r.gctx'), transpose=True,
+                             chunkshape=(1, 5), max_memory=max_memory)
+            transposed = fixtures.read(self.path('t.gctx'))
+            numpy.testing.assert_array_equal(transposed.matrix, self.source.matrix.T)
+            self.assertEqual(transposed.get_cids(), self.source.get_rids())
+            self.assertEqual(transposed.get_probe_meta(self.source.get_cids()[3])['pert_type'],
+                             'ctl_vehicle')
+            result = fixtures.read(self.path('r.gctx'))
+            numpy.testing.assert_array_equal(result.matrix, self.source.matrix)
+            self.assertSameMeta(self.source, result)
+            self.assertEqual(sorted(os.listdir(self.dir)), ['a.gctx', 'r.gctx', 't.gctx'])
+
+    def test_transposed_sibling(self):
+        direct = fixtures.read(self.path('a.gctx'), row_inds=[7, 2, 7])
+        path = gct.write_sibling(self.path('a.gctx'), transpose=True, chunkshape=(17, 4))
+        self.assertEqual(gct.find_siblings(self.path('a.gctx'))[0][:2], (path, True))
+        stats = instrument.Instrument()
+        routed = gct.GCT(self.path('a.gctx'), instrument=stats)
+        routed.read(verbose=False, row_inds=[7, 2, 7])
+        self.assertEqual(stats.snapshot()['counters'].get('sibling_reads'), 1)
+        numpy.testing.assert_array_equal(routed.matrix, direct.matrix)
+        numpy.testing.assert_array_equal(routed.matrix, self.source.matrix[[7, 2, 7]])
+
+    def test_siblings_per_handle(self):
+        stats = instrument.Instrument()
+        GCTObject = gct.GCT(self.path('a.gctx'), pooled=True, instrument=stats)
+        GCTObject.read_gctx_matrix(row_inds=[7])
+        #the pooled handle keeps the sibling scan made when it was opened
+        gct.write_sibling(self.path('a.gctx'), transpose=True, chunkshape=(17, 4))
+        GCTObject.read_gctx_matrix(row_inds=[7])
+        self.assertEqual(stats.snapshot()['counters'].get('sibling_reads'), None)
+        gct.handle_pool.clear()
+        GCTObject.read_gctx_matrix(row_inds=[7])
+        self.assertEqual(stats.snapshot()['counters'].get('sibling_reads'), 1)
+        numpy.testing.assert_array_equal(GCTObject.matrix, self.source.matrix[[7]])
+
+class TestConcat(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        self.first = fixtures.make(6, 4, seed=1)
+        self.first.write_gctx(self.path('first.gctx'))
+        #the second file holds rows 3 to 5 of the first in reverse order and
+        #two rows of its own, and has an extra column meta data field
+        second = fixtures.make(8, 3, seed=2, col_prefix='DOS')
+        rids = second.get_rids()
+        order = [5, 4, 3, 6, 7]
+        self.second = gct.make_gct(second.matrix[order],
+                                   [('id', [rids[x] for x in order])],
+                                   [('id', second.get_cids()),
+                                    ('cell_id', ['MCF7', 'PC3', 'A375'])])
+        self.second.write_gctx(self.path('second.gctx'))
+        self.paths = [self.path('first.gctx'), self.path('second.gctx')]
+
+    def concat(self,join,workers=1):
+        dest = self.path('out_%s.gctx' % (join,))
+        gct.concat_gctx(self.paths, dest, join=join, workers=workers)
+        return fixtures.read(dest)
+
+    def test_inner(self):
+        result = self.concat('inner')
+        rids = self.first.get_rids()[3:6]
+        self.assertEqual(result.get_rids(), rids)
+        self.assertEqual(result.get_cids(), self.first.get_cids() + self.second.get_cids())
+        numpy.testing.assert_array_equal(result.matrix[:,:4], self.first.matrix[3:6])
+        numpy.testing.assert_array_equal(result.matrix[:,4:], self.second.matrix[[2, 1, 0]])
+        self.assertEqual(result.get_sample_meta(self.second.get_cids()[1])['cell_id'], 'PC3')
+        self.assertEqual(result.get_sample_meta(self.first.get_cids()[0])['cell_id'],
+                         gct.MISSING_META_VALUE)
+        #blocks read in process leave no handles open in the pool
+        self.assertEqual(len(gct.handle_pool), 0)
+
+    def test_outer(self):
+        for workers in (1, 2):
+            result = self.concat('outer', workers)
+            rids = self.first.get_rids() + self.second.get_rids()[3:]
+            self.assertEqual(result.get_rids(), rids)
+            numpy.testing.assert_array_equal(result.matrix[:6,:4], self.first.matrix)
+            self.assertTrue(numpy.isnan(result.matrix[6:,:4]).all())
+            self.assertTrue(numpy.isnan(result.matrix[:3,4:]).all())
+            numpy.testing.assert_array_equal(result.matrix[3:,4:],
+                                             self.second.matrix[[2, 1, 0, 3, 4]])
+            self.assertEqual(result.get_probe_meta(rids[0])['pr_gene_symbol'], 'G0')
+            self.assertEqual(result.get_probe_meta(rids[-1])['pr_gene_symbol'],
+                             gct.MISSING_META_VALUE)
+
+    def test_read_many_matches_concat(self):
+        for join in ('inner', 'outer'):
+            result = self.concat(join)
+            many = gct.read_many(self.paths, join=join, workers=1)
+            self.assertEqual(many.get_rids(), result.get_rids())
+            self.assertEqual(many.get_cids(), result.get_cids())
+            numpy.testing.assert_array_equal(many.matrix, result.matrix)
+
+    def test_errors(self):
+        self.assertRaises(gct.GCTException, gct.concat_gctx, self.paths,
+                          self.path('out.gctx'), join='left')
+        self.assertRaises(gct.GCTException, gct.concat_gctx, [], self.path('out.gctx'))
+
+class TestWriteGCT(fixtures.TempDirTestCase):
+    def test_round_trip(self):
+        source = fixtures.make(23, 17)
+        for version in ('#1.2', '#1.3'):
+            source.write_gct(self.path('a.gct'), precision=6, version=version,
+                             block_size=40)
+            result = fixtures.read(self.path('a.gct'))
+            self.assertEqual(result.version, version)
+            numpy.testing.assert_allclose(result.matrix, source.matrix, atol=1e-6)
+            self.assertEqual(result.get_rids(), source.get_rids())
+            self.assertEqual(result.get_cids(), source.get_cids())
+
+    def test_format_block(self):
+        values = numpy.array([[0.0, -0.0, 0.5, 1.5, 2.5, -2.5, 0.125, 1e-7],
+                              [numpy.nan, -numpy.inf, 1e20, -123456.78905, 9999.99995, 
+                               0.30000000000000004, 5e11, 1.0 / 3]])
+        values = numpy.vstack((values, numpy.random.RandomState(0).randn(20, 8) * 
+                               10 ** numpy.arange(8)))
+        for precision in (0, 1, 4, 7):
+            row_format = '\t'.join(['%%.%df' % (precision,)] * 8) + '\n'
+            self.assertEqual(gct._format_gct_block(values, precision),
+                             [row_format % tuple(x) for x in values.tolist()])
+        self.assertEqual(gct._format_gct_block(numpy.zeros((2, 0)), 4), ['\n', '\n'])
+
+if __name__ == '__main__':
+    unittest.main()
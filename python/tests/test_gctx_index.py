@@ -0,0 +1,85 @@
+'''
+Created on Oct 17, 2026
+tests of the gctx id indexes in cmap.io.gctx_index
+
+run from the python directory with:
+python -m unittest discover -s tests
+'''
+import os
+import unittest
+
+import numpy
+
+import cmap.io.gct as gct
+import cmap.io.gctx_index as gctx_index
+
+import fixtures
+
+IDS = ['CPC002:A02', 'BRD001:A01 ', 'CPC001:A01', 'CPC002:A02', 'DMSO:B01', 'CPC010:A03']
+
+class TestIdIndex(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        self.index = gctx_index.IdIndex(numpy.array(IDS))
+
+    def test_exact(self):
+        self.assertEqual(self.index.exact(['CPC001:A01']), [2])
+        #ids are stripped, duplicates are all returned and positions follow
+        #the order of the requested ids
+        self.assertEqual(self.index.exact(['CPC002:A02', 'BRD001:A01']), [0, 3, 1])
+        self.assertEqual(self.index.exact('DMSO:B01'), [4])
+        self.assertEqual(self.index.exact(['CPC001', 'nope']), [])
+
+    def test_prefix(self):
+        self.assertEqual(self.index.prefix(['CPC00']), [0, 2, 3])
+        self.assertEqual(self.index.prefix(['DMSO', 'CPC01']), [4, 5])
+        self.assertEqual(self.index.prefix(['CPC001:A01']), [2])
+        self.assertEqual(self.index.prefix(['Z']), [])
+
+    def test_substring(self):
+        self.assertEqual(self.index.substring(['A01']), [1, 2])
+        self.assertEqual(self.index.substring([':A0']), [0, 1, 2, 3, 5])
+        self.assertEqual(self.index.substring(['']), range(len(IDS)))
+        self.assertEqual(self.index.substring(['02', 'B0']), [0, 3, 4])
+        self.assertEqual(self.index.substring(['\n', 'A02\nBRD']), [])
+
+    def test_save_load(self):
+        path = self.path('ids.npz')
+        self.index.save(path)
+        num_fds = len(os.listdir('/proc/self/fd')) if os.path.isdir('/proc/self/fd') else None
+        for ii in range(5):
+            loaded = gctx_index.IdIndex.load(path)
+        if num_fds is not None:
+            self.assertEqual(len(os.listdir('/proc/self/fd')), num_fds)
+        self.assertEqual(loaded.ids.tolist(), self.index.ids.tolist())
+        self.assertEqual(loaded.exact(['CPC002:A02']), [0, 3])
+
+class TestGCTXLookup(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        self.source = fixtures.make(8, 30)
+        self.source.write_gctx(self.path('a.gctx'))
+
+    def test_lookups(self):
+        GCTObject = gct.GCT(self.path('a.gctx'))
+        src = self.path('a.gctx')
+        cids = self.source.get_cids()
+        self.assertEqual(GCTObject.get_gctx_cid_inds(src, match_list=['CPC027:A03', 'CPC001:A01'],
+                                                     exact=True), [27, 1])
+        self.assertEqual(GCTObject.get_gctx_cid_inds(src, match_list='CPC02', prefix=True),
+                         range(20, 30))
+        self.assertEqual(GCTObject.get_gctx_cid(src, match_list=':A03'),
+                         [cids[3], cids[27]])
+        self.assertEqual(GCTObject.get_gctx_rid_inds(src, match_list='200005_at', exact=True), [5])
+
+    def test_persist(self):
+        GCTObject = gct.GCT(self.path('a.gctx'), persist_index=True)
+        expected = GCTObject.get_gctx_cid_inds(self.path('a.gctx'), match_list=':A0')
+        path = gctx_index.sidecar_path(self.path('a.gctx'), 'col')
+        self.assertTrue(os.path.exists(path))
+        gctx_index._index_cache.clear()
+        self.assertEqual(GCTObject.get_gctx_cid_inds(self.path('a.gctx'), match_list=':A0'),
+                         expected)
+
+if __name__ == '__main__':
+    unittest.main()
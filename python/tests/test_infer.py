@@ -0,0 +1,69 @@
+'''
+Created on Oct 17, 2026
+tests linear inference of dependent genes from landmark genes
+'''
+import os
+
+import numpy
+
+import cmap.analytics.infer as infer
+import cmap.io.gct as gct
+
+import fixtures
+
+class TestInfer(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        random = numpy.random.RandomState(0)
+        #five landmarks, stored out of order next to an extra row, and three
+        #dependents
+        self.landmarks = ['1007_s_at', '1053_at', '117_at', '121_at', '1255_g_at']
+        self.dependents = ['1294_at', '1316_at', '1320_at']
+        self.rids = list(reversed(self.landmarks)) + ['extra']
+        self.matrix = random.uniform(0, 15, (6, 7)).astype(numpy.float32)
+        gct.make_gct(self.matrix, [('id', self.rids)],
+                     [('id', ['s%d' % (ii,) for ii in range(7)])]).write_gctx(self.path('a.gctx'))
+        self.wt = random.normal(0, 1, (3, 6)).astype(numpy.float32)
+        self.model = infer.InferenceModel(self.wt, self.landmarks, self.dependents, 'toy')
+        landmark_values = self.matrix[[self.rids.index(x) for x in self.landmarks]]
+        self.expected = numpy.vstack((landmark_values, numpy.clip(
+                            self.wt[:, 1:].dot(landmark_values) + self.wt[:, :1], 0, 15)))
+
+    def test_infer(self):
+        result = infer.infer(self.path('a.gctx'), self.model, sort_features=False,
+                             block_size=3, workers=2)
+        self.assertEqual(result.get_rids(), self.landmarks + self.dependents)
+        numpy.testing.assert_allclose(result.matrix, self.expected, rtol=1e-5, atol=1e-5)
+        self.assertEqual(result.get_row_meta('pr_is_lmark'), ['Y'] * 5 + ['N'] * 3)
+        self.assertEqual(result.get_row_meta('pr_model_id'), ['-666'] * 5 + ['toy'] * 3)
+        self.assertEqual(result.get_row_meta('pr_gene_symbol')[:2], ['DDR1', 'RFC2'])
+
+    def test_streamed_and_sorted(self):
+        self.model.save(self.path('model.npz'))
+        self.assertEqual(infer.infer(self.path('a.gctx'), self.path('model.npz'),
+                                     self.path('inf.gctx'), block_size=4), None)
+        result = fixtures.read(self.path('inf.gctx'))
+        symbols = result.get_row_meta('pr_gene_symbol')
+        self.assertEqual(result.get_row_meta('pr_is_lmark'), ['Y'] * 5 + ['N'] * 3)
+        self.assertEqual(symbols[:5], sorted(symbols[:5]))
+        ids = self.landmarks + self.dependents
+        inds = [ids.index(x) for x in result.get_rids()]
+        numpy.testing.assert_allclose(result.matrix, self.expected[inds], rtol=1e-5, atol=1e-5)
+
+    def test_model(self):
+        self.model.save(self.path('model.npz'))
+        model = infer.InferenceModel.load(self.path('model.npz'))
+        numpy.testing.assert_array_equal(model.wt, self.wt)
+        self.assertEqual((model.landmarks, model.dependents, model.name),
+                         (self.landmarks, self.dependents, 'toy'))
+        self.assertRaises(ValueError, infer.InferenceModel, self.wt[:, 1:],
+                          self.landmarks, self.dependents)
+        self.assertRaises(ValueError, infer.InferenceModel.load, self.path('model.txt'))
+
+    def test_errors(self):
+        model = infer.InferenceModel(self.wt, ['missing'] + self.landmarks[1:],
+                                     self.dependents)
+        self.assertRaises(ValueError, infer.infer, self.path('a.gctx'), model)
+        fixtures.write_text(self.path('a.txt'), ['not a gct file'])
+        self.assertRaises(gct.GCTException, infer.infer, self.path('a.txt'), self.model)
+        self.assertEqual(sorted(os.listdir(self.dir)), ['a.gctx', 'a.txt'])
@@ -0,0 +1,94 @@
+'''
+Created on Oct 17, 2026
+tests the stage timers and counters of instrumented reads
+'''
+import os
+import threading
+import unittest
+
+import cmap.io.gct as gct
+import cmap.io.instrument as instrument
+
+import fixtures
+
+class TestInstrument(unittest.TestCase):
+    def test_stages_and_counters(self):
+        stats = instrument.Instrument()
+        events = []
+        hook = lambda kind, name, value: events.append((kind, name))
+        stats.add_hook(hook)
+        for ii in range(2):
+            with stats.stage('open'):
+                pass
+        stats.count('chunks', 3)
+        stats.count('chunks')
+        stats.remove_hook(hook)
+        stats.count('bytes_read', 10)
+        data = stats.snapshot()
+        self.assertEqual(data['calls'], {'open':2})
+        self.assertTrue(data['timers']['open'] >= 0)
+        self.assertEqual(data['counters'], {'chunks':4, 'bytes_read':10})
+        self.assertEqual(events, [('stage', 'open'), ('stage', 'open'),
+                                  ('counter', 'chunks'), ('counter', 'chunks')])
+        report = stats.report()
+        self.assertTrue('open' in report and 'bytes_read' in report)
+        stats.reset()
+        self.assertEqual(stats.snapshot(), {'timers':{}, 'calls':{}, 'counters':{}})
+
+    def test_threads(self):
+        stats = instrument.Instrument()
+        def work():
+            for ii in range(1000):
+                stats.count('chunks')
+                stats.add_time('matrix_read', 0.5)
+        threads = [threading.Thread(target=work) for ii in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        data = stats.snapshot()
+        self.assertEqual(data['counters']['chunks'], 4000)
+        self.assertEqual((data['calls']['matrix_read'], data['timers']['matrix_read']),
+                         (4000, 2000.0))
+
+    def test_null_instrument(self):
+        null = instrument.NULL_INSTRUMENT
+        self.assertFalse(null.enabled)
+        with null.stage('open'):
+            null.count('chunks')
+            null.add_time('open', 1.0)
+        self.assertTrue(gct.GCT().instrument is null)
+
+class TestInstrumentedReads(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        self.source = fixtures.make(30, 20)
+
+    def test_gctx(self):
+        self.source.write_gctx(self.path('a.gctx'), chunkshape=(30, 4))
+        stats = instrument.Instrument()
+        GCTObject = gct.GCT(self.path('a.gctx'), instrument=stats)
+        GCTObject.read(verbose=False, cid=self.source.get_cids()[5:9])
+        data = stats.snapshot()
+        for stage in ('open', 'id_resolution', 'meta_load', 'matrix_read'):
+            self.assertTrue(data['calls'].get(stage), stage)
+        self.assertEqual(data['counters']['rows_inserted'], 30 + 4)
+        #columns 5 to 8 span two chunks of four float32 columns
+        self.assertEqual(data['counters']['chunks'], 2)
+        self.assertEqual(data['counters']['bytes_read'], 2 * 30 * 4 * 4)
+
+    def test_gct(self):
+        self.source.write_gct(self.path('a.gct'))
+        stats = instrument.Instrument()
+        GCTObject = gct.GCT(self.path('a.gct'), instrument=stats)
+        GCTObject.read(verbose=False)
+        data = stats.snapshot()
+        self.assertEqual(sorted(data['calls']), ['matrix_read', 'meta_load', 'open'])
+        self.assertEqual(data['counters']['rows_inserted'], 30 + 20)
+        with open(self.path('a.gct')) as f:
+            header_bytes = sum(len(f.readline()) for ii in range(2 + 3))
+        self.assertTrue(0 < data['counters']['bytes_read'] <= 
+                        os.path.getsize(self.path('a.gct')) - header_bytes + 1)
+
+if __name__ == '__main__':
+    unittest.main()
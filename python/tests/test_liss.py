@@ -0,0 +1,62 @@
+'''
+Created on Oct 17, 2026
+tests invariant set scaling against samples distorted by known curves
+'''
+import numpy
+
+import cmap.analytics.liss as liss
+import cmap.io.gct as gct
+
+import fixtures
+
+class TestLiss(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        #log2 expression of 200 genes in 12 samples, each distorted by its
+        #own power curve, with the calibration genes at the reference levels
+        random = numpy.random.RandomState(0)
+        ref = liss.read_reference()
+        self.truth = random.uniform(4, 14, size=(200, 12))
+        a = random.uniform(0.8, 1.2, 12)
+        b = random.uniform(0.9, 1.1, 12)
+        c = random.uniform(-1, 1, 12)
+        observed = lambda x: ((x - c) / a) ** (1.0 / b)
+        calib = numpy.repeat(ref[1:11, numpy.newaxis], 12, axis=1)
+        matrix = 2 ** numpy.vstack((observed(calib), observed(self.truth)))
+        matrix[:, 11] = 0
+        self.rids = ['CAL%02d' % (ii,) for ii in range(1, 11)] + ['g%d' % (ii,) for ii in range(200)]
+        self.source = gct.make_gct(matrix, [('id', self.rids)],
+                                   [('id', ['s%d' % (ii,) for ii in range(12)])])
+        self.source.write_gctx(self.path('raw.gctx'))
+
+    def test_liss(self):
+        result = liss.liss(self.path('raw.gctx'), block_size=5, workers=2)
+        self.assertEqual(result.get_rids(), self.rids[10:])
+        self.assertEqual(result.get_chd()[-len(liss.QC_FIELDS):], liss.QC_FIELDS)
+        self.assertEqual(result.get_column_meta('qcpass'), ['1'] * 11 + ['0'])
+        error = numpy.abs(result.matrix[:, :11] - self.truth[:, :11])
+        self.assertTrue(numpy.median(error) < 0.3)
+        self.assertTrue((result.matrix[:, 11] == 0).all())
+
+    def test_streamed(self):
+        expected = liss.liss(self.path('raw.gctx'), block_size=4, workers=1,
+                             drop_calib=False, fitmodel='linear')
+        self.assertEqual(expected.get_rids(), self.rids)
+        self.assertEqual(liss.liss(self.path('raw.gctx'), self.path('norm.gctx'),
+                                   block_size=4, workers=2, drop_calib=False,
+                                   fitmodel='linear'), None)
+        result = fixtures.read(self.path('norm.gctx'))
+        numpy.testing.assert_array_equal(result.matrix, expected.matrix)
+        self.assertEqual(result.get_rids(), expected.get_rids())
+        self.assertEqual(result.get_cids(), expected.get_cids())
+        for field in liss.QC_FIELDS:
+            numpy.testing.assert_allclose(
+                numpy.array(result.get_column_meta(field), dtype=float),
+                numpy.array(expected.get_column_meta(field), dtype=float), rtol=1e-11)
+
+    def test_unreadable_files(self):
+        fixtures.write_text(self.path('a.txt'), ['not a gct file'])
+        self.assertRaises(gct.GCTException, liss.liss, self.path('a.txt'))
+        self.assertRaises(gct.GCTException, liss.liss, self.path('raw.gctx'),
+                          ref=self.path('a.txt'))
+        self.assertRaises(gct.GCTException, liss.read_reference, self.path('a.txt'))
@@ -0,0 +1,38 @@
+'''
+Created on Oct 17, 2026
+tests of the lxb reader against the text export of the same plate well
+
+run from the python directory with:
+python -m unittest discover -s tests
+'''
+import os
+import unittest
+
+import numpy
+
+import cmap.io.lxb as lxb
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data')
+
+class TestLXB(unittest.TestCase):
+    def setUp(self):
+        with open(os.path.join(DATA, 'A10.txt')) as f:
+            self.headers = f.readline().split()
+        self.values = numpy.loadtxt(os.path.join(DATA, 'A10.txt'), skiprows=1,
+                                    dtype=numpy.int64, ndmin=2)
+
+    def test_read_matches_text_export(self):
+        LXBObject = lxb.LXB(os.path.join(DATA, 'A10.lxb')).read()
+        self.assertEqual(LXBObject.params, self.headers)
+        for ii,param in enumerate(self.headers):
+            self.assertEqual(len(LXBObject[param]), self.values.shape[0])
+            numpy.testing.assert_array_equal(LXBObject[param], self.values[:,ii])
+
+    def test_read_lxb_params(self):
+        data = lxb.read_lxb(os.path.join(DATA, 'A10.lxb'))
+        self.assertEqual(sorted(data), ['RID', 'RP1'])
+        numpy.testing.assert_array_equal(data['RID'], self.values[:,self.headers.index('RID')])
+        numpy.testing.assert_array_equal(data['RP1'], self.values[:,self.headers.index('RP1')])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+'''
+Created on Oct 17, 2026
+tests quantile normalization of matrices and gctx files
+'''
+import os
+
+import numpy
+
+import cmap.analytics.qnorm as qnorm
+import cmap.io.gct as gct
+
+import fixtures
+
+def reference_qnorm(matrix,method=numpy.median):
+    '''
+    straightforward quantile normalization the tests compare against
+    '''
+    reference = method(numpy.sort(matrix, axis=0), axis=1)
+    ranks = numpy.argsort(numpy.argsort(matrix, axis=0, kind='mergesort'), axis=0)
+    return reference[ranks]
+
+class TestQnorm(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        self.matrix = numpy.random.RandomState(1).randn(40, 9)
+
+    def test_qnorm(self):
+        for workers,block_size in ((1, None), (3, 2)):
+            numpy.testing.assert_allclose(
+                qnorm.qnorm(self.matrix, block_size=block_size, workers=workers),
+                reference_qnorm(self.matrix))
+        numpy.testing.assert_allclose(qnorm.qnorm(self.matrix, 'mean', workers=1),
+                                      reference_qnorm(self.matrix, numpy.mean))
+        numpy.testing.assert_allclose(
+            qnorm.reference_distribution(self.matrix, block_size=4, workers=2),
+            numpy.median(numpy.sort(self.matrix, axis=0), axis=1))
+        self.assertRaises(ValueError, qnorm.reference_distribution, self.matrix, 'max')
+
+    def test_sketch_reference(self):
+        normalized = qnorm.qnorm(self.matrix, reference=[0.0, 3.0, 1.0], workers=1)
+        numpy.testing.assert_allclose(numpy.sort(normalized[:, 0]),
+                                      numpy.interp(numpy.linspace(0, 1, 40), [0, 0.5, 1], [0, 1, 3]))
+        numpy.testing.assert_array_equal(numpy.argsort(normalized, axis=0),
+                                         numpy.argsort(self.matrix, axis=0))
+
+    def test_qnorm_gctx(self):
+        source = fixtures.make(40, 9)
+        source.write_gctx(self.path('a.gctx'), chunkshape=(2, 8))
+        qnorm.qnorm_gctx(self.path('a.gctx'), self.path('b.gctx'), workers=2,
+                         tmp_dir=self.dir)
+        result = fixtures.read(self.path('b.gctx'))
+        numpy.testing.assert_allclose(result.matrix,
+                                      reference_qnorm(source.matrix.astype(numpy.float64)),
+                                      rtol=1e-6)
+        self.assertSameMeta(source, result)
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         ['a.gctx', 'b.gctx'])
+
+    def test_unreadable_source(self):
+        fixtures.make(4, 3).write_gct(self.path('a.gct'))
+        fixtures.write_text(self.path('a.txt'), ['not a gct file'])
+        for src in ('a.gct', 'a.txt'):
+            self.assertRaises(gct.GCTException, qnorm.qnorm_gctx,
+                              self.path(src), self.path('b.gctx'))
+        self.assertFalse(os.path.exists(self.path('b.gctx')))
@@ -0,0 +1,91 @@
+'''
+Created on Oct 17, 2026
+tests meta data filter expressions and where filtered reads
+'''
+import unittest
+
+import numpy
+
+import cmap.io.gct as gct
+import cmap.io.query as query
+from cmap.io.query import col, row
+
+import fixtures
+
+class TestExpression(unittest.TestCase):
+    def setUp(self):
+        self.values = {('col', 'pert_type'):numpy.array(['trt_cp', 'ctl', 'trt_cp', 'trt_sh']),
+                       ('col', 'pert_dose'):numpy.array(['0.5', '10', '5', '-666']),
+                       ('row', 'pr_gene_symbol'):numpy.array(['TP53', 'EGFR', 'KRAS'])}
+
+    def mask(self,expression):
+        return expression.evaluate(self.values).tolist()
+
+    def test_conditions(self):
+        self.assertEqual(self.mask(col('pert_type') == 'trt_cp'), [True, False, True, False])
+        self.assertEqual(self.mask(col('pert_type') != 'trt_cp'), [False, True, False, True])
+        self.assertEqual(self.mask(col('pert_dose') > 1), [False, True, True, False])
+        self.assertEqual(self.mask(col('pert_dose') <= '0.5'), [True, False, False, True])
+        self.assertEqual(self.mask(col('pert_dose').between(0, 5)), [True, False, True, False])
+        self.assertEqual(self.mask(col('pert_dose').isin([10, 5])), [False, True, True, False])
+        self.assertEqual(self.mask(col('pert_type').isin(['ctl', 'trt_sh'])),
+                         [False, True, False, True])
+        self.assertEqual(self.mask(row('pr_gene_symbol').contains('R')), [False, True, True])
+
+    def test_combinations(self):
+        expression = (col('pert_type') == 'trt_cp') & ~(col('pert_dose') < 1)
+        self.assertEqual(self.mask(expression), [False, False, True, False])
+        expression = (col('pert_type') == 'ctl') | (col('pert_dose') == 5)
+        self.assertEqual(self.mask(expression), [False, True, True, False])
+        self.assertEqual(expression.fields(), set([('col', 'pert_type'), ('col', 'pert_dose')]))
+
+    def test_split_axes(self):
+        expression = ((col('pert_type') == 'trt_cp') & (row('pr_gene_symbol') == 'TP53')
+                      & (col('pert_dose') > 1))
+        filters = query.split_axes(expression)
+        self.assertEqual(sorted(filters.keys()), ['col', 'row'])
+        self.assertEqual(filters['col'].evaluate(self.values).tolist(),
+                         [False, False, True, False])
+        self.assertRaises(ValueError, query.split_axes,
+                          (col('pert_type') == 'ctl') | (row('pr_gene_symbol') == 'KRAS'))
+
+    def test_abstract(self):
+        self.assertRaises(TypeError, query.Expression)
+        self.assertRaises(ValueError, query.Field, 'sample', 'id')
+
+class TestWhere(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        self.source = fixtures.make(10, 12)
+        self.source.write_gctx(self.path('a.gctx'))
+
+    def test_read_where(self):
+        where = (col('pert_type') == 'ctl_vehicle') & row('pr_gene_symbol').isin(['G2', 'G5'])
+        result = fixtures.read(self.path('a.gctx'), where=where)
+        cids = self.source.get_cids()
+        rids = self.source.get_rids()
+        self.assertEqual(result.get_cids(), [cids[ii] for ii in (0, 3, 6, 9)])
+        self.assertEqual(result.get_rids(), [rids[2], rids[5]])
+        numpy.testing.assert_array_equal(result.matrix,
+                                         self.source.matrix[[2, 5]][:, [0, 3, 6, 9]])
+
+    def test_read_where_restricted(self):
+        cids = self.source.get_cids()
+        result = fixtures.read(self.path('a.gctx'), where=col('pert_dose') >= 3,
+                               cid=cids[:6])
+        self.assertEqual(result.get_cids(), [cids[3], cids[4]])
+        self.assertEqual(result.matrix.shape, (10, 2))
+
+    def test_read_where_errors(self):
+        for where in (col('missing') == 1, col('pert_type') == 'nothing',
+                      (col('pert_type') == 'ctl_vehicle') | (row('id') == 'x')):
+            GCTObject = gct.GCT(self.path('a.gctx'))
+            self.assertRaises(gct.GCTException, GCTObject._select_by_where,
+                              self.path('a.gctx'), where)
+        self.source.write_gct(self.path('a.gct'))
+        GCTObject = gct.GCT(self.path('a.gct'))
+        GCTObject.read(verbose=False, where=col('pert_type') == 'trt_cp')
+        self.assertEqual(GCTObject.matrix, '')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+'''
+Created on Oct 17, 2026
+tests blocked top k similarity search over gctx columns
+'''
+import glob
+import os
+
+import numpy
+import tables
+
+import cmap.analytics.similarity as similarity
+import cmap.io.gct as gct
+
+import fixtures
+
+def _ranks(x):
+    '''
+    average ranks of the columns of x, starting at 1
+    '''
+    ranks = numpy.empty(x.shape)
+    for jj in range(x.shape[1]):
+        column = x[:, jj]
+        for ii in range(len(column)):
+            ranks[ii, jj] = ((column < column[ii]).sum() +
+                             ((column == column[ii]).sum() + 1) / 2.0)
+    return ranks
+
+def _scores(matrix,query,metric):
+    '''
+    brute force similarity of query with each column of matrix
+    '''
+    matrix = matrix.astype(numpy.float64)
+    query = numpy.asarray(query, dtype=numpy.float64)[:, numpy.newaxis]
+    if metric == 'spearman':
+        matrix = _ranks(matrix)
+        query = _ranks(query)
+    if metric != 'cosine':
+        matrix = matrix - matrix.mean(axis=0)
+        query = query - query.mean(axis=0)
+    return (matrix * query).sum(axis=0) / (numpy.sqrt((matrix ** 2).sum(axis=0)) *
+                                           numpy.sqrt((query ** 2).sum()))
+
+class TestSimilarity(fixtures.TempDirTestCase):
+    def setUp(self):
+        fixtures.TempDirTestCase.setUp(self)
+        self.source = fixtures.make(12, 40)
+        self.source.matrix[:, 7] = 1.5
+        self.src = self.path('a.gctx')
+        self.source.write_gctx(self.src, chunkshape=(12, 1))
+        random = numpy.random.RandomState(1)
+        self.queries = random.randn(12, 3)
+
+    def test_block_ranks(self):
+        x = numpy.array([[3, 1], [1, 1], [2, 5], [3, 0]], dtype=float)
+        numpy.testing.assert_array_equal(similarity._block_ranks(x), _ranks(x))
+
+    def test_search(self):
+        for metric in similarity.METRICS:
+            hits = similarity.search(self.src, self.queries, metric=metric, k=5,
+                                     block_size=7)
+            self.assertEqual(len(hits), 3)
+            for jj,(ids,scores) in enumerate(hits):
+                expected = _scores(self.source.matrix, self.queries[:, jj], metric)
+                finite = numpy.sort(expected[numpy.isfinite(expected)])[::-1]
+                numpy.testing.assert_allclose(scores, finite[:5], rtol=1e-4, atol=1e-5)
+                #tied scores may come back in any order
+                inds = [self.source.get_cids().index(x) for x in ids]
+                numpy.testing.assert_allclose(expected[inds], scores, rtol=1e-4, atol=1e-5)
+
+    def test_tails(self):
+        query = self.queries[:, 0]
+        expected = _scores(self.source.matrix, query, 'pearson')
+        cids = self.source.get_cids()
+        ids, scores = similarity.search(self.src, query, k=3, tail='bottom')[0]
+        self.assertEqual(ids, [cids[x] for x in numpy.argsort(expected)[:3]])
+        ids, scores = similarity.search(self.src, query, k=40, tail='both')[0]
+        self.assertEqual(len(ids), 39)
+        self.assertNotIn(cids[7], ids)
+        self.assertTrue(numpy.all(numpy.diff(numpy.abs(scores)) <= 0))
+
+    def test_selection(self):
+        cids = self.source.get_cids()
+        rids = self.source.get_rids()
+        order = list(reversed(range(12)))
+        ids, scores = similarity.search(self.src, self.queries[order, 0], k=40,
+                                        row_ids=[rids[x] for x in order],
+                                        cid=cids[20:25])[0]
+        self.assertEqual(sorted(ids), cids[20:25])
+        expected = _scores(self.source.matrix, self.queries[:, 0], 'pearson')
+        numpy.testing.assert_allclose(scores, sorted(expected[20:25], reverse=True),
+                                      rtol=1e-4, atol=1e-5)
+        self.assertRaises(ValueError, similarity.search, self.src, self.queries[:5])
+        self.assertRaises(ValueError, similarity.search, self.src, self.queries,
+                          metric='kendall')
+
+    def test_sidecars(self):
+        similarity.search(self.src, self.queries, metric='spearman', k=5)
+        ranks = similarity.ranks_path(self.src)
+        self.assertEqual(sorted(os.listdir(self.dir)),
+                         sorted(['a.gctx', 'a.simstats.npz', os.path.basename(ranks)]))
+
+        #the rank sidecar is not a layout sibling of the source
+        self.assertNotIn(ranks, glob.glob(gct.sibling_path(self.src, '*')))
+        self.assertEqual(gct.find_siblings(self.src), [])
+        sibling = gct.write_sibling(self.src, layout='row', chunkshape=(1, 40))
+        self.assertEqual([x[0] for x in gct.find_siblings(self.src)],
+                         [os.path.abspath(sibling)])
+        gctx_file = tables.openFile(self.src)
+        try:
+            self.assertEqual(gct.cheapest_layout(self.src, gctx_file.getNode('/0/DATA/0/matrix'),
+                                                 [3], range(40)),
+                             (os.path.abspath(sibling), False))
+        finally:
+            gctx_file.close()
+        self.assertTrue(os.path.exists(ranks))
+        stats = similarity.column_stats(self.src, ranks=True)
+        numpy.testing.assert_allclose(stats['norm'], numpy.sqrt(
+            (self.source.matrix.astype(numpy.float64) ** 2).sum(axis=0)), rtol=1e-5)
+
+    def test_stale_sidecars(self):
+        similarity.column_stats(self.src)
+        self.assertNotIn('rank_centered_norm', similarity.column_stats(self.src))
+        self.source.matrix *= 2
+        self.source.write_gctx(self.src)
+        os.utime(self.src, (os.path.getmtime(self.src) + 10,) * 2)
+        stats = similarity.column_stats(self.src, ranks=True)
+        numpy.testing.assert_allclose(stats['norm'], numpy.sqrt(
+            (self.source.matrix.astype(numpy.float64) ** 2).sum(axis=0)), rtol=1e-5)
+        self.assertTrue(os.path.exists(similarity.ranks_path(self.src)))